@@ -0,0 +1,156 @@
+"""
+Client side code to score many images with a tensorflow model up and running.
+
+Images are packed in batches sent concurrently over pooled connections, and the
+predictions are streamed to a JSONL file in input order.
+"""
+import argparse
+import collections
+import concurrent.futures
+import glob
+import json
+import os
+import time
+
+import numpy as np
+
+from client import build_transport
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif')
+
+
+def list_images(source):
+    """
+    List the images to score.
+
+    Args:
+        source (str): a directory, a glob pattern, or a JSONL manifest where each line is either
+            a json string or an object with an 'image_path' key. Relative paths of a manifest are
+            resolved against the manifest directory.
+
+    Returns:
+        image_paths (list(str))
+    """
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, name) for name in os.listdir(source)
+                      if name.lower().endswith(IMAGE_EXTENSIONS))
+
+    if source.endswith('.jsonl') and os.path.isfile(source):
+        manifest_dir = os.path.dirname(source)
+        image_paths = []
+        with open(source) as manifest:
+            for line in manifest:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                image_path = entry if isinstance(entry, str) else entry['image_path']
+                image_paths.append(os.path.join(manifest_dir, image_path))
+        return image_paths
+
+    return sorted(glob.glob(source))
+
+
+def iter_batches(image_paths, batch_size):
+    """Yield successive lists of at most batch_size image paths."""
+    for start in range(0, len(image_paths), batch_size):
+        yield image_paths[start:start + batch_size]
+
+
+def _timed_predict(transport, image_paths):
+    start = time.perf_counter()
+    predictions = transport.predict_batch(image_paths)
+    return predictions, time.perf_counter() - start
+
+
+def predict_in_order(transport, batches, max_in_flight):
+    """
+    Send the batches with at most max_in_flight concurrent requests.
+
+    Args:
+        transport: one of the transports of `client.build_transport`
+        batches (iterable(list(str))): batches of image paths
+        max_in_flight (int): maximum number of requests waiting for the server
+
+    Yields:
+        (image_paths, predictions, latency) for each batch, in input order.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        in_flight = collections.deque()
+        for batch in batches:
+            if len(in_flight) >= max_in_flight:
+                image_paths, future = in_flight.popleft()
+                yield (image_paths,) + future.result()
+            in_flight.append((batch, executor.submit(_timed_predict, transport, batch)))
+        while in_flight:
+            image_paths, future = in_flight.popleft()
+            yield (image_paths,) + future.result()
+
+
+def _to_json(value):
+    return value.tolist() if isinstance(value, (np.ndarray, np.generic)) else value
+
+
+def score_images(transport, image_paths, output_jsonl, batch_size=1, max_in_flight=4):
+    """
+    Score the images and write one json line {"image_path": ..., "predictions": {...}} per image.
+
+    Returns:
+        stats (dict): number of images, throughput in images/s and p50/p99 request latency in seconds.
+    """
+    latencies = []
+    num_images = 0
+    start = time.perf_counter()
+    with open(output_jsonl, 'w') as outfile:
+        for batch, predictions, latency in predict_in_order(transport, iter_batches(image_paths, batch_size),
+                                                            max_in_flight):
+            latencies.append(latency)
+            for image_path, output_dict in zip(batch, predictions):
+                output_dict = {key: _to_json(value) for key, value in output_dict.items()}
+                outfile.write(json.dumps({"image_path": image_path, "predictions": output_dict}) + '\n')
+            num_images += len(batch)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'num_images': num_images,
+        'images_per_second': num_images / elapsed if elapsed > 0 else 0.,
+        'latency_p50': float(np.percentile(latencies, 50)) if latencies else 0.,
+        'latency_p99': float(np.percentile(latencies, 99)) if latencies else 0.,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scores a set of images with the tensorflow-serving API.')
+    parser.add_argument('--server_url', dest='server_url', type=str, required=True,
+                        help='URL of the tensorflow-serving accepting API call. '
+                             'e.g. http://localhost:8501/v1/models/omr_500:predict')
+    parser.add_argument('--input', dest='input', type=str, required=True,
+                        help='Directory of images, glob pattern (quote it) or JSONL manifest of image paths')
+    parser.add_argument('--output_jsonl', dest='output_jsonl', type=str, default='tf_output.jsonl',
+                        help='Path to the output JSONL file, with one line per image in input order')
+    parser.add_argument('--batch_size', dest='batch_size', type=int, default=1,
+                        help='Number of images packed in each request. Images of a batch must have the same '
+                             'size with the json and image_tensor transports.')
+    parser.add_argument('--max_in_flight', dest='max_in_flight', type=int, default=4,
+                        help='Maximum number of concurrent requests')
+    parser.add_argument('--transport', dest='transport', type=str, default='json', choices=['json', 'b64', 'grpc'],
+                        help='How the images are sent, see client.py')
+    parser.add_argument('--model_name', dest='model_name', type=str, default=None,
+                        help='Name of the served model, required by the grpc transport')
+    parser.add_argument('--input_type', dest='input_type', type=str, default='image_tensor',
+                        choices=['image_tensor', 'encoded_image_string_tensor'],
+                        help='Input type the served model was exported with, used by the grpc transport')
+    parser.add_argument('--image_format', dest='image_format', type=str, default=None, choices=['jpeg', 'png'],
+                        help='Re-encode the images in this format before sending them with the b64 or grpc transport')
+    args = parser.parse_args()
+
+    image_paths = list_images(args.input)
+    transport = build_transport(args.transport, args.server_url, model_name=args.model_name,
+                                input_type=args.input_type, image_format=args.image_format,
+                                pool_size=args.max_in_flight)
+
+    print(f'\n\nScoring {len(image_paths)} images from {args.input}...\n')
+    stats = score_images(transport, image_paths, args.output_jsonl,
+                         batch_size=args.batch_size, max_in_flight=args.max_in_flight)
+    print(f'Output saved to {args.output_jsonl}\n')
+    print(f'{stats["num_images"]} images scored at {stats["images_per_second"]:.2f} images/s, '
+          f'request latency p50 {stats["latency_p50"] * 1000:.1f} ms, p99 {stats["latency_p99"] * 1000:.1f} ms\n')
@@ -0,0 +1,358 @@
+"""
+Load generation and latency benchmark of a tensorflow-serving endpoint.
+
+Replays a corpus of images at a fixed rate (open loop) or with a fixed number of
+concurrent clients (closed loop), times every phase of each request and reports
+HDR-style latency histograms, as text and as a json report.
+Use `--stub` to benchmark against a local stub server, without any model.
+"""
+import argparse
+import http.server
+import itertools
+import json
+import socketserver
+import threading
+import time
+import concurrent.futures
+
+import numpy as np
+from PIL import Image
+
+from batch_client import iter_batches, list_images
+from client import build_transport, format_output_dict
+
+PHASES = ('pre_process', 'serialize', 'network', 'deserialize', 'post_process', 'total')
+PERCENTILES = (50., 90., 99., 99.9, 100.)
+
+
+class LatencyHistogram(object):
+    """
+    Log-linear histogram of latencies, in the spirit of HdrHistogram.
+
+    Values are recorded in microseconds in buckets whose width is a power of two,
+    keeping `significant_bits` bits of precision: with the default of 7 bits every
+    value is known within 1%, whatever its magnitude, with a few hundred buckets.
+    """
+
+    def __init__(self, significant_bits=7):
+        self.significant_bits = significant_bits
+        self.counts = {}
+        self.total_count = 0
+        self.sum = 0.
+
+    def _bucket(self, value_us):
+        shift = max(value_us.bit_length() - self.significant_bits, 0)
+        return (value_us >> shift) << shift, 1 << shift
+
+    def record(self, value):
+        """Record a latency in seconds."""
+        value_us = max(int(value * 1e6), 0)
+        lowest, _ = self._bucket(value_us)
+        self.counts[lowest] = self.counts.get(lowest, 0) + 1
+        self.total_count += 1
+        self.sum += value
+
+    def mean(self):
+        return self.sum / self.total_count if self.total_count else 0.
+
+    def buckets(self):
+        """Return the list of (highest equivalent value in seconds, count), sorted by value."""
+        buckets = []
+        for lowest in sorted(self.counts):
+            _, width = self._bucket(lowest)
+            buckets.append(((lowest + width - 1) * 1e-6, self.counts[lowest]))
+        return buckets
+
+    def percentile(self, percentile):
+        """Return the highest equivalent value in seconds below which `percentile` % of the values fall."""
+        if not self.total_count:
+            return 0.
+        rank = max(int(np.ceil(percentile / 100. * self.total_count)), 1)
+        cumulative_count = 0
+        for value, count in self.buckets():
+            cumulative_count += count
+            if cumulative_count >= rank:
+                return value
+        return value
+
+    def summary(self):
+        summary = {'count': self.total_count, 'mean_ms': self.mean() * 1000}
+        for percentile in PERCENTILES:
+            key = 'max_ms' if percentile == 100. else 'p{:g}_ms'.format(percentile).replace('.', '')
+            summary[key] = self.percentile(percentile) * 1000
+        return summary
+
+    def distribution(self):
+        """Return the percentile distribution, as printed by HdrHistogram."""
+        distribution = []
+        cumulative_count = 0
+        for value, count in self.buckets():
+            cumulative_count += count
+            distribution.append({'value_ms': value * 1000, 'count': count,
+                                 'percentile': 100. * cumulative_count / self.total_count})
+        return distribution
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        num_instances = len(json.loads(body)['instances'])
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        response = json.dumps({'predictions': [self.server.prediction] * num_instances}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """HTTP server answering each request in a thread (http.server.ThreadingHTTPServer needs python 3.7)."""
+    daemon_threads = True
+
+
+class StubServer(object):
+    """
+    Local stand-in for the tensorflow-serving REST API, answering every instance with the same detections.
+
+    Args:
+        num_detections (int): number of detections of each canned prediction
+        latency (float): seconds the server waits before answering, to mimic inference time
+    """
+
+    def __init__(self, num_detections=100, latency=0.):
+        rng = np.random.RandomState(0)
+        corners = rng.uniform(0., 0.5, (num_detections, 2))
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+        self._server.latency = latency
+        self._server.prediction = {
+            'num_detections': float(num_detections),
+            'detection_boxes': np.concatenate([corners, corners + 0.5], axis=1).tolist(),
+            'detection_scores': np.sort(rng.uniform(size=num_detections))[::-1].tolist(),
+            'detection_classes': rng.randint(1, 91, num_detections).astype(float).tolist(),
+        }
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/v1/models/stub:predict'.format(self._server.server_address[1])
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def timed_request(transport, image_paths):
+    """
+    Perform one request and time each of its phases.
+
+    Returns:
+        timings (dict): seconds spent in each of `PHASES`
+    """
+    timings = {}
+    start = time.perf_counter()
+    inputs = transport.prepare_inputs(image_paths)
+    image_sizes = [Image.open(image_path).size for image_path in image_paths]
+    timings['pre_process'] = time.perf_counter() - start
+
+    phase_start = time.perf_counter()
+    request = transport.serialize(inputs)
+    timings['serialize'] = time.perf_counter() - phase_start
+
+    phase_start = time.perf_counter()
+    server_response = transport.send(request)
+    timings['network'] = time.perf_counter() - phase_start
+
+    phase_start = time.perf_counter()
+    predictions = transport.parse_response(server_response)
+    timings['deserialize'] = time.perf_counter() - phase_start
+
+    phase_start = time.perf_counter()
+    for output_dict, (width, height) in zip(predictions, image_sizes):
+        format_output_dict(output_dict, (height, width, 3))
+    timings['post_process'] = time.perf_counter() - phase_start
+
+    timings['total'] = time.perf_counter() - start
+    return timings
+
+
+def _safe_timed_request(transport, image_paths, scheduled_time=None):
+    try:
+        timings = timed_request(transport, image_paths)
+    except Exception as e:
+        return None, repr(e)
+    if scheduled_time is not None:
+        # Measure from the intended send time so that a saturated server is not hidden by queueing
+        # in the client (coordinated omission)
+        timings['total'] = time.perf_counter() - scheduled_time
+    return timings, None
+
+
+def run_closed_loop(transport, requests_corpus, num_requests, concurrency):
+    """Send num_requests requests with `concurrency` clients, each waiting for its answer before sending again."""
+    corpus = itertools.islice(itertools.cycle(requests_corpus), num_requests)
+    lock = threading.Lock()
+    results = []
+
+    def client_loop():
+        while True:
+            with lock:
+                image_paths = next(corpus, None)
+            if image_paths is None:
+                return
+            results.append((len(image_paths),) + _safe_timed_request(transport, image_paths))
+
+    threads = [threading.Thread(target=client_loop) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def run_fixed_rate(transport, requests_corpus, num_requests, qps, max_in_flight):
+    """Send num_requests requests at a fixed rate of qps requests per second, whatever the server answers."""
+    corpus = itertools.islice(itertools.cycle(requests_corpus), num_requests)
+    futures = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        start = time.perf_counter()
+        for i, image_paths in enumerate(corpus):
+            scheduled_time = start + i / qps
+            delay = scheduled_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append((len(image_paths),
+                            executor.submit(_safe_timed_request, transport, image_paths, scheduled_time)))
+    return [(num_images,) + future.result() for num_images, future in futures]
+
+
+def build_report(results, duration, config):
+    """
+    Aggregate the request results in a machine-readable report.
+
+    Args:
+        results (list(tuple)): (number of images, timings or None, error or None) per request
+        duration (float): wall time of the run in seconds
+        config (dict): parameters of the run, copied in the report
+
+    Returns:
+        report (dict)
+    """
+    histograms = {phase: LatencyHistogram() for phase in PHASES}
+    errors = [error for _, timings, error in results if timings is None]
+    num_images = 0
+    for images, timings, _ in results:
+        if timings is None:
+            continue
+        num_images += images
+        for phase in PHASES:
+            histograms[phase].record(timings[phase])
+
+    num_successes = len(results) - len(errors)
+    return {
+        'config': config,
+        'duration_s': duration,
+        'requests': len(results),
+        'errors': len(errors),
+        'first_errors': errors[:5],
+        'images': num_images,
+        'requests_per_second': num_successes / duration if duration > 0 else 0.,
+        'images_per_second': num_images / duration if duration > 0 else 0.,
+        'phases': {phase: histograms[phase].summary() for phase in PHASES},
+        'latency_distribution': histograms['total'].distribution(),
+    }
+
+
+def format_report(report):
+    """Return a human readable version of the report."""
+    lines = ['{requests} requests ({errors} errors), {images} images in {duration_s:.2f} s: '
+             '{requests_per_second:.2f} requests/s, {images_per_second:.2f} images/s'.format(**report),
+             '',
+             '{:<14}'.format('phase (ms)') + ''.join('{:>10}'.format(key) for key in
+                                                     ('mean', 'p50', 'p90', 'p99', 'p99.9', 'max'))]
+    for phase in PHASES:
+        summary = report['phases'][phase]
+        lines.append('{:<14}'.format(phase) + ''.join(
+            '{:>10.2f}'.format(summary[key]) for key in
+            ('mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'p999_ms', 'max_ms')))
+    lines += ['', '{:>12}{:>12}{:>10}'.format('value (ms)', 'percentile', 'count')]
+    for bucket in report['latency_distribution']:
+        lines.append('{value_ms:>12.3f}{percentile:>12.3f}{count:>10}'.format(**bucket))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks a tensorflow-serving endpoint.')
+    parser.add_argument('--server_url', dest='server_url', type=str, default=None,
+                        help='URL of the tensorflow-serving accepting API call. '
+                             'e.g. http://localhost:8501/v1/models/omr_500:predict')
+    parser.add_argument('--stub', dest='stub', action='store_true',
+                        help='Benchmark a local stub server instead of server_url, to test the client side offline')
+    parser.add_argument('--stub_latency_ms', dest='stub_latency_ms', type=float, default=0.,
+                        help='Inference time simulated by the stub server')
+    parser.add_argument('--input', dest='input', type=str, default='object_detection/test_images',
+                        help='Directory of images, glob pattern (quote it) or JSONL manifest of image paths to replay')
+    parser.add_argument('--num_requests', dest='num_requests', type=int, default=100,
+                        help='Number of requests to send, the corpus is replayed as many times as needed')
+    parser.add_argument('--warmup_requests', dest='warmup_requests', type=int, default=5,
+                        help='Number of requests sent before measuring')
+    parser.add_argument('--batch_size', dest='batch_size', type=int, default=1,
+                        help='Number of images packed in each request')
+    parser.add_argument('--qps', dest='qps', type=float, default=None,
+                        help='Send requests at this fixed rate (open loop). By default each of the --concurrency '
+                             'clients sends a new request as soon as the previous one returns (closed loop).')
+    parser.add_argument('--concurrency', dest='concurrency', type=int, default=1,
+                        help='Number of concurrent clients in closed loop, maximum number of requests in flight '
+                             'at a fixed rate')
+    parser.add_argument('--transport', dest='transport', type=str, default='json', choices=['json', 'b64', 'grpc'],
+                        help='How the images are sent, see client.py')
+    parser.add_argument('--model_name', dest='model_name', type=str, default=None,
+                        help='Name of the served model, required by the grpc transport')
+    parser.add_argument('--input_type', dest='input_type', type=str, default='image_tensor',
+                        choices=['image_tensor', 'encoded_image_string_tensor'],
+                        help='Input type the served model was exported with, used by the grpc transport')
+    parser.add_argument('--report_json', dest='report_json', type=str, default='benchmark_report.json',
+                        help='Path to the machine-readable report')
+    args = parser.parse_args()
+
+    if args.stub == (args.server_url is not None):
+        parser.error('exactly one of --server_url and --stub is required')
+    if args.stub and args.transport == 'grpc':
+        parser.error('the stub server only speaks REST')
+
+    requests_corpus = list(iter_batches(list_images(args.input), args.batch_size))
+    if not requests_corpus:
+        parser.error('no image found in {}'.format(args.input))
+    config = {key: value for key, value in vars(args).items() if key != 'report_json'}
+
+    def benchmark(server_url):
+        transport = build_transport(args.transport, server_url, model_name=args.model_name,
+                                    input_type=args.input_type, pool_size=args.concurrency)
+        run_closed_loop(transport, requests_corpus, args.warmup_requests, args.concurrency)
+        start = time.perf_counter()
+        if args.qps:
+            results = run_fixed_rate(transport, requests_corpus, args.num_requests, args.qps, args.concurrency)
+        else:
+            results = run_closed_loop(transport, requests_corpus, args.num_requests, args.concurrency)
+        return build_report(results, time.perf_counter() - start, config)
+
+    if args.stub:
+        with StubServer(latency=args.stub_latency_ms / 1000.) as stub_server:
+            report = benchmark(stub_server.url)
+    else:
+        report = benchmark(args.server_url)
+
+    print(format_report(report))
+    with open(args.report_json, 'w') as outfile:
+        json.dump(report, outfile, indent=2)
+    print(f'\nReport saved to {args.report_json}\n')
@@ -0,0 +1,59 @@
+"""
+Benchmark of the decoding of an image into a uint8 numpy array.
+
+Compares `object_detection.utils.image_util.load_image`, with and without a copy
+and with the JPEG draft mode, to the former `Image.getdata()` based decoding.
+"""
+import argparse
+import time
+
+import numpy as np
+from PIL import Image
+
+from object_detection.utils import image_util
+
+
+def load_image_with_getdata(image_path):
+    """
+    Former implementation of `image_util.load_image`, the baseline of the benchmark.
+    """
+    image = Image.open(image_path).convert('RGB')
+    (im_width, im_height) = image.size
+    return np.array(image.getdata()).reshape((im_height, im_width, 3)).astype(np.uint8)
+
+
+def benchmark_image_loading(image_path, min_dimension=None, repeats=10):
+    """
+    Times the image loading functions on an image, each one `repeats` times.
+
+    Returns a dictionary mapping each loading method to its mean time in seconds.
+    """
+    methods = {
+        'getdata': lambda: load_image_with_getdata(image_path),
+        'buffer': lambda: image_util.load_image(image_path),
+        'buffer_no_copy': lambda: image_util.load_image(image_path, copy=False),
+    }
+    if min_dimension is not None:
+        methods['draft'] = lambda: image_util.load_image(image_path, min_dimension)
+    timings = {}
+    for name, method in methods.items():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            method()
+        timings[name] = (time.perf_counter() - start) / repeats
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the decoding of an image into a numpy array.')
+    parser.add_argument('--image_path', dest='image_path', type=str, required=True,
+                        help='Path to the image to decode.')
+    parser.add_argument('--min_dimension', dest='min_dimension', type=int, default=None,
+                        help='Smallest side needed by the model, enables the JPEG draft mode.')
+    parser.add_argument('--repeats', dest='repeats', type=int, default=10,
+                        help='Number of decodings per method.')
+    args = parser.parse_args()
+
+    results = benchmark_image_loading(args.image_path, args.min_dimension, args.repeats)
+    for method_name, seconds in sorted(results.items(), key=lambda x: x[1]):
+        print('{:<16}{:>10.2f} ms{:>10.1f}x'.format(method_name, seconds * 1000, results['getdata'] / seconds))
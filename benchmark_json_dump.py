@@ -0,0 +1,76 @@
+"""
+Benchmark of the json dump of COCO detections.
+
+Compares `object_detection.utils.json_utils.Dumps` on lists of floats and on
+numpy arrays with the former implementation, which formatted each float with
+the pure python encoder, on a million random detections by default.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from object_detection.utils import json_utils
+
+
+def format_floats_dumps(obj, float_digits):
+    """
+    Former implementation of `json_utils.Dumps`, the baseline of the benchmark.
+
+    Formats each float with the pure python encoder, as the former global
+    json.encoder.FLOAT_REPR override did.
+    """
+    def float_str(value):
+        if value != value:
+            return 'NaN'
+        return format(value, '.%df' % float_digits)
+    encoder = json.JSONEncoder()
+    iterencode = json.encoder._make_iterencode(
+        {}, encoder.default, json.encoder.encode_basestring_ascii, None, float_str,
+        encoder.key_separator, encoder.item_separator, False, False, True)
+    return ''.join(iterencode(obj, 0))
+
+
+def benchmark_detections_dump(num_detections=1000000, float_digits=4, detections_per_image=100):
+    """
+    Times the dump of COCO detections with and without numpy arrays.
+
+    Returns a dictionary mapping each dump method to its time in seconds.
+    """
+    random_state = np.random.RandomState(0)
+    boxes = random_state.uniform(0., 500., size=(num_detections, 4))
+    scores = random_state.uniform(size=num_detections)
+    classes = random_state.randint(1, 91, size=num_detections)
+    detections = [{'image_id': index // detections_per_image, 'category_id': category_id, 'bbox': box, 'score': score}
+                  for index, (category_id, box, score)
+                  in enumerate(zip(classes.tolist(), boxes.tolist(), scores.tolist()))]
+    image_detections = [{'image_id': start // detections_per_image,
+                         'category_id': classes[start:start + detections_per_image],
+                         'bbox': boxes[start:start + detections_per_image],
+                         'score': scores[start:start + detections_per_image]}
+                        for start in range(0, num_detections, detections_per_image)]
+    methods = {
+        'format_floats': lambda: format_floats_dumps(detections, float_digits),
+        'round_floats': lambda: json_utils.Dumps(detections, float_digits=float_digits),
+        'round_arrays': lambda: json_utils.Dumps(image_detections, float_digits=float_digits),
+    }
+    timings = {}
+    for name, method in methods.items():
+        start = time.perf_counter()
+        method()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the json dump of COCO detections.')
+    parser.add_argument('--num_detections', dest='num_detections', type=int, default=1000000,
+                        help='Number of detections dumped.')
+    parser.add_argument('--float_digits', dest='float_digits', type=int, default=4,
+                        help='Number of digits of precision of the floats.')
+    args = parser.parse_args()
+
+    results = benchmark_detections_dump(args.num_detections, args.float_digits)
+    for method_name, seconds in sorted(results.items(), key=lambda x: x[1]):
+        print('{:<16}{:>10.2f} s{:>10.1f}x'.format(method_name, seconds, results['format_floats'] / seconds))
@@ -0,0 +1,80 @@
+"""
+Tests of the benchmark harness, run offline against the local stub server.
+"""
+import os
+import unittest
+
+from batch_client import iter_batches, list_images
+from benchmark import PHASES, LatencyHistogram, StubServer, build_report, run_closed_loop, run_fixed_rate
+from client import build_transport
+
+TEST_IMAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'object_detection', 'test_images')
+
+
+class LatencyHistogramTest(unittest.TestCase):
+
+    def test_percentiles(self):
+        histogram = LatencyHistogram()
+        for value_ms in range(1, 101):
+            histogram.record(value_ms / 1000.)
+        self.assertEqual(histogram.total_count, 100)
+        self.assertAlmostEqual(histogram.mean(), 0.0505)
+        # Values are known within 1%.
+        for percentile, expected in [(50., 0.050), (90., 0.090), (99., 0.099), (100., 0.100)]:
+            self.assertAlmostEqual(histogram.percentile(percentile), expected, delta=expected * 0.01)
+        self.assertEqual(histogram.percentile(0.), histogram.buckets()[0][0])
+
+    def test_empty_histogram(self):
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.percentile(99.), 0.)
+        self.assertEqual(histogram.summary()['count'], 0)
+
+
+class StubServerBenchmarkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.requests_corpus = list(iter_batches(list_images(TEST_IMAGES), 1))
+        self.assertTrue(self.requests_corpus)
+
+    def _check_report(self, report, num_requests, min_latency):
+        self.assertEqual(report['requests'], num_requests)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['first_errors'], [])
+        self.assertEqual(report['images'], num_requests)
+        self.assertGreater(report['requests_per_second'], 0.)
+        self.assertEqual(set(report['phases']), set(PHASES))
+        total = report['phases']['total']
+        self.assertEqual(total['count'], num_requests)
+        self.assertGreaterEqual(total['p50_ms'], min_latency * 1000)
+        self.assertLessEqual(total['p50_ms'], total['p99_ms'])
+        self.assertLessEqual(total['p99_ms'], total['max_ms'])
+        self.assertEqual(sum(bucket['count'] for bucket in report['latency_distribution']), num_requests)
+        self.assertAlmostEqual(report['latency_distribution'][-1]['percentile'], 100.)
+
+    def test_closed_loop(self):
+        with StubServer(num_detections=5, latency=0.01) as stub_server:
+            transport = build_transport('json', stub_server.url, pool_size=2)
+            results = run_closed_loop(transport, self.requests_corpus, num_requests=4, concurrency=2)
+        self._check_report(build_report(results, 1., {'concurrency': 2}), 4, 0.01)
+
+    def test_fixed_rate(self):
+        with StubServer(num_detections=5, latency=0.01) as stub_server:
+            transport = build_transport('b64', stub_server.url, pool_size=2)
+            results = run_fixed_rate(transport, self.requests_corpus, num_requests=4, qps=50., max_in_flight=2)
+        report = build_report(results, 1., {'qps': 50.})
+        self._check_report(report, 4, 0.01)
+        self.assertEqual(report['config'], {'qps': 50.})
+
+    def test_errors_are_reported(self):
+        with StubServer(num_detections=5) as stub_server:
+            url = stub_server.url
+        transport = build_transport('json', url, pool_size=1)
+        results = run_closed_loop(transport, self.requests_corpus, num_requests=2, concurrency=1)
+        report = build_report(results, 1., {})
+        self.assertEqual(report['errors'], 2)
+        self.assertEqual(report['images'], 0)
+        self.assertEqual(len(report['first_errors']), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
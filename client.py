@@ -2,16 +2,93 @@
 Client side code to perform a single API call to a tensorflow model up and running.
 """
 import argparse
+import base64
+import io
 import json
 
 import numpy as np
 import requests
+import requests.adapters
 from object_detection.utils import visualization_utils as vis_util
-from object_detection.utils import plot_util
 from object_detection.utils import label_map_util
+from object_detection.utils import image_util
 import object_detection.utils.ops as utils_ops
 from PIL import Image
 
+def _box_mask_placements(detection_masks, detection_boxes, N, image_size):
+    """
+    Resize and binarize the m*m detection soft masks to the pixel size of their box.
+
+    Args:
+        detection_masks (np.array): of size N * m * m
+        detection_boxes (np.array): of size N * 4 with the normalized box coordinates.
+            Coordinates are written as [y_min, x_min, y_max, x_max]
+        N (int): number of detections in the image
+        image_size (tuple(int))
+
+    Returns:
+        binary_masks (list(np.array)): N uint8 masks, each of the size of its box clipped to the image.
+        pixel_boxes (np.array): of size N * 4 with the absolute, clipped box coordinates
+            [y_min, x_min, y_max, x_max] (max coordinates are exclusive).
+    """
+    (height, width) = image_size[:2]
+    thresh = 0.5
+    detection_boxes = np.asarray(detection_boxes, dtype=np.float64)[:N]
+    if N == 0:
+        return [], np.zeros((0, 4), dtype=np.int64)
+
+    # Absolute boundaries of every box, computed for all detections at once
+    y_min = (detection_boxes[:, 0] * height).astype(np.int64)
+    x_min = (detection_boxes[:, 1] * width).astype(np.int64)
+    d_y = ((detection_boxes[:, 2] - detection_boxes[:, 0]) * height).astype(np.int64)
+    d_x = ((detection_boxes[:, 3] - detection_boxes[:, 1]) * width).astype(np.int64)
+
+    # Clip the boxes at the image borders
+    top = np.clip(y_min, 0, height)
+    left = np.clip(x_min, 0, width)
+    bottom = np.clip(y_min + np.maximum(d_y, 0), 0, height)
+    right = np.clip(x_min + np.maximum(d_x, 0), 0, width)
+    pixel_boxes = np.stack([top, left, bottom, right], axis=1)
+
+    binary_masks = []
+    for i in range(N):
+        if bottom[i] <= top[i] or right[i] <= left[i]:
+            binary_masks.append(np.zeros((bottom[i] - top[i], right[i] - left[i]), dtype=np.uint8))
+            continue
+
+        # Resize the mask to the box size using LANCZOS approximation
+        normalized_mask = Image.fromarray(np.asarray(detection_masks[i], dtype=np.float32), 'F')
+        resized_mask = np.asarray(normalized_mask.resize((int(d_x[i]), int(d_y[i])), Image.LANCZOS))
+
+        # Binarize with a fixed threshold and drop the part of the box lying outside the image
+        binary_mask_box = (resized_mask >= thresh).view(np.uint8)
+        binary_masks.append(binary_mask_box[top[i] - y_min[i]:bottom[i] - y_min[i],
+                                            left[i] - x_min[i]:right[i] - x_min[i]])
+
+    return binary_masks, pixel_boxes
+
+
+def format_cropped_mask(detection_masks, detection_boxes, N, image_size):
+    """
+    Format the m*m detection soft masks as binary masks cropped to their boxes.
+
+    Much lighter than `format_mask` since only the pixels inside each box are stored.
+
+    Args:
+        detection_masks (np.array): of size N * m * m
+        detection_boxes (np.array): of size N * 4 with the normalized box coordinates.
+            Coordinates are written as [y_min, x_min, y_max, x_max]
+        N (int): number of detections in the image
+        image_size (tuple(int))
+
+    Returns:
+        detection_masks (list(np.array)): N uint8 masks of size h_i * w_i, the size of each box.
+        detection_mask_boxes (np.array): of size N * 4 with the absolute box coordinates
+            [y_min, x_min, y_max, x_max] locating each mask in the image.
+    """
+    return _box_mask_placements(detection_masks, detection_boxes, N, image_size)
+
+
 def format_mask(detection_masks, detection_boxes, N, image_size):
     """
     Format the m*m detection soft masks as full size binary masks. 
@@ -27,115 +104,302 @@ def format_mask(detection_masks, detection_boxes, N, image_size):
         detection_masks (np.array): of size N * H * W  where H and W are the image Height and Width.
     
     """
-    (height, width, _) = image_size
-    output_masks = np.zeros((N, image_size[0], image_size[1]))
-    # Process the masks related to the N objects detected in the image
-    for i in range(N):
-        normalized_mask = detection_masks[i].astype(np.float32)
-        normalized_mask = Image.fromarray(normalized_mask, 'F')
-
-        # Boxes are expressed with 4 scalars - normalized coordinates [y_min, x_min, y_max, x_max]
-        [y_min, x_min, y_max, x_max] = detection_boxes[i]
-
-        # Compute absolute boundary of box
-        box_size = (int((x_max - x_min) * width), int((y_max - y_min) * height)) 
-
-        # Resize the mask to the box size using LANCZOS appoximation
-        resized_mask = normalized_mask.resize(box_size, Image.LANCZOS)
-        
-        # Convert back to array
-        resized_mask = np.array(resized_mask).astype(np.float32)
-
-        # Binarize the image by using a fixed threshold
-        binary_mask_box = np.zeros(resized_mask.shape)
-        thresh = 0.5
-        (h, w) = resized_mask.shape
-
-        for k in range(h):
-            for j in range(w):
-                if resized_mask[k][j] >= thresh:
-                    binary_mask_box[k][j] = 1
-
-        binary_mask_box = binary_mask_box.astype(np.uint8)
-
-        # Replace the mask in the context of the original image size
-        binary_mask = np.zeros((height, width))
-        
-        x_min_at_scale = int(x_min * width)
-        y_min_at_scale = int(y_min * height)
-
-        d_x = int((x_max - x_min) * width)
-        d_y = int((y_max - y_min) * height)
-
-        for x in range(d_x):
-            for y in range(d_y):
-                binary_mask[y_min_at_scale + y][x_min_at_scale + x] = binary_mask_box[y][x] 
-        
-        # Update the masks array
-        output_masks[i][:][:] = binary_mask
-
-    # Cast mask as integer
-    output_masks = output_masks.astype(np.uint8)
+    (height, width) = image_size[:2]
+    output_masks = np.zeros((N, height, width), dtype=np.uint8)
+    binary_masks, pixel_boxes = _box_mask_placements(detection_masks, detection_boxes, N, image_size)
+
+    # Paste each box mask in the context of the original image size
+    for i, (top, left, bottom, right) in enumerate(pixel_boxes):
+        output_masks[i, top:bottom, left:right] = binary_masks[i]
+
     return output_masks
 
 def load_image_into_numpy_array(image):
-  (im_width, im_height) = image.size
-  return np.array(image.getdata()).reshape(
-      (im_height, im_width, 3)).astype(np.uint8)
+  return image_util.load_image_into_numpy_array(image)
 
 
-def pre_process(image_path):
+def pre_process(image_path, signature_name="serving_default", min_dimension=None):
     """
     Pre-process the input image to return a json to pass to the tf model
 
     Args:
         image_path (str):  Path to the jpeg image
+        signature_name (str): Signature of the served model to call
+        min_dimension (int): smallest image side the model needs, lets JPEG images be decoded downscaled
 
     Returns:
         formatted_json_input (str)
     """
 
-    image = Image.open(image_path).convert("RGB")
-    image_np = plot_util.load_image_into_numpy_array(image)
+    image_np = image_util.load_image(image_path, min_dimension=min_dimension, copy=False)
 
     # Expand dims to create  bach of size 1
     image_tensor = np.expand_dims(image_np, 0)
-    formatted_json_input = json.dumps({"signature_name": "serving_default", "instances": image_tensor.tolist()})
+    formatted_json_input = json.dumps({"signature_name": signature_name, "instances": image_tensor.tolist()})
 
     return formatted_json_input
 
 
-def post_process(server_response, image_size):
+def post_process(server_response, image_size, crop_masks=False):
     """
     Post-process the server response
 
     Args:
         server_response (requests.Response)
         image_size (tuple(int))
+        crop_masks (bool): if True, detection masks are cropped to their boxes (see `format_cropped_mask`)
+            and their location is stored under 'detection_mask_boxes', instead of full size masks.
 
     Returns:
         post_processed_data (dict)
     """
     response = json.loads(server_response.text)
-    output_dict = response['predictions'][0]
+    return format_output_dict(response['predictions'][0], image_size, crop_masks=crop_masks)
+
 
+def format_output_dict(output_dict, image_size, crop_masks=False):
+    """
+    Convert the predictions of a single image to numpy arrays of the appropriate types.
+
+    Args:
+        output_dict (dict): predictions of one image, as lists or numpy arrays
+        image_size (tuple(int))
+        crop_masks (bool): see `post_process`
+
+    Returns:
+        post_processed_data (dict)
+    """
     # all outputs are float32 numpy arrays, so convert types as appropriate
 
     output_dict['num_detections'] = int(output_dict['num_detections'])
-    output_dict['detection_classes'] = np.array([int(class_id) for class_id in output_dict['detection_classes']])
-    output_dict['detection_boxes'] = np.array(output_dict['detection_boxes'])
-    output_dict['detection_scores'] = np.array(output_dict['detection_scores'])
+    output_dict['detection_classes'] = np.asarray(output_dict['detection_classes']).astype(np.int64)
+    output_dict['detection_boxes'] = np.asarray(output_dict['detection_boxes'])
+    output_dict['detection_scores'] = np.asarray(output_dict['detection_scores'])
 
     # Process detection mask
     if 'detection_masks' in output_dict:
-        # Determine a threshold above wihc we consider the pixel shall belong to the mask
-        # thresh = 0.5
-        output_dict['detection_masks'] = np.array(output_dict['detection_masks'])
-        output_dict['detection_masks'] = format_mask(output_dict['detection_masks'], output_dict['detection_boxes'], output_dict['num_detections'], image_size)
+        output_dict['detection_masks'] = np.asarray(output_dict['detection_masks'])
+        if crop_masks:
+            output_dict['detection_masks'], output_dict['detection_mask_boxes'] = format_cropped_mask(
+                output_dict['detection_masks'], output_dict['detection_boxes'], output_dict['num_detections'], image_size)
+        else:
+            output_dict['detection_masks'] = format_mask(output_dict['detection_masks'], output_dict['detection_boxes'], output_dict['num_detections'], image_size)
     
     return output_dict
 
 
+def encode_image(image_path, image_format=None):
+    """
+    Read an image as an encoded JPEG/PNG string, re-encoding it only when needed.
+
+    Args:
+        image_path (str): Path to the image
+        image_format (str): 'jpeg' or 'png' to force the encoding, None to send JPEG and PNG files as is
+
+    Returns:
+        encoded_image (bytes)
+    """
+    image = Image.open(image_path)
+    if image_format is None and image.format in ('JPEG', 'PNG'):
+        with open(image_path, 'rb') as f:
+            return f.read()
+
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format=(image_format or 'jpeg').upper())
+    return buffer.getvalue()
+
+
+def _load_image_batch(image_paths, min_dimension=None):
+    """Decode the images and stack them in a single uint8 batch of size len(image_paths) * H * W * 3."""
+    images = [image_util.load_image(image_path, min_dimension=min_dimension, copy=False)
+              for image_path in image_paths]
+    if len({image.shape for image in images}) > 1:
+        raise ValueError('Images of a batch must have the same size to be sent as an image tensor, '
+                         'use a batch size of 1 or an encoded image transport')
+    return np.stack(images)
+
+
+class JsonTransport(object):
+    """
+    Send the decoded image as a nested list of pixels to the REST API.
+
+    Works with models exported with the `image_tensor` input type, but the request
+    weighs about 20 times the raw image size. Connections are kept alive in a pool
+    of `pool_size` connections shared by all the threads using the transport.
+    JPEG images are decoded downscaled when `min_dimension` is given.
+    """
+
+    def __init__(self, server_url, signature_name='serving_default', pool_size=10, min_dimension=None):
+        self.server_url = server_url
+        self.signature_name = signature_name
+        self.min_dimension = min_dimension
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def build_request(self, image_path):
+        return pre_process(image_path, self.signature_name, self.min_dimension)
+
+    def prepare_inputs(self, image_paths):
+        """Load the images in the form expected by `serialize`."""
+        return _load_image_batch(image_paths, self.min_dimension)
+
+    def serialize(self, inputs):
+        """Build the request sent to the server from the prepared inputs."""
+        return json.dumps({"signature_name": self.signature_name, "instances": inputs.tolist()})
+
+    def build_batch_request(self, image_paths):
+        return self.serialize(self.prepare_inputs(image_paths))
+
+    def send(self, request):
+        headers = {"content-type": "application/json"}
+        return self.session.post(self.server_url, data=request, headers=headers)
+
+    def parse_response(self, server_response):
+        """Return the list of the per image prediction dicts."""
+        server_response.raise_for_status()
+        return json.loads(server_response.text)['predictions']
+
+    def dump_response(self, server_response, outfile):
+        outfile.write(server_response.text)
+
+    def predict(self, image_path):
+        return self.parse_response(self.send(self.build_request(image_path)))
+
+    def predict_batch(self, image_paths):
+        return self.parse_response(self.send(self.build_batch_request(image_paths)))
+
+
+class Base64ImageTransport(JsonTransport):
+    """
+    Send the encoded JPEG/PNG image as a `{"b64": ...}` instance to the REST API.
+
+    Requires a model exported with the `encoded_image_string_tensor` input type.
+    """
+
+    def __init__(self, server_url, signature_name='serving_default', image_format=None, pool_size=10):
+        super(Base64ImageTransport, self).__init__(server_url, signature_name, pool_size=pool_size)
+        self.image_format = image_format
+
+    def build_request(self, image_path):
+        return self.build_batch_request([image_path])
+
+    def prepare_inputs(self, image_paths):
+        return [encode_image(image_path, self.image_format) for image_path in image_paths]
+
+    def serialize(self, inputs):
+        instances = [{"b64": base64.b64encode(encoded_image).decode('ascii')} for encoded_image in inputs]
+        return json.dumps({"signature_name": self.signature_name, "instances": instances})
+
+
+class GrpcTransport(object):
+    """
+    Send the image as a binary `TensorProto` in a gRPC `PredictRequest`.
+
+    Works with both `image_tensor` and `encoded_image_string_tensor` models, and
+    avoids any JSON (de)serialization. Requires the `tensorflow-serving-api` package.
+    A single HTTP/2 channel is multiplexed between all the threads using the transport.
+    """
+
+    def __init__(self, server_address, model_name, signature_name='serving_default',
+                 input_type='image_tensor', image_format=None, timeout=30.0, min_dimension=None):
+        import grpc
+        import tensorflow as tf
+        from tensorflow_serving.apis import predict_pb2
+        from tensorflow_serving.apis import prediction_service_pb2_grpc
+
+        if input_type not in ('image_tensor', 'encoded_image_string_tensor'):
+            raise ValueError('Unsupported input type: {}'.format(input_type))
+        self._tf = tf
+        self._predict_pb2 = predict_pb2
+        self.model_name = model_name
+        self.signature_name = signature_name
+        self.input_type = input_type
+        self.image_format = image_format
+        self.timeout = timeout
+        self.min_dimension = min_dimension
+        self.channel = grpc.insecure_channel(
+            server_address,
+            options=[('grpc.max_send_message_length', -1), ('grpc.max_receive_message_length', -1)])
+        self.stub = prediction_service_pb2_grpc.PredictionServiceStub(self.channel)
+
+    def build_request(self, image_path):
+        return self.build_batch_request([image_path])
+
+    def prepare_inputs(self, image_paths):
+        """Load the images in the form expected by `serialize`."""
+        if self.input_type == 'image_tensor':
+            return _load_image_batch(image_paths, self.min_dimension)
+        return [encode_image(image_path, self.image_format) for image_path in image_paths]
+
+    def serialize(self, inputs):
+        """Build the `PredictRequest` sent to the server from the prepared inputs."""
+        request = self._predict_pb2.PredictRequest()
+        request.model_spec.name = self.model_name
+        request.model_spec.signature_name = self.signature_name
+        if self.input_type == 'image_tensor':
+            tensor_proto = self._tf.make_tensor_proto(inputs, dtype=self._tf.uint8)
+        else:
+            tensor_proto = self._tf.make_tensor_proto(inputs, dtype=self._tf.string, shape=[len(inputs)])
+        request.inputs['inputs'].CopyFrom(tensor_proto)
+        return request
+
+    def build_batch_request(self, image_paths):
+        return self.serialize(self.prepare_inputs(image_paths))
+
+    def send(self, request):
+        return self.stub.Predict(request, self.timeout)
+
+    def parse_response(self, server_response):
+        """Return the list of the per image prediction dicts."""
+        outputs = {key: self._tf.make_ndarray(tensor_proto) for key, tensor_proto in server_response.outputs.items()}
+        batch_size = len(next(iter(outputs.values()))) if outputs else 0
+        return [{key: value[i] for key, value in outputs.items()} for i in range(batch_size)]
+
+    def dump_response(self, server_response, outfile):
+        predictions = [{key: value.tolist() for key, value in output_dict.items()}
+                       for output_dict in self.parse_response(server_response)]
+        json.dump({"predictions": predictions}, outfile)
+
+    def predict(self, image_path):
+        return self.parse_response(self.send(self.build_request(image_path)))
+
+    def predict_batch(self, image_paths):
+        return self.parse_response(self.send(self.build_batch_request(image_paths)))
+
+
+def build_transport(transport, server_url, signature_name='serving_default', model_name=None,
+                    input_type='image_tensor', image_format=None, pool_size=10, min_dimension=None):
+    """
+    Build the transport used to talk to the tensorflow server.
+
+    Args:
+        transport (str): one of 'json', 'b64' or 'grpc'
+        server_url (str): REST predict URL, or host:port of the gRPC endpoint for 'grpc'
+        signature_name (str)
+        model_name (str): name of the served model, required for 'grpc'
+        input_type (str): input type the model was exported with, used by 'grpc'
+        image_format (str): 'jpeg' or 'png' to force the image encoding of 'b64' and 'grpc'
+        pool_size (int): number of HTTP connections kept alive by the 'json' and 'b64' transports
+        min_dimension (int): smallest image side the model needs, to decode JPEG images downscaled
+            before sending them as image tensors with 'json' and 'grpc'
+
+    Returns:
+        transport (JsonTransport, Base64ImageTransport or GrpcTransport)
+    """
+    if transport == 'json':
+        return JsonTransport(server_url, signature_name, pool_size=pool_size, min_dimension=min_dimension)
+    if transport == 'b64':
+        return Base64ImageTransport(server_url, signature_name, image_format=image_format, pool_size=pool_size)
+    if transport == 'grpc':
+        if model_name is None:
+            raise ValueError('model_name is required for the grpc transport')
+        return GrpcTransport(server_url, model_name, signature_name, input_type=input_type,
+                             image_format=image_format, min_dimension=min_dimension)
+    raise ValueError('Unknown transport: {}'.format(transport))
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Performs call to the tensorflow-serving REST API.')
     parser.add_argument('--server_url', dest='server_url', type=str, required=True,
@@ -150,6 +414,24 @@ if __name__ == '__main__':
     parser.add_argument('--label_map', dest='label_map', type=str, default="mapping_all_classes.txt",
                         help='Path to the label map, which is json-file that maps each category name '
                              'to a unique number.')
+    parser.add_argument('--label_map_cache', dest='label_map_cache', type=str, default=None,
+                        help='Optional path of a pickle file caching the parsed label map across runs. It is '
+                             'rebuilt when the label map changes.')
+    parser.add_argument('--transport', dest='transport', type=str, default='json', choices=['json', 'b64', 'grpc'],
+                        help='How the image is sent: json pixel lists, base64 encoded image over REST '
+                             '(encoded_image_string_tensor models) or binary tensor over gRPC, in which case '
+                             'server_url is the host:port of the gRPC endpoint, e.g. localhost:8500')
+    parser.add_argument('--model_name', dest='model_name', type=str, default=None,
+                        help='Name of the served model, required by the grpc transport')
+    parser.add_argument('--input_type', dest='input_type', type=str, default='image_tensor',
+                        choices=['image_tensor', 'encoded_image_string_tensor'],
+                        help='Input type the served model was exported with, used by the grpc transport')
+    parser.add_argument('--image_format', dest='image_format', type=str, default=None, choices=['jpeg', 'png'],
+                        help='Re-encode the image in this format before sending it with the b64 or grpc transport. '
+                             'By default JPEG and PNG files are sent as is.')
+    parser.add_argument('--min_dimension', dest='min_dimension', type=int, default=None,
+                        help='Smallest image side the model needs (e.g. the min_dimension of its image resizer). '
+                             'JPEG images are then decoded downscaled before being sent as image tensors.')
     args = parser.parse_args()
 
     # Map args to var
@@ -158,34 +440,36 @@ if __name__ == '__main__':
     output_image = args.output_json
     save_output_image = args.save_output_image
     path_to_labels = args.label_map
+    transport = build_transport(args.transport, server_url, model_name=args.model_name,
+                                input_type=args.input_type, image_format=args.image_format,
+                                min_dimension=args.min_dimension)
 
     # Build input data
     print(f'\n\nPre-processing input file {image_path}...\n')
-    formatted_json_input = pre_process(image_path)
+    request = transport.build_request(image_path)
     print('Pre-processing done! \n')
 
     # Call tensorflow server
-    headers = {"content-type": "application/json"}
     print(f'\n\nMaking request to {server_url}...\n')
-    server_response = requests.post(server_url, data=formatted_json_input, headers=headers)
+    server_response = transport.send(request)
     print(f'Request returned\n')
 
     # Post process output
     print(f'\n\nPost-processing server response...\n')
-    image = Image.open(image_path).convert("RGB")
-    image_np = load_image_into_numpy_array(image)
-    output_dict = post_process(server_response, image_np.shape)
+    image_np = image_util.load_image(image_path)
+    output_dict = format_output_dict(transport.parse_response(server_response)[0], image_np.shape)
     print(f'Post-processing done!\n')
 
     # Save output on disk
     print(f'\n\nSaving output to {output_image}\n\n')
     with open(output_image, 'w+') as outfile:
-        json.dump(json.loads(server_response.text), outfile)
+        transport.dump_response(server_response, outfile)
     print(f'Output saved!\n')
 
     if save_output_image:
         # Save output on disk
-        category_index = label_map_util.create_category_index_from_labelmap(path_to_labels, use_display_name=True)
+        category_index = label_map_util.load_category_lookup(
+            path_to_labels, use_display_name=True, sidecar_path=args.label_map_cache).category_index()
 
         # Visualization of the results of a detection.
         vis_util.visualize_boxes_and_labels_on_image_array(
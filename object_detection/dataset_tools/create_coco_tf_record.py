@@ -25,16 +25,27 @@ Example usage:
       --train_annotations_file="${TRAIN_ANNOTATIONS_FILE}" \
       --val_annotations_file="${VAL_ANNOTATIONS_FILE}" \
       --testdev_annotations_file="${TESTDEV_ANNOTATIONS_FILE}" \
-      --output_dir="${OUTPUT_DIR}"
+      --output_dir="${OUTPUT_DIR}" \
+      --num_workers=8
+
+The annotations file is parsed incrementally, keeping only the fields of the
+annotations used for the conversion, and the examples are created by a pool of
+--num_workers processes. Example k is written to shard k % num_shards whatever
+the number of workers. At most a few chunks of images per worker are read ahead
+of the examples written.
 """
 from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
 import hashlib
 import io
+import itertools
 import json
+import multiprocessing
 import os
+import time
 import contextlib2
 import numpy as np
 import PIL.Image
@@ -64,6 +75,9 @@ tf.flags.DEFINE_string('val_annotations_file', '',
 tf.flags.DEFINE_string('testdev_annotations_file', '',
                        'Test-dev annotations JSON file.')
 tf.flags.DEFINE_string('output_dir', '/tmp/', 'Output data directory.')
+tf.flags.DEFINE_integer('num_workers', 1,
+                        'Number of processes creating the tf.Examples, 0 for '
+                        'the number of CPUs.')
 
 FLAGS = flags.FLAGS
 
@@ -191,8 +205,203 @@ def create_tf_example(image,
   return key, example, num_annotations_skipped
 
 
+def _iterate_json_arrays(fid, read_size=1 << 20):
+  """Incrementally parses the arrays of a JSON object.
+
+  Only one element of an array is decoded at a time, so the whole file is never
+  held in memory as Python objects. Values of the object that are not arrays are
+  skipped.
+
+  Args:
+    fid: file object opened on a JSON file holding an object.
+    read_size: number of characters read from the file at once.
+
+  Yields:
+    (key, element) for each element of each array value of the object.
+
+  Raises:
+    ValueError: if the file does not hold a valid JSON object.
+  """
+  decoder = json.JSONDecoder()
+  state = {'buffer': '', 'position': 0, 'eof': False}
+
+  def fill(size=read_size):
+    """Reads more of the file, returns False at the end of the file."""
+    if state['eof']:
+      return False
+    chunk = fid.read(size)
+    if not chunk:
+      state['eof'] = True
+      return False
+    state['buffer'] = state['buffer'][state['position']:] + chunk
+    state['position'] = 0
+    return True
+
+  def next_char():
+    """Skips whitespaces and returns the next character, '' at the end."""
+    while True:
+      buf = state['buffer']
+      position = state['position']
+      while position < len(buf) and buf[position].isspace():
+        position += 1
+      state['position'] = position
+      if position < len(buf):
+        return buf[position]
+      if not fill():
+        return ''
+
+  def expect(chars):
+    char = next_char()
+    if char not in chars:
+      raise ValueError('Expected one of {!r} in JSON file, got {!r}.'.format(
+          chars, char))
+    state['position'] += 1
+    return char
+
+  def decode():
+    """Decodes the next value, reading more of the file until it is complete."""
+    next_char()
+    size = read_size
+    while True:
+      try:
+        value, end = decoder.raw_decode(state['buffer'], state['position'])
+        # A value ending the buffer may be a truncated number or literal.
+        if end < len(state['buffer']) or state['eof']:
+          state['position'] = end
+          return value
+      except ValueError:
+        if state['eof']:
+          raise
+      # Reads twice more each time so that large values are not decoded again
+      # and again.
+      fill(size)
+      size *= 2
+
+  expect('{')
+  if next_char() == '}':
+    return
+  while True:
+    key = decode()
+    expect(':')
+    if next_char() == '[':
+      expect('[')
+      if next_char() == ']':
+        expect(']')
+      else:
+        while True:
+          yield key, decode()
+          if expect(',]') == ']':
+            break
+    else:
+      decode()
+    if expect(',}') == '}':
+      return
+
+
+# Fields of the COCO annotations used by create_tf_example.
+_ANNOTATION_FIELDS = ('bbox', 'iscrowd', 'category_id', 'area')
+
+
+def _load_coco_annotations(annotations_file, include_masks):
+  """Loads the images, categories and an annotations index of a COCO file.
+
+  Args:
+    annotations_file: JSON file containing bounding box annotations.
+    include_masks: Whether to keep the segmentation of the annotations.
+
+  Returns:
+    images: list of the image dicts of the file.
+    categories: list of the category dicts of the file.
+    annotations_index: dict mapping the id of each image to the list of its
+      annotations, holding only the fields needed by create_tf_example.
+  """
+  fields = _ANNOTATION_FIELDS + (('segmentation',) if include_masks else ())
+  images = []
+  categories = []
+  annotations_index = {}
+  with tf.gfile.GFile(annotations_file, 'r') as fid:
+    for key, value in _iterate_json_arrays(fid):
+      if key == 'images':
+        images.append(value)
+      elif key == 'categories':
+        categories.append(value)
+      elif key == 'annotations':
+        annotations_index.setdefault(value['image_id'], []).append(
+            {field: value[field] for field in fields})
+  if annotations_index:
+    tf.logging.info('Found groundtruth annotations. Built annotations index.')
+  return images, categories, annotations_index
+
+
+# Arguments of create_tf_example shared by all the images, set in each pool
+# worker by _init_tf_example_worker.
+_worker_kwargs = None
+
+
+def _init_tf_example_worker(image_dir, category_index, include_masks):
+  global _worker_kwargs
+  _worker_kwargs = {
+      'image_dir': image_dir,
+      'category_index': category_index,
+      'include_masks': include_masks,
+  }
+
+
+def _create_serialized_tf_example(image_and_annotations):
+  """Runs create_tf_example in a pool worker.
+
+  Args:
+    image_and_annotations: (image, annotations_list) tuple.
+
+  Returns:
+    the serialized tf.Example and the number of skipped annotations.
+  """
+  image, annotations_list = image_and_annotations
+  _, tf_example, num_annotations_skipped = create_tf_example(
+      image, annotations_list, **_worker_kwargs)
+  return tf_example.SerializeToString(), num_annotations_skipped
+
+
+def _map_chunk(func, chunk):
+  return [func(element) for element in chunk]
+
+
+def _imap_bounded(pool, func, iterable, chunk_size, max_pending_chunks):
+  """Lazily maps func over iterable with a process pool, in order.
+
+  Unlike pool.imap, which reads its whole input iterable up front, the elements
+  are sent to the pool in chunks and at most max_pending_chunks chunks are read
+  from iterable and not yielded yet, to bound the memory used.
+
+  Args:
+    pool: a multiprocessing.Pool.
+    func: a picklable function of one element.
+    iterable: the elements to map func over.
+    chunk_size: number of elements sent to a worker at once.
+    max_pending_chunks: maximum number of chunks submitted to the pool and not
+      yielded yet.
+
+  Yields:
+    func(element) for each element of iterable, in order.
+  """
+  iterator = iter(iterable)
+  pending_chunks = collections.deque()
+  while True:
+    chunk = list(itertools.islice(iterator, chunk_size))
+    if not chunk:
+      break
+    if len(pending_chunks) >= max_pending_chunks:
+      for result in pending_chunks.popleft().get():
+        yield result
+    pending_chunks.append(pool.apply_async(_map_chunk, (func, chunk)))
+  while pending_chunks:
+    for result in pending_chunks.popleft().get():
+      yield result
+
+
 def _create_tf_record_from_coco_annotations(
-    annotations_file, image_dir, output_path, include_masks, num_shards):
+    annotations_file, image_dir, output_path, include_masks, num_shards,
+    num_workers=1):
   """Loads COCO annotation json files and converts to tf.Record format.
 
   Args:
@@ -202,46 +411,56 @@ def _create_tf_record_from_coco_annotations(
     include_masks: Whether to include instance segmentations masks
       (PNG encoded) in the result. default: False.
     num_shards: number of output file shards.
+    num_workers: number of processes creating the tf.Examples, None for the
+      number of CPUs. The examples are created in the main process if 1.
   """
-  with contextlib2.ExitStack() as tf_record_close_stack, \
-      tf.gfile.GFile(annotations_file, 'r') as fid:
-    output_tfrecords = tf_record_creation_util.open_sharded_output_tfrecords(
-        tf_record_close_stack, output_path, num_shards)
-    groundtruth_data = json.load(fid)
-    images = groundtruth_data['images']
-    category_index = label_map_util.create_category_index(
-        groundtruth_data['categories'])
-
-    annotations_index = {}
-    if 'annotations' in groundtruth_data:
-      tf.logging.info(
-          'Found groundtruth annotations. Building annotations index.')
-      for annotation in groundtruth_data['annotations']:
-        image_id = annotation['image_id']
-        if image_id not in annotations_index:
-          annotations_index[image_id] = []
-        annotations_index[image_id].append(annotation)
-    missing_annotation_count = 0
-    for image in images:
-      image_id = image['id']
-      if image_id not in annotations_index:
-        missing_annotation_count += 1
-        annotations_index[image_id] = []
-    tf.logging.info('%d images are missing annotations.',
-                    missing_annotation_count)
-
-    total_num_annotations_skipped = 0
-    for idx, image in enumerate(images):
-      if idx % 100 == 0:
-        tf.logging.info('On image %d of %d', idx, len(images))
-      annotations_list = annotations_index[image['id']]
-      _, tf_example, num_annotations_skipped = create_tf_example(
-          image, annotations_list, image_dir, category_index, include_masks)
-      total_num_annotations_skipped += num_annotations_skipped
-      shard_idx = idx % num_shards
-      output_tfrecords[shard_idx].write(tf_example.SerializeToString())
-    tf.logging.info('Finished writing, skipped %d annotations.',
-                    total_num_annotations_skipped)
+  images, categories, annotations_index = _load_coco_annotations(
+      annotations_file, include_masks)
+  category_index = label_map_util.create_category_index(categories)
+  missing_annotation_count = sum(
+      1 for image in images if image['id'] not in annotations_index)
+  tf.logging.info('%d images are missing annotations.',
+                  missing_annotation_count)
+  images_and_annotations = (
+      (image, annotations_index.get(image['id'], [])) for image in images)
+
+  num_workers = num_workers or multiprocessing.cpu_count()
+  pool = None
+  if num_workers == 1:
+    _init_tf_example_worker(image_dir, category_index, include_masks)
+    serialized_examples = (
+        _create_serialized_tf_example(image_and_annotations)
+        for image_and_annotations in images_and_annotations)
+  else:
+    pool = multiprocessing.Pool(
+        num_workers,
+        initializer=_init_tf_example_worker,
+        initargs=(image_dir, category_index, include_masks))
+    serialized_examples = _imap_bounded(
+        pool, _create_serialized_tf_example, images_and_annotations,
+        chunk_size=16, max_pending_chunks=2 * num_workers)
+
+  try:
+    with contextlib2.ExitStack() as tf_record_close_stack:
+      output_tfrecords = tf_record_creation_util.open_sharded_output_tfrecords(
+          tf_record_close_stack, output_path, num_shards)
+      total_num_annotations_skipped = 0
+      start_time = time.time()
+      for idx, (serialized_example, num_annotations_skipped) in enumerate(
+          serialized_examples):
+        if idx % 100 == 0:
+          elapsed_time = time.time() - start_time
+          tf.logging.info('On image %d of %d, %.1f images/s', idx, len(images),
+                          idx / elapsed_time if elapsed_time > 0 else 0.)
+        total_num_annotations_skipped += num_annotations_skipped
+        shard_idx = idx % num_shards
+        output_tfrecords[shard_idx].write(serialized_example)
+  finally:
+    if pool is not None:
+      pool.terminate()
+  tf.logging.info('Finished writing %d images in %.1fs, skipped %d '
+                  'annotations.', len(images), time.time() - start_time,
+                  total_num_annotations_skipped)
 
 
 def main(_):
@@ -263,19 +482,22 @@ def main(_):
       FLAGS.train_image_dir,
       train_output_path,
       FLAGS.include_masks,
-      num_shards=100)
+      num_shards=100,
+      num_workers=FLAGS.num_workers)
   _create_tf_record_from_coco_annotations(
       FLAGS.val_annotations_file,
       FLAGS.val_image_dir,
       val_output_path,
       FLAGS.include_masks,
-      num_shards=10)
+      num_shards=10,
+      num_workers=FLAGS.num_workers)
   _create_tf_record_from_coco_annotations(
       FLAGS.testdev_annotations_file,
       FLAGS.test_image_dir,
       testdev_output_path,
       FLAGS.include_masks,
-      num_shards=100)
+      num_shards=100,
+      num_workers=FLAGS.num_workers)
 
 
 if __name__ == '__main__':
@@ -16,10 +16,12 @@
 
 import io
 import json
+import multiprocessing
 import os
 
 import numpy as np
 import PIL.Image
+import six
 import tensorflow as tf
 
 from object_detection.dataset_tools import create_coco_tf_record
@@ -246,6 +248,90 @@ class CreateCocoTFRecordTest(tf.test.TestCase):
     self.assertTrue(os.path.exists(output_path + '-00000-of-00002'))
     self.assertTrue(os.path.exists(output_path + '-00001-of-00002'))
 
+  def test_iterate_json_arrays(self):
+    groundtruth_data = {
+        'info': {'year': 2017},
+        'images': [{'id': 11, 'file_name': 'a.jpg'}, {'id': 12}],
+        'annotations': [],
+        'categories': [{'name': 'dog', 'id': 1}],
+    }
+    for indent in [None, 2]:
+      fid = io.StringIO(
+          six.text_type(json.dumps(groundtruth_data, indent=indent)))
+      self.assertEqual(
+          [('images', {'id': 11, 'file_name': 'a.jpg'}), ('images', {'id': 12}),
+           ('categories', {'name': 'dog', 'id': 1})],
+          list(create_coco_tf_record._iterate_json_arrays(fid, read_size=3)))
+
+  def test_iterate_json_arrays_raises_on_truncated_file(self):
+    fid = io.StringIO(u'{"images": [{"id": 11}, {"id"')
+    with self.assertRaises(ValueError):
+      list(create_coco_tf_record._iterate_json_arrays(fid))
+
+  def test_create_sharded_tf_record_in_parallel(self):
+    tmp_dir = self.get_temp_dir()
+    images = []
+    annotations = []
+    for image_id in range(5):
+      image_path = 'parallel{}_image.jpg'.format(image_id)
+      image_data = np.random.randint(256, size=(64, 64, 3), dtype=np.uint8)
+      PIL.Image.fromarray(image_data).save(os.path.join(tmp_dir, image_path))
+      images.append({
+          'file_name': image_path,
+          'height': 64,
+          'width': 64,
+          'id': image_id,
+      })
+      annotations.append({
+          'area': .5,
+          'iscrowd': False,
+          'image_id': image_id,
+          'bbox': [8, 8, 16, 16],
+          'category_id': 1,
+          'id': 1000 + image_id,
+      })
+    groundtruth_data = {'images': images, 'annotations': annotations,
+                        'categories': [{'name': 'dog', 'id': 1}]}
+    annotation_file = os.path.join(tmp_dir, 'parallel_annotation.json')
+    with open(annotation_file, 'w') as annotation_fid:
+      json.dump(groundtruth_data, annotation_fid)
+
+    records = {}
+    for num_workers in [1, 2]:
+      output_path = os.path.join(tmp_dir, 'parallel{}.record'.format(
+          num_workers))
+      create_coco_tf_record._create_tf_record_from_coco_annotations(
+          annotation_file, tmp_dir, output_path, False, 2,
+          num_workers=num_workers)
+      # The order of the serialized features map is not deterministic, so the
+      # examples are compared once parsed.
+      records[num_workers] = [
+          [tf.train.Example.FromString(record)
+           for record in tf.python_io.tf_record_iterator(
+               '{}-{:05d}-of-00002'.format(output_path, shard_idx))]
+          for shard_idx in range(2)
+      ]
+    self.assertEqual([3, 2], [len(shard) for shard in records[1]])
+    self.assertEqual(records[1], records[2])
+
+  def test_imap_bounded_reads_a_bounded_number_of_elements_ahead(self):
+    num_read = [0]
+
+    def iterate_elements():
+      for element in range(-50, 50):
+        num_read[0] += 1
+        yield element
+
+    pool = multiprocessing.Pool(2)
+    try:
+      results = create_coco_tf_record._imap_bounded(
+          pool, abs, iterate_elements(), chunk_size=3, max_pending_chunks=4)
+      self.assertEqual(next(results), 50)
+      self.assertEqual(num_read[0], 15)
+      self.assertEqual([50] + list(results), [abs(x) for x in range(-50, 50)])
+    finally:
+      pool.terminate()
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -20,13 +20,23 @@ oid_hierarchical_labels_expansion.py \
 --json_hierarchy_file=<path to JSON hierarchy> \
 --input_annotations=<input csv file> \
 --output_annotations=<output csv file> \
---annotation_type=<1 (for boxes) or 2 (for image-level labels)>
+--annotation_type=<1 (for boxes) or 2 (for image-level labels)> \
+--num_workers=<number of processes, 1 to expand the file line by line>
+
+With --num_workers > 1 the input file is split in chunks at line boundaries
+which are expanded by a pool of processes and written back in order. With
+--use_pandas the whole file is instead expanded at once with pandas.
 """
 
 from __future__ import print_function
 
 import argparse
 import json
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
 
 
 def _update_dict(initial_dict, update):
@@ -92,6 +102,58 @@ class OIDHierarchicalLabelsExpansion(object):
     self._hierarchy_keyed_parent, self._hierarchy_keyed_child, _ = (
         _build_plain_hierarchy(hierarchy, skip_root=True))
 
+  def expand_dataframe(self, data, labels_file):
+    """Expands all the annotations of a DataFrame at once.
+
+    Every row is repeated once per label it expands to, so the result holds
+    the same rows, in the same order, as expanding the rows one by one with
+    expand_boxes_from_csv or expand_labels_from_csv.
+
+    Args:
+      data: Pandas DataFrame of Open Images annotations with a LabelName column
+        and, for image-level labels, a Confidence column. Reading the file with
+        dtype=str keeps the values written back identical to the input.
+      labels_file: whether data holds image-level labels instead of boxes.
+
+    Returns:
+      a Pandas DataFrame with the expanded annotations.
+    """
+    label_names = data['LabelName'].values
+    # Boxes and positive labels expand to their ancestors, negative labels to
+    # their descendants.
+    expand_to_children = np.zeros(len(data), dtype=bool)
+    if labels_file:
+      expand_to_children = data['Confidence'].values.astype(int) != 1
+    unique_labels, label_indices = np.unique(label_names, return_inverse=True)
+    # Labels each unique label expands to, first to its ancestors then to its
+    # descendants, stored one after the other in flat_table.
+    expansions = []
+    for keyed_nodes in [self._hierarchy_keyed_child,
+                        self._hierarchy_keyed_parent]:
+      for label in unique_labels:
+        nodes = keyed_nodes.get(label)
+        expansions.append(None if nodes is None else [label] + nodes)
+    known = np.array([nodes is not None for nodes in expansions])
+    table_counts = np.array([len(nodes or []) for nodes in expansions],
+                            dtype=np.int64)
+    table_ends = np.cumsum(table_counts)
+    flat_table = np.array(
+        [label for nodes in expansions if nodes for label in nodes],
+        dtype=object)
+
+    table_indices = label_indices + expand_to_children * len(unique_labels)
+    unknown = ~known[table_indices]
+    assert not unknown.any(), label_names[unknown][0]
+    counts = table_counts[table_indices]
+    # Position in flat_table of each expanded label: the start of the row
+    # expansion plus the rank of the label within it.
+    row_ends = np.cumsum(counts)
+    offsets = np.repeat(table_ends[table_indices] - row_ends, counts)
+    flat_indices = offsets + np.arange(row_ends[-1] if len(data) else 0)
+    expanded = data.iloc[np.repeat(np.arange(len(data)), counts)].copy()
+    expanded['LabelName'] = flat_table[flat_indices]
+    return expanded.reset_index(drop=True)
+
   def expand_boxes_from_csv(self, csv_row):
     """Expands a row containing bounding boxes from CSV file.
 
@@ -147,17 +209,132 @@ class OIDHierarchicalLabelsExpansion(object):
     return result
 
 
+# Expansion state of the pool worker processes, set by _init_chunk_worker.
+_worker_expansion_generator = None
+_worker_labels_file = None
+
+
+def _init_chunk_worker(hierarchy, labels_file):
+  global _worker_expansion_generator, _worker_labels_file
+  _worker_expansion_generator = OIDHierarchicalLabelsExpansion(hierarchy)
+  _worker_labels_file = labels_file
+
+
+def _expand_chunk(chunk):
+  """Expands the lines of the [start, end) bytes of a file in a pool worker.
+
+  Args:
+    chunk: (path, start, end) tuple, start and end being line boundaries.
+
+  Returns:
+    the expanded lines of the chunk, as a single string.
+  """
+  path, start, end = chunk
+  with open(path, 'rb') as source:
+    source.seek(start)
+    lines = source.read(end - start).decode('utf-8').split('\n')
+  # Puts back the line endings, the last line of the file may not have one.
+  lines = [line + '\n' for line in lines[:-1]] + [lines[-1]] * bool(lines[-1])
+  if _worker_labels_file:
+    expand = _worker_expansion_generator.expand_labels_from_csv
+  else:
+    expand = _worker_expansion_generator.expand_boxes_from_csv
+  expanded_lines = []
+  for line in lines:
+    expanded_lines.extend(expand(line))
+  return ''.join(expanded_lines)
+
+
+def split_file_at_lines(path, chunk_size, skip_lines=1):
+  """Splits a file in chunks of about chunk_size bytes at line boundaries.
+
+  Args:
+    path: path to the file.
+    chunk_size: approximate size of each chunk in bytes.
+    skip_lines: number of header lines not included in any chunk.
+
+  Returns:
+    header: the skipped lines, as bytes.
+    chunks: list of (path, start, end) tuples of byte offsets.
+  """
+  chunks = []
+  with open(path, 'rb') as source:
+    header = b''.join(source.readline() for _ in range(skip_lines))
+    file_size = os.fstat(source.fileno()).st_size
+    start = source.tell()
+    while start < file_size:
+      source.seek(start + chunk_size - 1)
+      source.readline()
+      end = min(source.tell(), file_size)
+      chunks.append((path, start, end))
+      start = end
+  return header, chunks
+
+
+def expand_file_in_parallel(hierarchy, input_path, output_path, labels_file,
+                            num_workers=None, chunk_size=64 << 20):
+  """Expands an annotations file with a pool of processes.
+
+  The output is identical to expanding the file line by line.
+
+  Args:
+    hierarchy: labels hierarchy as JSON object.
+    input_path: path to the annotations CSV file.
+    output_path: path to the expanded CSV file.
+    labels_file: whether the file holds image-level labels instead of boxes.
+    num_workers: number of processes, defaults to the number of CPUs.
+    chunk_size: approximate size in bytes of the chunks expanded by a process.
+  """
+  header, chunks = split_file_at_lines(input_path, chunk_size)
+  pool = multiprocessing.Pool(
+      num_workers or multiprocessing.cpu_count(),
+      initializer=_init_chunk_worker,
+      initargs=(hierarchy, labels_file))
+  try:
+    with open(output_path, 'wb') as target:
+      target.write(header)
+      for expanded_chunk in pool.imap(_expand_chunk, chunks):
+        target.write(expanded_chunk.encode('utf-8'))
+  finally:
+    pool.terminate()
+
+
+def expand_file_with_pandas(hierarchy, input_path, output_path, labels_file):
+  """Expands an annotations file at once with pandas.
+
+  Args:
+    hierarchy: labels hierarchy as JSON object.
+    input_path: path to the annotations CSV file.
+    output_path: path to the expanded CSV file.
+    labels_file: whether the file holds image-level labels instead of boxes.
+  """
+  data = pd.read_csv(input_path, dtype=str, keep_default_na=False)
+  expanded = OIDHierarchicalLabelsExpansion(hierarchy).expand_dataframe(
+      data, labels_file)
+  expanded.to_csv(output_path, index=False)
+
+
 def main(parsed_args):
 
   with open(parsed_args.json_hierarchy_file) as f:
     hierarchy = json.load(f)
-  expansion_generator = OIDHierarchicalLabelsExpansion(hierarchy)
   labels_file = False
   if parsed_args.annotation_type == 2:
     labels_file = True
   elif parsed_args.annotation_type != 1:
     print('--annotation_type expected value is 1 or 2.')
     return -1
+  if parsed_args.use_pandas:
+    expand_file_with_pandas(hierarchy, parsed_args.input_annotations,
+                            parsed_args.output_annotations, labels_file)
+    return
+  if parsed_args.num_workers != 1:
+    expand_file_in_parallel(hierarchy, parsed_args.input_annotations,
+                            parsed_args.output_annotations, labels_file,
+                            num_workers=parsed_args.num_workers,
+                            chunk_size=parsed_args.chunk_size_mb << 20)
+    return
+  expansion_generator = OIDHierarchicalLabelsExpansion(hierarchy)
   with open(parsed_args.input_annotations, 'r') as source:
     with open(parsed_args.output_annotations, 'w') as target:
       header = None
@@ -197,5 +374,21 @@ if __name__ == '__main__':
       help="""Type of the input annotations: 1 - boxes, 2 - image-level
       labels"""
   )
+  parser.add_argument(
+      '--num_workers',
+      type=int,
+      default=1,
+      help="""Number of processes expanding chunks of the input file, 0 for
+      the number of CPUs and 1 to expand the file line by line.""")
+  parser.add_argument(
+      '--chunk_size_mb',
+      type=int,
+      default=64,
+      help='Approximate size of the chunks of the input file, in MB.')
+  parser.add_argument(
+      '--use_pandas',
+      action='store_true',
+      help="""Expand the whole file at once with pandas instead, which needs
+      the file to fit in memory.""")
   args = parser.parse_args()
   main(args)
@@ -18,6 +18,9 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import os
+
+import pandas as pd
 import tensorflow as tf
 
 from object_detection.dataset_tools import oid_hierarchical_labels_expansion
@@ -53,6 +56,18 @@ def create_test_data():
   return hierarchy, bbox_rows, label_rows
 
 
+def write_csv(path, header, rows):
+  with open(path, 'w') as f:
+    f.write(header + '\n')
+    for row in rows:
+      f.write(row + '\n')
+
+
+_BBOX_HEADER = ('ImageID,Source,LabelName,Confidence,XMin,XMax,YMin,YMax,'
+                'IsOccluded,IsTruncated,IsGroupOf,IsDepiction,IsInside')
+_LABEL_HEADER = 'ImageID,Source,LabelName,Confidence'
+
+
 class HierarchicalLabelsExpansionTest(tf.test.TestCase):
 
   def test_bbox_expansion(self):
@@ -84,5 +99,59 @@ class HierarchicalLabelsExpansionTest(tf.test.TestCase):
         '124,verification,c,1'
     ], all_result_rows)
 
+  def test_dataframe_expansion(self):
+    hierarchy, bbox_rows, label_rows = create_test_data()
+    expansion_generator = (
+        oid_hierarchical_labels_expansion.OIDHierarchicalLabelsExpansion(
+            hierarchy))
+    for header, rows, labels_file, expand_row in [
+        (_BBOX_HEADER, bbox_rows, False,
+         expansion_generator.expand_boxes_from_csv),
+        (_LABEL_HEADER, label_rows, True,
+         expansion_generator.expand_labels_from_csv)]:
+      data = pd.DataFrame([row.split(',') for row in rows],
+                          columns=header.split(','))
+      expanded = expansion_generator.expand_dataframe(data, labels_file)
+      expected_rows = []
+      for row in rows:
+        expected_rows.extend(expand_row(row))
+      self.assertEqual(expected_rows,
+                       [','.join(values) for values in expanded.values])
+
+  def test_file_expansion_in_parallel(self):
+    hierarchy, bbox_rows, label_rows = create_test_data()
+    expansion_generator = (
+        oid_hierarchical_labels_expansion.OIDHierarchicalLabelsExpansion(
+            hierarchy))
+    input_path = os.path.join(self.get_temp_dir(), 'input.csv')
+    output_path = os.path.join(self.get_temp_dir(), 'output.csv')
+    for header, rows, labels_file, expand_row in [
+        (_BBOX_HEADER, bbox_rows * 10, False,
+         expansion_generator.expand_boxes_from_csv),
+        (_LABEL_HEADER, label_rows * 10, True,
+         expansion_generator.expand_labels_from_csv)]:
+      write_csv(input_path, header, rows)
+      oid_hierarchical_labels_expansion.expand_file_in_parallel(
+          hierarchy, input_path, output_path, labels_file, num_workers=2,
+          chunk_size=50)
+      expected_lines = [header + '\n']
+      for row in rows:
+        expected_lines.extend(expand_row(row + '\n'))
+      with open(output_path) as f:
+        self.assertEqual(''.join(expected_lines), f.read())
+
+  def test_split_file_at_lines(self):
+    _, _, label_rows = create_test_data()
+    input_path = os.path.join(self.get_temp_dir(), 'input.csv')
+    write_csv(input_path, _LABEL_HEADER, label_rows)
+    header, chunks = oid_hierarchical_labels_expansion.split_file_at_lines(
+        input_path, chunk_size=1)
+    self.assertEqual((_LABEL_HEADER + '\n').encode('utf-8'), header)
+    with open(input_path, 'rb') as f:
+      content = f.read()
+    self.assertEqual([(row + '\n').encode('utf-8') for row in label_rows],
+                     [content[start:end] for _, start, end in chunks])
+
+
 if __name__ == '__main__':
   tf.test.main()
@@ -66,6 +66,29 @@ with contents:
  - frozen_inference_graph.pb
  + saved_model (a directory)
 
+Serving profile:
+--------------
+TensorFlow Serving can merge concurrent requests into batches when it runs
+with `--enable_batching`, as long as the inputs of the requests can be
+concatenated. With `--serving_image_size`, the images of an
+`encoded_image_string_tensor` or `tf_example` input are decoded, resized
+preserving their aspect ratio and padded to a fixed size in the graph, so that
+requests with images of different sizes can be batched together. The output
+boxes and keypoints are still normalized with respect to the input images, and
+detections lying entirely in the padding are dropped.
+`--optimize_graph` folds the constants and batch normalizations of the frozen
+graph, and `--max_batch_size` writes a `batching_parameters.txt` file to pass to
+the model server with `--batching_parameters_file`.
+
+python export_inference_graph \
+    --input_type encoded_image_string_tensor \
+    --pipeline_config_path path/to/ssd_inception_v2.config \
+    --trained_checkpoint_prefix path/to/model.ckpt \
+    --output_directory path/to/exported_model_directory \
+    --serving_image_size 600,600 \
+    --optimize_graph \
+    --max_batch_size 8
+
 Config overrides (see the `config_override` flag) are text protobufs
 (also of type pipeline_pb2.TrainEvalPipelineConfig) which are used to override
 certain fields in the provided pipeline_config_path.  These are useful for
@@ -122,6 +145,22 @@ flags.DEFINE_string('config_override', '',
                     'text proto to override pipeline_config_path.')
 flags.DEFINE_boolean('write_inference_graph', False,
                      'If true, writes inference graph to disk.')
+flags.DEFINE_string('serving_image_size', None,
+                    'If set, the input images are resized, preserving their '
+                    'aspect ratio, and padded to this size in the graph. The '
+                    'size is provided as a comma-separated `height,width`.')
+flags.DEFINE_boolean('optimize_graph', False,
+                     'If true, folds the constants and batch normalizations of '
+                     'the frozen graph.')
+flags.DEFINE_integer('max_batch_size', None,
+                     'If set, writes the TensorFlow Serving batching '
+                     'parameters with this maximum batch size to '
+                     '`batching_parameters.txt` in the output directory.')
+flags.DEFINE_integer('batch_timeout_micros', 5000,
+                     'Maximum time TensorFlow Serving waits for a batch to '
+                     'fill up, in microseconds.')
+flags.DEFINE_integer('num_batch_threads', 4,
+                     'Number of batches TensorFlow Serving runs concurrently.')
 tf.app.flags.mark_flag_as_required('pipeline_config_path')
 tf.app.flags.mark_flag_as_required('trained_checkpoint_prefix')
 tf.app.flags.mark_flag_as_required('output_directory')
@@ -140,10 +179,19 @@ def main(_):
     ]
   else:
     input_shape = None
+  if FLAGS.serving_image_size:
+    image_size = [int(dim) for dim in FLAGS.serving_image_size.split(',')]
+  else:
+    image_size = None
   exporter.export_inference_graph(
       FLAGS.input_type, pipeline_config, FLAGS.trained_checkpoint_prefix,
       FLAGS.output_directory, input_shape=input_shape,
-      write_inference_graph=FLAGS.write_inference_graph)
+      write_inference_graph=FLAGS.write_inference_graph,
+      image_size=image_size,
+      optimize_graph=FLAGS.optimize_graph,
+      max_batch_size=FLAGS.max_batch_size,
+      batch_timeout_micros=FLAGS.batch_timeout_micros,
+      num_batch_threads=FLAGS.num_batch_threads)
 
 
 if __name__ == '__main__':
@@ -24,6 +24,7 @@ from tensorflow.python.platform import gfile
 from tensorflow.python.saved_model import signature_constants
 from tensorflow.python.tools import freeze_graph
 from tensorflow.python.training import saver as saver_lib
+from tensorflow.tools.graph_transforms import TransformGraph
 from object_detection.builders import graph_rewriter_builder
 from object_detection.builders import model_builder
 from object_detection.core import standard_fields as fields
@@ -106,20 +107,102 @@ def replace_variable_values_with_moving_averages(graph,
       write_saver.save(sess, new_checkpoint_file)
 
 
-def _image_tensor_input_placeholder(input_shape=None):
-  """Returns input placeholder and a 4-D uint8 image tensor."""
+def _resize_and_pad_image(image, image_size):
+  """Resizes an image to fit in image_size and pads it to image_size.
+
+  The aspect ratio of the image is preserved and the image is padded with zeros
+  at the bottom and on the right.
+
+  Args:
+    image: a [height, width, 3] or [batch, height, width, 3] image tensor.
+    image_size: [height, width] of the padded image.
+
+  Returns:
+    padded_image: a float32 tensor of shape [image_size[0], image_size[1], 3],
+      or [batch, image_size[0], image_size[1], 3].
+    resized_image_shape: an int32 tensor of shape [3] holding the
+      [height, width, 3] shape of the resized image before padding.
+  """
+  padded_height, padded_width = image_size
+  image_shape = tf.shape(image)
+  height = tf.to_float(image_shape[-3])
+  width = tf.to_float(image_shape[-2])
+  scale = tf.minimum(padded_height / height, padded_width / width)
+  resized_height = tf.clip_by_value(
+      tf.to_int32(tf.round(height * scale)), 1, padded_height)
+  resized_width = tf.clip_by_value(
+      tf.to_int32(tf.round(width * scale)), 1, padded_width)
+  resized_image = tf.image.resize_images(
+      image, tf.stack([resized_height, resized_width]))
+  padded_image = tf.image.pad_to_bounding_box(
+      resized_image, 0, 0, padded_height, padded_width)
+  return padded_image, tf.stack([resized_height, resized_width, 3])
+
+
+def _image_tensor_input_placeholder(input_shape=None, image_size=None):
+  """Returns input placeholder and a 4-D uint8 image tensor.
+
+  Args:
+    input_shape: the shape of the placeholder, [None, None, None, 3] by
+      default.
+    image_size: if not None, [height, width] to which the images are resized
+      and padded, see _resize_and_pad_image.
+
+  Returns:
+    a tuple of input placeholder, the output images and, if image_size is not
+    None, the [batch, 3] shapes of the resized images before padding.
+  """
   if input_shape is None:
     input_shape = (None, None, None, 3)
   input_tensor = tf.placeholder(
       dtype=tf.uint8, shape=input_shape, name='image_tensor')
-  return input_tensor, input_tensor
+  if image_size is None:
+    return input_tensor, input_tensor, None
+  # The images of a batch have the same size.
+  padded_images, resized_image_shape = _resize_and_pad_image(
+      input_tensor, image_size)
+  resized_image_shapes = tf.tile(tf.expand_dims(resized_image_shape, 0),
+                                 [tf.shape(input_tensor)[0], 1])
+  return input_tensor, padded_images, resized_image_shapes
+
 
+def _decode_images(decode, elems, image_size, map_fn=tf.map_fn):
+  """Decodes a batch of images, resizing and padding them if image_size is set.
 
-def _tf_example_input_placeholder():
+  When image_size is set, each image is resized and padded before the images
+  are stacked, so that images of different sizes can be batched together.
+
+  Args:
+    decode: a function decoding an element of elems into a uint8 image.
+    elems: a 1-D string tensor.
+    image_size: [height, width] of the padded images, or None.
+    map_fn: the map function.
+
+  Returns:
+    a tuple of the decoded images and, if image_size is not None, the [batch, 3]
+    shapes of the resized images before padding.
+  """
+  if image_size is None:
+    return map_fn(decode, elems=elems, dtype=tf.uint8,
+                  parallel_iterations=32, back_prop=False), None
+
+  def decode_resize_and_pad(elem):
+    return _resize_and_pad_image(decode(elem), image_size)
+  return tuple(map_fn(decode_resize_and_pad, elems=elems,
+                      dtype=(tf.float32, tf.int32),
+                      parallel_iterations=32, back_prop=False))
+
+
+def _tf_example_input_placeholder(image_size=None):
   """Returns input that accepts a batch of strings with tf examples.
 
+  Args:
+    image_size: if not None, [height, width] to which the images are resized
+      and padded, see _resize_and_pad_image.
+
   Returns:
-    a tuple of input placeholder and the output decoded images.
+    a tuple of input placeholder, the output decoded images and, if image_size
+    is not None, the [batch, 3] shapes of the resized images before padding.
   """
   batch_tf_example_placeholder = tf.placeholder(
       tf.string, shape=[None], name='tf_example')
@@ -128,20 +211,22 @@ def _tf_example_input_placeholder():
         tf_example_string_tensor)
     image_tensor = tensor_dict[fields.InputDataFields.image]
     return image_tensor
-  return (batch_tf_example_placeholder,
-          shape_utils.static_or_dynamic_map_fn(
-              decode,
-              elems=batch_tf_example_placeholder,
-              dtype=tf.uint8,
-              parallel_iterations=32,
-              back_prop=False))
+  images, resized_image_shapes = _decode_images(
+      decode, batch_tf_example_placeholder, image_size,
+      map_fn=shape_utils.static_or_dynamic_map_fn)
+  return batch_tf_example_placeholder, images, resized_image_shapes
 
 
-def _encoded_image_string_tensor_input_placeholder():
+def _encoded_image_string_tensor_input_placeholder(image_size=None):
   """Returns input that accepts a batch of PNG or JPEG strings.
 
+  Args:
+    image_size: if not None, [height, width] to which the images are resized
+      and padded, see _resize_and_pad_image.
+
   Returns:
-    a tuple of input placeholder and the output decoded images.
+    a tuple of input placeholder, the output decoded images and, if image_size
+    is not None, the [batch, 3] shapes of the resized images before padding.
   """
   batch_image_str_placeholder = tf.placeholder(
       dtype=tf.string,
@@ -152,13 +237,9 @@ def _encoded_image_string_tensor_input_placeholder():
                                          channels=3)
     image_tensor.set_shape((None, None, 3))
     return image_tensor
-  return (batch_image_str_placeholder,
-          tf.map_fn(
-              decode,
-              elems=batch_image_str_placeholder,
-              dtype=tf.uint8,
-              parallel_iterations=32,
-              back_prop=False))
+  images, resized_image_shapes = _decode_images(
+      decode, batch_image_str_placeholder, image_size)
+  return batch_image_str_placeholder, images, resized_image_shapes
 
 
 input_placeholder_fn_map = {
@@ -233,6 +314,122 @@ def add_output_tensor_nodes(postprocessed_tensors,
   return outputs
 
 
+def _unpad_detections(postprocessed_tensors, resized_image_shapes, image_size):
+  """Maps the detections on the padded images back to the original images.
+
+  Detection boxes and keypoints are normalized with respect to the padded
+  images. They are rescaled to be normalized with respect to the resized images
+  before padding, i.e. to the original images, and clipped to them. Detections
+  lying entirely in the padding are dropped: the kept detections are moved
+  first in their original order, followed by zeros as for the detections past
+  num_detections.
+
+  Args:
+    postprocessed_tensors: the dictionary of tensors returned by the
+      postprocess method of the detection model.
+    resized_image_shapes: a [batch, 3] int32 tensor holding the shapes of the
+      resized images before padding.
+    image_size: [height, width] of the padded images.
+
+  Returns:
+    a copy of postprocessed_tensors with the detections in the padding dropped
+    and the boxes and keypoints rescaled.
+  """
+  detection_fields = fields.DetectionResultFields
+  scale = (tf.to_float(tf.constant(image_size)) /
+           tf.to_float(resized_image_shapes[:, :2]))
+  postprocessed_tensors = dict(postprocessed_tensors)
+  boxes = postprocessed_tensors[detection_fields.detection_boxes]
+  boxes = boxes * tf.expand_dims(tf.tile(scale, [1, 2]), 1)
+  postprocessed_tensors[detection_fields.detection_boxes] = tf.clip_by_value(
+      boxes, 0., 1.)
+  keypoints = postprocessed_tensors.get(detection_fields.detection_keypoints)
+  if keypoints is not None:
+    postprocessed_tensors[detection_fields.detection_keypoints] = (
+        tf.clip_by_value(keypoints * scale[:, tf.newaxis, tf.newaxis, :],
+                         0., 1.))
+
+  num_detections = postprocessed_tensors[detection_fields.num_detections]
+  max_detections = tf.shape(boxes)[1]
+  is_kept = tf.logical_and(
+      tf.range(max_detections) < tf.expand_dims(tf.to_int32(num_detections), 1),
+      tf.reduce_all(boxes[:, :, :2] < 1., axis=2))
+  # top_k returns the lower index first among equal values.
+  _, kept_indices = tf.nn.top_k(tf.to_int32(is_kept), k=max_detections)
+  num_kept = tf.reduce_sum(tf.to_int32(is_kept), axis=1)
+  is_valid = tf.range(max_detections) < tf.expand_dims(num_kept, 1)
+  for key in [detection_fields.detection_boxes,
+              detection_fields.detection_scores,
+              detection_fields.detection_classes,
+              detection_fields.detection_keypoints,
+              detection_fields.detection_masks]:
+    if key in postprocessed_tensors:
+      tensor = tf.gather(postprocessed_tensors[key], kept_indices, batch_dims=1)
+      mask = tf.cast(is_valid, tensor.dtype)
+      for _ in range(tensor.shape.ndims - 2):
+        mask = tf.expand_dims(mask, -1)
+      postprocessed_tensors[key] = tensor * mask
+  postprocessed_tensors[detection_fields.num_detections] = tf.cast(
+      num_kept, num_detections.dtype)
+  return postprocessed_tensors
+
+
+def optimize_inference_graph(frozen_graph_def, input_names, output_names):
+  """Optimizes a frozen inference graph for serving.
+
+  Freezing the graph already prunes the nodes which the outputs do not depend
+  on, such as the training, saving and initialization ops. This removes the
+  remaining CheckNumerics ops, folds the constant subgraphs and the batch
+  normalizations into the preceding convolutions.
+
+  Args:
+    frozen_graph_def: tf.GraphDef holding the frozen graph.
+    input_names: names of the input nodes.
+    output_names: names of the output nodes.
+
+  Returns:
+    the optimized tf.GraphDef.
+  """
+  return TransformGraph(frozen_graph_def, input_names, output_names, [
+      'remove_nodes(op=CheckNumerics)',
+      'fold_constants(ignore_errors=true)',
+      'fold_batch_norms',
+      'fold_old_batch_norms',
+      'sort_by_execution_order',
+  ])
+
+
+def write_batching_parameters(batching_parameters_path,
+                              max_batch_size,
+                              batch_timeout_micros=5000,
+                              num_batch_threads=4,
+                              max_enqueued_batches=100):
+  """Writes the batching parameters of TensorFlow Serving.
+
+  The file is passed to the model server with
+  `--enable_batching --batching_parameters_file=<batching_parameters_path>`.
+  The server then merges the concurrent requests into batches of at most
+  max_batch_size images, waiting at most batch_timeout_micros for a batch to
+  fill up.
+
+  Args:
+    batching_parameters_path: path of the text proto file to write.
+    max_batch_size: maximum number of images of a batch.
+    batch_timeout_micros: maximum time to wait before running a batch that is
+      not full, in microseconds.
+    num_batch_threads: number of batches run concurrently.
+    max_enqueued_batches: maximum number of batches waiting to be run, the
+      requests that do not fit are rejected.
+  """
+  with tf.gfile.GFile(batching_parameters_path, 'w') as f:
+    f.write('max_batch_size {{ value: {} }}\n'
+            'batch_timeout_micros {{ value: {} }}\n'
+            'num_batch_threads {{ value: {} }}\n'
+            'max_enqueued_batches {{ value: {} }}\n'.format(
+                max_batch_size, batch_timeout_micros, num_batch_threads,
+                max_enqueued_batches))
+
+
 def write_saved_model(saved_model_path,
                       frozen_graph_def,
                       inputs,
@@ -297,19 +494,24 @@ def write_graph_and_checkpoint(inference_graph_def,
 
 
 def _get_outputs_from_inputs(input_tensors, detection_model,
-                             output_collection_name):
+                             output_collection_name,
+                             resized_image_shapes=None, image_size=None):
   inputs = tf.to_float(input_tensors)
   preprocessed_inputs, true_image_shapes = detection_model.preprocess(inputs)
   output_tensors = detection_model.predict(
       preprocessed_inputs, true_image_shapes)
   postprocessed_tensors = detection_model.postprocess(
       output_tensors, true_image_shapes)
+  if resized_image_shapes is not None:
+    postprocessed_tensors = _unpad_detections(
+        postprocessed_tensors, resized_image_shapes, image_size)
   return add_output_tensor_nodes(postprocessed_tensors,
                                  output_collection_name)
 
 
 def _build_detection_graph(input_type, detection_model, input_shape,
-                           output_collection_name, graph_hook_fn):
+                           output_collection_name, graph_hook_fn,
+                           image_size=None):
   """Build the detection graph."""
   if input_type not in input_placeholder_fn_map:
     raise ValueError('Unknown input type: {}'.format(input_type))
@@ -319,12 +521,16 @@ def _build_detection_graph(input_type, detection_model, input_shape,
       raise ValueError('Can only specify input shape for `image_tensor` '
                        'inputs.')
     placeholder_args['input_shape'] = input_shape
-  placeholder_tensor, input_tensors = input_placeholder_fn_map[input_type](
-      **placeholder_args)
+  if image_size is not None:
+    placeholder_args['image_size'] = list(image_size)
+  placeholder_tensor, input_tensors, resized_image_shapes = (
+      input_placeholder_fn_map[input_type](**placeholder_args))
   outputs = _get_outputs_from_inputs(
       input_tensors=input_tensors,
       detection_model=detection_model,
-      output_collection_name=output_collection_name)
+      output_collection_name=output_collection_name,
+      resized_image_shapes=resized_image_shapes,
+      image_size=image_size)
 
   # Add global step to the graph.
   slim.get_or_create_global_step()
@@ -343,7 +549,12 @@ def _export_inference_graph(input_type,
                             input_shape=None,
                             output_collection_name='inference_op',
                             graph_hook_fn=None,
-                            write_inference_graph=False):
+                            write_inference_graph=False,
+                            image_size=None,
+                            optimize_graph=False,
+                            max_batch_size=None,
+                            batch_timeout_micros=5000,
+                            num_batch_threads=4):
   """Export helper."""
   tf.gfile.MakeDirs(output_directory)
   frozen_graph_path = os.path.join(output_directory,
@@ -356,7 +567,8 @@ def _export_inference_graph(input_type,
       detection_model=detection_model,
       input_shape=input_shape,
       output_collection_name=output_collection_name,
-      graph_hook_fn=graph_hook_fn)
+      graph_hook_fn=graph_hook_fn,
+      image_size=image_size)
 
   profile_inference_graph(tf.get_default_graph())
   saver_kwargs = {}
@@ -406,9 +618,21 @@ def _export_inference_graph(input_type,
       output_graph=frozen_graph_path,
       clear_devices=True,
       initializer_nodes='')
+  if optimize_graph:
+    frozen_graph_def = optimize_inference_graph(
+        frozen_graph_def, [placeholder_tensor.op.name],
+        output_node_names.split(','))
+    with gfile.GFile(frozen_graph_path, 'wb') as f:
+      f.write(frozen_graph_def.SerializeToString())
 
   write_saved_model(saved_model_path, frozen_graph_def,
                     placeholder_tensor, outputs)
+  if max_batch_size is not None:
+    write_batching_parameters(
+        os.path.join(output_directory, 'batching_parameters.txt'),
+        max_batch_size,
+        batch_timeout_micros=batch_timeout_micros,
+        num_batch_threads=num_batch_threads)
 
 
 def export_inference_graph(input_type,
@@ -418,9 +642,19 @@ def export_inference_graph(input_type,
                            input_shape=None,
                            output_collection_name='inference_op',
                            additional_output_tensor_names=None,
-                           write_inference_graph=False):
+                           write_inference_graph=False,
+                           image_size=None,
+                           optimize_graph=False,
+                           max_batch_size=None,
+                           batch_timeout_micros=5000,
+                           num_batch_threads=4):
   """Exports inference graph for the model specified in the pipeline config.
 
+  The image_size, optimize_graph and max_batch_size arguments make up a serving
+  profile for TensorFlow Serving with batching enabled: the graph takes images
+  of any size, which the server can batch together, and feeds the model with
+  fixed size images.
+
   Args:
     input_type: Type of input for the graph. Can be one of ['image_tensor',
       'encoded_image_string_tensor', 'tf_example'].
@@ -434,6 +668,17 @@ def export_inference_graph(input_type,
     additional_output_tensor_names: list of additional output
       tensors to include in the frozen graph.
     write_inference_graph: If true, writes inference graph to disk.
+    image_size: If not None, [height, width] to which the input images are
+      resized, preserving their aspect ratio, and padded in the graph. The
+      output boxes and keypoints are still normalized with respect to the input
+      images.
+    optimize_graph: If true, folds the constants and batch normalizations of
+      the frozen graph, see optimize_inference_graph.
+    max_batch_size: If not None, writes the TensorFlow Serving batching
+      parameters to `batching_parameters.txt` in output_directory, see
+      write_batching_parameters.
+    batch_timeout_micros: See write_batching_parameters.
+    num_batch_threads: See write_batching_parameters.
   """
   detection_model = model_builder.build(pipeline_config.model,
                                         is_training=False)
@@ -452,7 +697,12 @@ def export_inference_graph(input_type,
       input_shape,
       output_collection_name,
       graph_hook_fn=graph_rewriter_fn,
-      write_inference_graph=write_inference_graph)
+      write_inference_graph=write_inference_graph,
+      image_size=image_size,
+      optimize_graph=optimize_graph,
+      max_batch_size=max_batch_size,
+      batch_timeout_micros=batch_timeout_micros,
+      num_batch_threads=num_batch_threads)
   pipeline_config.eval_config.use_moving_averages = False
   config_util.save_pipeline_config(pipeline_config, output_directory)
 
@@ -548,6 +548,95 @@ class ExportInferenceGraphTest(tf.test.TestCase):
             [boxes, scores, classes, keypoints, masks, num_detections],
             feed_dict={image_str_tensor: image_str_batch_np})
 
+  def test_export_and_run_inference_with_serving_image_size(self):
+    tmp_dir = self.get_temp_dir()
+    trained_checkpoint_prefix = os.path.join(tmp_dir, 'model.ckpt')
+    self._save_checkpoint_from_mock_model(trained_checkpoint_prefix,
+                                          use_moving_averages=False)
+    output_directory = os.path.join(tmp_dir, 'output')
+    inference_graph_path = os.path.join(output_directory,
+                                        'frozen_inference_graph.pb')
+    with mock.patch.object(
+        model_builder, 'build', autospec=True) as mock_builder:
+      mock_builder.return_value = FakeModel(
+          add_detection_keypoints=True, add_detection_masks=True)
+      pipeline_config = pipeline_pb2.TrainEvalPipelineConfig()
+      pipeline_config.eval_config.use_moving_averages = False
+      exporter.export_inference_graph(
+          input_type='encoded_image_string_tensor',
+          pipeline_config=pipeline_config,
+          trained_checkpoint_prefix=trained_checkpoint_prefix,
+          output_directory=output_directory,
+          image_size=[4, 4],
+          optimize_graph=True,
+          max_batch_size=8,
+          batch_timeout_micros=1000)
+
+    with tf.gfile.GFile(os.path.join(output_directory,
+                                     'batching_parameters.txt')) as f:
+      self.assertEqual(f.read(),
+                       'max_batch_size { value: 8 }\n'
+                       'batch_timeout_micros { value: 1000 }\n'
+                       'num_batch_threads { value: 4 }\n'
+                       'max_enqueued_batches { value: 100 }\n')
+    inference_graph = self._load_inference_graph(inference_graph_path)
+    square_image = self._create_encoded_image_string(
+        np.ones((4, 4, 3)).astype(np.uint8), 'jpg')
+    # Resized to 4x2 and padded to 4x4.
+    tall_image = self._create_encoded_image_string(
+        np.ones((8, 4, 3)).astype(np.uint8), 'png')
+    image_str_batch_np = np.hstack([square_image, tall_image])
+    with self.test_session(graph=inference_graph) as sess:
+      image_str_tensor = inference_graph.get_tensor_by_name(
+          'encoded_image_string_tensor:0')
+      boxes = inference_graph.get_tensor_by_name('detection_boxes:0')
+      keypoints = inference_graph.get_tensor_by_name('detection_keypoints:0')
+      masks = inference_graph.get_tensor_by_name('detection_masks:0')
+      num_detections = inference_graph.get_tensor_by_name('num_detections:0')
+      (boxes_np, keypoints_np, masks_np, num_detections_np) = sess.run(
+          [boxes, keypoints, masks, num_detections],
+          feed_dict={image_str_tensor: image_str_batch_np})
+      # The detection of the tall image lies in its padding and is dropped.
+      self.assertAllClose(boxes_np, [[[0.0, 0.0, 0.5, 0.5],
+                                      [0.5, 0.5, 0.8, 0.8]],
+                                     [[0.0, 0.0, 0.0, 0.0],
+                                      [0.0, 0.0, 0.0, 0.0]]])
+      expected_keypoints = np.zeros([2, 2, 6, 2])
+      expected_keypoints[0] = np.minimum(np.arange(24).reshape([2, 6, 2]), 1.)
+      self.assertAllClose(keypoints_np, expected_keypoints)
+      expected_masks = np.zeros([2, 2, 4, 4])
+      expected_masks[0] = np.arange(32).reshape([2, 4, 4])
+      self.assertAllClose(masks_np, expected_masks)
+      self.assertAllClose(num_detections_np, [2, 0])
+
+  def test_unpad_detections(self):
+    postprocessed_tensors = {
+        'detection_boxes': tf.constant([[[0.1, 0.6, 0.3, 0.9],
+                                         [0.2, 0.2, 0.4, 0.6],
+                                         [0.5, 0.4, 0.9, 0.5]]]),
+        'detection_scores': tf.constant([[0.9, 0.8, 0.7]]),
+        'detection_classes': tf.constant([[1., 2., 3.]]),
+        'detection_keypoints': tf.constant([[[[0.2, 0.2]], [[0.3, 0.7]],
+                                             [[0.6, 0.45]]]]),
+        'num_detections': tf.constant([2.])
+    }
+    # A 4x2 image resized and padded to 4x4.
+    unpadded_tensors = exporter._unpad_detections(
+        postprocessed_tensors, tf.constant([[4, 2, 3]]), [4, 4])
+    with self.test_session() as sess:
+      unpadded_tensors = sess.run(unpadded_tensors)
+    # The first detection lies in the padding and the third one is past
+    # num_detections.
+    self.assertAllClose(unpadded_tensors['detection_boxes'],
+                        [[[0.2, 0.4, 0.4, 1.0], [0., 0., 0., 0.],
+                          [0., 0., 0., 0.]]])
+    self.assertAllClose(unpadded_tensors['detection_scores'],
+                        [[0.8, 0., 0.]])
+    self.assertAllClose(unpadded_tensors['detection_classes'], [[2., 0., 0.]])
+    self.assertAllClose(unpadded_tensors['detection_keypoints'],
+                        [[[[0.3, 1.0]], [[0., 0.]], [[0., 0.]]]])
+    self.assertAllClose(unpadded_tensors['num_detections'], [1.])
+
   def test_export_and_run_inference_with_tf_example(self):
     tmp_dir = self.get_temp_dir()
     trained_checkpoint_prefix = os.path.join(tmp_dir, 'model.ckpt')
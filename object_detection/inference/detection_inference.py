@@ -15,6 +15,8 @@
 """Utility functions for detection inference."""
 from __future__ import division
 
+import json
+
 import tensorflow as tf
 
 from object_detection.core import standard_fields
@@ -50,6 +52,199 @@ def build_input(tfrecord_paths):
   return serialized_example_tensor, image_tensor
 
 
+def build_batched_input(tfrecord_paths, batch_size, num_parallel_reads=4,
+                        num_parallel_calls=4, prefetch_size=2):
+  """Builds a tf.data input pipeline reading batches of images.
+
+  The input shards are read in parallel and the images decoded in parallel.
+  Records are read in a deterministic order, so that the output of a run is
+  reproducible. Images of a batch are zero-padded at the bottom and on the
+  right to the size of its largest image.
+
+  Args:
+    tfrecord_paths: List of paths to the input TFRecords
+    batch_size: Number of examples per batch
+    num_parallel_reads: Number of input shards read in parallel
+    num_parallel_calls: Number of images decoded in parallel
+    prefetch_size: Number of batches prepared ahead of the inference
+
+  Returns:
+    serialized_examples_tensor: The next serialized examples. String Tensor,
+        shape=[batch_size]
+    image_tensor: The decoded and padded images of the examples. Uint8 tensor,
+        shape=[batch_size, None, None, 3]
+    image_shapes_tensor: The [height, width] of each image before padding.
+        Int32 tensor, shape=[batch_size, 2]
+  """
+  dataset = _build_batched_dataset(
+      tf.data.TFRecordDataset(
+          tfrecord_paths, num_parallel_reads=min(num_parallel_reads,
+                                                 len(tfrecord_paths))),
+      batch_size, num_parallel_calls, prefetch_size)
+  return dataset.make_one_shot_iterator().get_next()
+
+
+def build_resumable_input(batch_size, num_parallel_calls=4, prefetch_size=2):
+  """Builds an input pipeline reading one TFRecord from a given record offset.
+
+  The pipeline is re-initialized for every input shard, so that a job can
+  process its shards one after the other and resume a shard after a crash.
+
+  Args:
+    batch_size: Number of examples per batch
+    num_parallel_calls: Number of images decoded in parallel
+    prefetch_size: Number of batches prepared ahead of the inference
+
+  Returns:
+    tfrecord_path_placeholder: String placeholder, path of the TFRecord to read
+    skip_records_placeholder: Int64 placeholder, number of records to skip at
+        the beginning of the TFRecord
+    initializer: Op initializing the pipeline with the fed placeholders
+    next_batch: Tuple of the serialized_examples, image and image_shapes
+        tensors, as returned by `build_batched_input`
+  """
+  tfrecord_path_placeholder = tf.placeholder(tf.string, shape=[])
+  skip_records_placeholder = tf.placeholder_with_default(
+      tf.constant(0, dtype=tf.int64), shape=[])
+  dataset = _build_batched_dataset(
+      tf.data.TFRecordDataset(tfrecord_path_placeholder).skip(
+          skip_records_placeholder),
+      batch_size, num_parallel_calls, prefetch_size)
+  iterator = dataset.make_initializable_iterator()
+  return (tfrecord_path_placeholder, skip_records_placeholder,
+          iterator.initializer, iterator.get_next())
+
+
+def _build_batched_dataset(serialized_examples_dataset, batch_size,
+                           num_parallel_calls, prefetch_size):
+  """Decodes and batches the images of a dataset of serialized examples."""
+  def decode(serialized_example):
+    features = tf.parse_single_example(
+        serialized_example,
+        features={
+            standard_fields.TfExampleFields.image_encoded:
+                tf.FixedLenFeature([], tf.string),
+        })
+    encoded_image = features[standard_fields.TfExampleFields.image_encoded]
+    image = tf.image.decode_image(encoded_image, channels=3)
+    image.set_shape([None, None, 3])
+    return serialized_example, image, tf.shape(image)[:2]
+
+  dataset = serialized_examples_dataset.map(
+      decode, num_parallel_calls=num_parallel_calls)
+  dataset = dataset.padded_batch(
+      batch_size, padded_shapes=([], [None, None, 3], [2]))
+  return dataset.prefetch(prefetch_size)
+
+
+def get_task_shards(num_shards, task_index, num_tasks):
+  """Returns the indices of the shards processed by a task.
+
+  Shards are dealt round-robin to the tasks, so that independent processes
+  split the work without any coordination.
+
+  Args:
+    num_shards: Total number of shards
+    task_index: Index of the task, in [0, num_tasks)
+    num_tasks: Total number of tasks
+
+  Returns:
+    The sorted list of the shard indices of the task.
+  Raises:
+    ValueError: if task_index is not in [0, num_tasks).
+  """
+  if not 0 <= task_index < num_tasks:
+    raise ValueError('task_index must be in [0, {}), got {}'.format(
+        num_tasks, task_index))
+  return list(range(task_index, num_shards, num_tasks))
+
+
+def load_manifest(manifest_path):
+  """Loads the progress manifest of a task, or an empty one if it is missing.
+
+  The manifest maps the index (as a string) of every started shard to a dict
+  with its 'output' path, the number of 'records' safely written, whether its
+  output is 'finalizing' and whether the shard is 'done'.
+  """
+  if not tf.gfile.Exists(manifest_path):
+    return {'shards': {}}
+  with tf.gfile.GFile(manifest_path, 'r') as manifest_file:
+    return json.load(manifest_file)
+
+
+def save_manifest(manifest_path, manifest):
+  """Atomically replaces the progress manifest of a task."""
+  tmp_manifest_path = manifest_path + '.tmp'
+  with tf.gfile.GFile(tmp_manifest_path, 'w') as manifest_file:
+    json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+  tf.gfile.Rename(tmp_manifest_path, manifest_path, overwrite=True)
+
+
+def finalize_shard(manifest_path, manifest, shard):
+  """Moves the complete temporary output of a shard in place and marks it done.
+
+  The shard is first recorded as 'finalizing', so that a task restarted after
+  the rename but before the shard was marked done knows that its output is
+  already in place, rather than failing to find the temporary output.
+
+  Args:
+    manifest_path: Path of the progress manifest of the task
+    manifest: Progress manifest holding the shard
+    shard: Manifest entry of the shard, whose records are all written to
+      its output path suffixed with '.tmp'
+  """
+  if not shard.get('finalizing'):
+    shard['finalizing'] = True
+    save_manifest(manifest_path, manifest)
+  tmp_output_path = shard['output'] + '.tmp'
+  if tf.gfile.Exists(tmp_output_path):
+    tf.gfile.Rename(tmp_output_path, shard['output'], overwrite=True)
+  shard['done'] = True
+  save_manifest(manifest_path, manifest)
+
+
+def copy_records(tfrecord_path, tf_record_writer, num_records):
+  """Copies the first num_records records of a TFRecord to a writer.
+
+  Used to recover the records of a partial output written before a crash.
+
+  Raises:
+    ValueError: if the TFRecord holds less than num_records valid records.
+  """
+  copied_records = 0
+  if num_records:
+    for record in tf.python_io.tf_record_iterator(tfrecord_path):
+      tf_record_writer.write(record)
+      copied_records += 1
+      if copied_records == num_records:
+        break
+  if copied_records != num_records:
+    raise ValueError('Expected {} records in {}, found {}'.format(
+        num_records, tfrecord_path, copied_records))
+
+
+def _import_inference_graph(image_tensor, inference_graph_path):
+  """Imports the inference graph, fed with image_tensor, in the default graph.
+
+  Returns:
+    The num_detections, detection_boxes, detection_scores and
+    detection_classes tensors of the inference graph.
+  """
+  with tf.gfile.Open(inference_graph_path, 'rb') as graph_def_file:
+    graph_content = graph_def_file.read()
+  graph_def = tf.GraphDef()
+  graph_def.MergeFromString(graph_content)
+
+  tf.import_graph_def(
+      graph_def, name='', input_map={'image_tensor': image_tensor})
+
+  g = tf.get_default_graph()
+  return (g.get_tensor_by_name('num_detections:0'),
+          g.get_tensor_by_name('detection_boxes:0'),
+          g.get_tensor_by_name('detection_scores:0'),
+          g.get_tensor_by_name('detection_classes:0'))
+
+
 def build_inference_graph(image_tensor, inference_graph_path):
   """Loads the inference graph and connects it to the input image.
 
@@ -65,36 +260,78 @@ def build_inference_graph(image_tensor, inference_graph_path):
     detected_labels_tensor: Detected labels. Int64 tensor,
         shape=[num_detections]
   """
-  with tf.gfile.Open(inference_graph_path, 'r') as graph_def_file:
-    graph_content = graph_def_file.read()
-  graph_def = tf.GraphDef()
-  graph_def.MergeFromString(graph_content)
-
-  tf.import_graph_def(
-      graph_def, name='', input_map={'image_tensor': image_tensor})
-
-  g = tf.get_default_graph()
+  (num_detections_tensor, detected_boxes_tensor, detected_scores_tensor,
+   detected_labels_tensor) = _import_inference_graph(image_tensor,
+                                                     inference_graph_path)
 
-  num_detections_tensor = tf.squeeze(
-      g.get_tensor_by_name('num_detections:0'), 0)
+  num_detections_tensor = tf.squeeze(num_detections_tensor, 0)
   num_detections_tensor = tf.cast(num_detections_tensor, tf.int32)
 
-  detected_boxes_tensor = tf.squeeze(
-      g.get_tensor_by_name('detection_boxes:0'), 0)
+  detected_boxes_tensor = tf.squeeze(detected_boxes_tensor, 0)
   detected_boxes_tensor = detected_boxes_tensor[:num_detections_tensor]
 
-  detected_scores_tensor = tf.squeeze(
-      g.get_tensor_by_name('detection_scores:0'), 0)
+  detected_scores_tensor = tf.squeeze(detected_scores_tensor, 0)
   detected_scores_tensor = detected_scores_tensor[:num_detections_tensor]
 
-  detected_labels_tensor = tf.squeeze(
-      g.get_tensor_by_name('detection_classes:0'), 0)
+  detected_labels_tensor = tf.squeeze(detected_labels_tensor, 0)
   detected_labels_tensor = tf.cast(detected_labels_tensor, tf.int64)
   detected_labels_tensor = detected_labels_tensor[:num_detections_tensor]
 
   return detected_boxes_tensor, detected_scores_tensor, detected_labels_tensor
 
 
+def build_batched_inference_graph(image_tensor, image_shapes_tensor,
+                                  inference_graph_path):
+  """Loads the inference graph and connects it to a batch of padded images.
+
+  Detected boxes are expressed in normalized coordinates of each image before
+  padding, and detections lying entirely in the padding are dropped.
+
+  Args:
+    image_tensor: The input images. uint8 tensor, shape=[batch, None, None, 3]
+    image_shapes_tensor: The [height, width] of each image before padding.
+        Int32 tensor, shape=[batch, 2]
+    inference_graph_path: Path to the inference graph with embedded weights
+
+  Returns:
+    num_detections_tensor: Number of detections of each image. Int32 tensor,
+        shape=[batch]
+    detected_boxes_tensor: Detected boxes. Float tensor,
+        shape=[batch, max_detections, 4]
+    detected_scores_tensor: Detected scores. Float tensor,
+        shape=[batch, max_detections]
+    detected_labels_tensor: Detected labels. Int64 tensor,
+        shape=[batch, max_detections]
+  """
+  (num_detections_tensor, detected_boxes_tensor, detected_scores_tensor,
+   detected_labels_tensor) = _import_inference_graph(image_tensor,
+                                                     inference_graph_path)
+  num_detections_tensor = tf.cast(num_detections_tensor, tf.int32)
+
+  padded_shape = tf.cast(tf.shape(image_tensor)[1:3], tf.float32)
+  scale = padded_shape / tf.cast(image_shapes_tensor, tf.float32)
+  scale = tf.expand_dims(tf.tile(scale, [1, 2]), 1)
+  detected_boxes_tensor = detected_boxes_tensor * scale
+
+  # Detections lying entirely in the padding are dropped, and the kept ones
+  # moved first in their original order (top_k keeps the lower index first
+  # among equal values).
+  max_detections = tf.shape(detected_scores_tensor)[1]
+  is_kept = tf.logical_and(
+      tf.range(max_detections) < tf.expand_dims(num_detections_tensor, 1),
+      tf.reduce_all(detected_boxes_tensor[:, :, :2] < 1.0, axis=2))
+  _, kept_indices = tf.nn.top_k(tf.cast(is_kept, tf.int32), k=max_detections)
+  num_detections_tensor = tf.reduce_sum(tf.cast(is_kept, tf.int32), axis=1)
+  detected_boxes_tensor = tf.minimum(
+      tf.gather(detected_boxes_tensor, kept_indices, batch_dims=1), 1.0)
+  detected_scores_tensor = tf.gather(detected_scores_tensor, kept_indices,
+                                     batch_dims=1)
+  detected_labels_tensor = tf.cast(
+      tf.gather(detected_labels_tensor, kept_indices, batch_dims=1), tf.int64)
+  return (num_detections_tensor, detected_boxes_tensor, detected_scores_tensor,
+          detected_labels_tensor)
+
+
 def infer_detections_and_add_to_example(
     serialized_example_tensor, detected_boxes_tensor, detected_scores_tensor,
     detected_labels_tensor, discard_image_pixels):
@@ -112,12 +349,56 @@ def infer_detections_and_add_to_example(
   Returns:
     The de-serialized TF example augmented with the inferred detections.
   """
-  tf_example = tf.train.Example()
   (serialized_example, detected_boxes, detected_scores,
    detected_classes) = tf.get_default_session().run([
        serialized_example_tensor, detected_boxes_tensor, detected_scores_tensor,
        detected_labels_tensor
    ])
+  return _add_detections_to_example(serialized_example, detected_boxes,
+                                    detected_scores, detected_classes,
+                                    discard_image_pixels)
+
+
+def infer_detections_and_add_to_examples(
+    serialized_examples_tensor, num_detections_tensor, detected_boxes_tensor,
+    detected_scores_tensor, detected_labels_tensor, discard_image_pixels):
+  """Runs a batch of the supplied tensors and adds detections to the examples.
+
+  Args:
+    serialized_examples_tensor: Serialized TF examples. String tensor,
+        shape=[batch]
+    num_detections_tensor: Number of detections of each example. Int32 tensor,
+        shape=[batch]
+    detected_boxes_tensor: Detected boxes. Float tensor,
+        shape=[batch, max_detections, 4]
+    detected_scores_tensor: Detected scores. Float tensor,
+        shape=[batch, max_detections]
+    detected_labels_tensor: Detected labels. Int64 tensor,
+        shape=[batch, max_detections]
+    discard_image_pixels: If true, discards the images from the result
+  Returns:
+    The list of the de-serialized TF examples of the batch augmented with the
+    inferred detections.
+  """
+  (serialized_examples, num_detections, detected_boxes, detected_scores,
+   detected_classes) = tf.get_default_session().run([
+       serialized_examples_tensor, num_detections_tensor,
+       detected_boxes_tensor, detected_scores_tensor, detected_labels_tensor
+   ])
+  return [
+      _add_detections_to_example(
+          serialized_examples[i], detected_boxes[i, :num_detections[i]],
+          detected_scores[i, :num_detections[i]],
+          detected_classes[i, :num_detections[i]], discard_image_pixels)
+      for i in range(len(serialized_examples))
+  ]
+
+
+def _add_detections_to_example(serialized_example, detected_boxes,
+                               detected_scores, detected_classes,
+                               discard_image_pixels):
+  """Parses a serialized TF example and adds the detections to its features."""
+  tf_example = tf.train.Example()
   detected_boxes = detected_boxes.T
 
   tf_example.ParseFromString(serialized_example)
@@ -17,6 +17,7 @@ r"""Tests for detection_inference.py."""
 import os
 import StringIO
 
+import mock
 import numpy as np
 from PIL import Image
 import tensorflow as tf
@@ -72,6 +73,44 @@ def create_mock_graph():
     fl.write(graph_def.SerializeToString())
 
 
+def create_mock_batched_tfrecord():
+  with tf.python_io.TFRecordWriter(get_mock_tfrecord_path()) as writer:
+    for image in [np.array([[[123, 0, 0]]], dtype=np.uint8),
+                  np.array([[[10, 0, 0], [10, 0, 0]]], dtype=np.uint8)]:
+      image_output_stream = StringIO.StringIO()
+      Image.fromarray(image, 'RGB').save(image_output_stream, format='png')
+      feature_map = {
+          standard_fields.TfExampleFields.image_encoded:
+              dataset_util.bytes_feature(image_output_stream.getvalue()),
+      }
+      tf_example = tf.train.Example(
+          features=tf.train.Features(feature=feature_map))
+      writer.write(tf_example.SerializeToString())
+
+
+def create_mock_batched_graph():
+  g = tf.Graph()
+  with g.as_default():
+    in_image_tensor = tf.placeholder(
+        tf.uint8, shape=[None, None, None, 3], name='image_tensor')
+    image_sums = tf.reduce_sum(
+        tf.cast(in_image_tensor, dtype=tf.float32), axis=[1, 2, 3])
+    batch_size = tf.shape(in_image_tensor)[0]
+    tf.identity(2.0 * tf.ones_like(image_sums), name='num_detections')
+    tf.tile(tf.constant(
+        [[[0, 0.8, 0.7, 1], [0.1, 0.2, 0.8, 0.9], [0.2, 0.3, 0.4, 0.5]]]),
+            [batch_size, 1, 1], name='detection_boxes')
+    tf.tile(tf.constant([[0.1, 0.2, 0.3]]), [batch_size, 1],
+            name='detection_scores')
+    tf.identity(
+        tf.constant([[1.0, 2.0, 3.0]]) * tf.expand_dims(image_sums, 1),
+        name='detection_classes')
+    graph_def = g.as_graph_def()
+
+  with tf.gfile.Open(get_mock_graph_path(), 'w') as fl:
+    fl.write(graph_def.SerializeToString())
+
+
 class InferDetectionsTests(tf.test.TestCase):
 
   def test_simple(self):
@@ -171,6 +210,158 @@ class InferDetectionsTests(tf.test.TestCase):
             value { float_list { value: [1.0, 2.0, 3.0, 4.0] } } } }
     """, tf_example)
 
+  def test_batched_with_padding(self):
+    create_mock_batched_graph()
+    create_mock_batched_tfrecord()
+
+    (serialized_examples_tensor, image_tensor,
+     image_shapes_tensor) = detection_inference.build_batched_input(
+         [get_mock_tfrecord_path()], batch_size=2)
+    self.assertAllEqual(image_tensor.get_shape().as_list(),
+                        [None, None, None, 3])
+
+    (num_detections_tensor, detected_boxes_tensor, detected_scores_tensor,
+     detected_labels_tensor) = detection_inference.build_batched_inference_graph(
+         image_tensor, image_shapes_tensor, get_mock_graph_path())
+
+    with self.test_session(use_gpu=False):
+      tf_examples = detection_inference.infer_detections_and_add_to_examples(
+          serialized_examples_tensor, num_detections_tensor,
+          detected_boxes_tensor, detected_scores_tensor,
+          detected_labels_tensor, True)
+
+    self.assertEqual(len(tf_examples), 2)
+    features = [tf_example.features.feature for tf_example in tf_examples]
+    # The first image is padded from a width of 1 to 2, so its boxes are
+    # rescaled horizontally and clipped, and its first detection, lying in
+    # the padding, is dropped.
+    self.assertAllClose(
+        features[0]['image/detection/bbox/xmin'].float_list.value, [0.4])
+    self.assertAllClose(
+        features[0]['image/detection/bbox/xmax'].float_list.value, [1.0])
+    self.assertAllClose(
+        features[0]['image/detection/score'].float_list.value, [0.2])
+    self.assertAllClose(
+        features[1]['image/detection/bbox/xmin'].float_list.value, [0.8, 0.2])
+    self.assertAllClose(
+        features[1]['image/detection/bbox/ymax'].float_list.value, [0.7, 0.8])
+    self.assertAllEqual(
+        features[0]['image/detection/label'].int64_list.value, [246])
+    self.assertAllEqual(
+        features[1]['image/detection/label'].int64_list.value, [20, 40])
+    self.assertAllClose(
+        features[1]['image/detection/score'].float_list.value, [0.1, 0.2])
+    self.assertNotIn('image/encoded', features[0])
+
+  def test_resumable_input_skips_records(self):
+    create_mock_batched_tfrecord()
+
+    (tfrecord_path_placeholder, skip_records_placeholder, initializer,
+     (serialized_examples_tensor, _,
+      image_shapes_tensor)) = detection_inference.build_resumable_input(
+          batch_size=2)
+
+    with self.test_session(use_gpu=False) as sess:
+      sess.run(initializer, feed_dict={
+          tfrecord_path_placeholder: get_mock_tfrecord_path(),
+          skip_records_placeholder: 1})
+      serialized_examples, image_shapes = sess.run(
+          [serialized_examples_tensor, image_shapes_tensor])
+      with self.assertRaises(tf.errors.OutOfRangeError):
+        sess.run(serialized_examples_tensor)
+
+    self.assertEqual(len(serialized_examples), 1)
+    self.assertAllEqual(image_shapes, [[1, 2]])
+
+  def test_get_task_shards(self):
+    self.assertAllEqual(detection_inference.get_task_shards(10, 1, 3),
+                        [1, 4, 7])
+    self.assertAllEqual(detection_inference.get_task_shards(2, 2, 3), [])
+    with self.assertRaises(ValueError):
+      detection_inference.get_task_shards(10, 3, 3)
+
+  def test_save_and_load_manifest(self):
+    manifest_path = os.path.join(tf.test.get_temp_dir(), 'manifest.json')
+    if tf.gfile.Exists(manifest_path):
+      tf.gfile.Remove(manifest_path)
+    self.assertEqual(detection_inference.load_manifest(manifest_path),
+                     {'shards': {}})
+
+    manifest = {'shards': {'3': {'input': 'in', 'output': 'out',
+                                 'records': 12, 'done': False}}}
+    detection_inference.save_manifest(manifest_path, manifest)
+    detection_inference.save_manifest(manifest_path, manifest)
+    self.assertEqual(detection_inference.load_manifest(manifest_path),
+                     manifest)
+
+  def _start_finalized_shard(self):
+    create_mock_batched_tfrecord()
+    manifest_path = os.path.join(tf.test.get_temp_dir(), 'manifest.json')
+    output_path = os.path.join(tf.test.get_temp_dir(), 'output.tfrec')
+    for path in [output_path, output_path + '.tmp']:
+      if tf.gfile.Exists(path):
+        tf.gfile.Remove(path)
+    tf.gfile.Copy(get_mock_tfrecord_path(), output_path + '.tmp')
+    manifest = {'shards': {'0': {'input': 'in', 'output': output_path,
+                                 'records': 2, 'done': False}}}
+    return manifest_path, manifest, output_path
+
+  def test_finalize_shard(self):
+    manifest_path, manifest, output_path = self._start_finalized_shard()
+    detection_inference.finalize_shard(manifest_path, manifest,
+                                       manifest['shards']['0'])
+
+    self.assertTrue(manifest['shards']['0']['done'])
+    self.assertEqual(detection_inference.load_manifest(manifest_path),
+                     manifest)
+    self.assertFalse(tf.gfile.Exists(output_path + '.tmp'))
+    self.assertAllEqual(
+        list(tf.python_io.tf_record_iterator(output_path)),
+        list(tf.python_io.tf_record_iterator(get_mock_tfrecord_path())))
+
+  def test_finalize_shard_resumes_after_crash(self):
+    manifest_path, manifest, output_path = self._start_finalized_shard()
+    save_manifest = detection_inference.save_manifest
+
+    def save_manifest_then_crash(path, manifest):
+      if manifest['shards']['0']['done']:
+        raise SystemExit('killed before marking the shard done')
+      save_manifest(path, manifest)
+
+    with mock.patch.object(detection_inference, 'save_manifest',
+                           save_manifest_then_crash):
+      with self.assertRaises(SystemExit):
+        detection_inference.finalize_shard(manifest_path, manifest,
+                                           manifest['shards']['0'])
+    self.assertFalse(tf.gfile.Exists(output_path + '.tmp'))
+
+    # The restarted task finds the shard finalizing with its output in place.
+    manifest = detection_inference.load_manifest(manifest_path)
+    self.assertTrue(manifest['shards']['0']['finalizing'])
+    self.assertFalse(manifest['shards']['0']['done'])
+    detection_inference.finalize_shard(manifest_path, manifest,
+                                       manifest['shards']['0'])
+
+    manifest = detection_inference.load_manifest(manifest_path)
+    self.assertTrue(manifest['shards']['0']['done'])
+    self.assertEqual(manifest['shards']['0']['records'], 2)
+    self.assertAllEqual(
+        list(tf.python_io.tf_record_iterator(output_path)),
+        list(tf.python_io.tf_record_iterator(get_mock_tfrecord_path())))
+
+  def test_copy_records(self):
+    create_mock_batched_tfrecord()
+    copy_path = os.path.join(tf.test.get_temp_dir(), 'copy.tfrec')
+    with tf.python_io.TFRecordWriter(copy_path) as writer:
+      detection_inference.copy_records(get_mock_tfrecord_path(), writer, 1)
+    self.assertAllEqual(
+        list(tf.python_io.tf_record_iterator(copy_path)),
+        list(tf.python_io.tf_record_iterator(get_mock_tfrecord_path()))[:1])
+
+    with tf.python_io.TFRecordWriter(copy_path) as writer:
+      with self.assertRaises(ValueError):
+        detection_inference.copy_records(get_mock_tfrecord_path(), writer, 3)
+
 
 if __name__ == '__main__':
   tf.test.main()
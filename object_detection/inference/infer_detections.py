@@ -32,10 +32,31 @@ The script can also discard the image pixels in the output. This greatly
 reduces the output size and can potentially accelerate reading data in
 subsequent processing steps that don't require the images (e.g. computing
 metrics).
+
+Input shards are read and decoded in parallel with tf.data, and examples can be
+run through the inference graph in batches (--batch_size) and written to
+several output shards (--num_output_shards), so that large datasets are scored
+using all the cores of the machine. Batched images are zero-padded to a common
+size, which can slightly change the detections compared to a batch size of 1.
+
+With --resumable, each input TFRecord is a shard scored into its own output
+<output_tfrecord_path>-<shard index>-of-<number of shards>. Progress is recorded
+every --checkpoint_every records in a manifest next to the output, and a job
+restarted with the same flags skips the completed shards and resumes the
+current one from its last checkpoint. Shards can be split between --num_tasks
+independent processes (or pods), each one started with its own --task_index:
+
+  ./infer_detections \
+    --input_tfrecord_paths=/path/to/input/tfrecord-00000-of-00100,... \
+    --output_tfrecord_path=/path/to/output/detections.tfrecord \
+    --inference_graph=/path/to/frozen_weights_inference_graph.pb \
+    --resumable --num_tasks=10 --task_index=3
 """
 
 import itertools
+import contextlib2
 import tensorflow as tf
+from object_detection.dataset_tools import tf_record_creation_util
 from object_detection.inference import detection_inference
 
 tf.flags.DEFINE_string('input_tfrecord_paths', None,
@@ -50,6 +71,33 @@ tf.flags.DEFINE_boolean('discard_image_pixels', False,
                         ' if the subsequent tools don\'t need access to the'
                         ' images (e.g. when computing evaluation measures).')
 
+tf.flags.DEFINE_integer('batch_size', 1,
+                        'Number of examples run through the inference graph '
+                        'at once. Images of a batch are zero-padded to the '
+                        'same size.')
+tf.flags.DEFINE_integer('num_parallel_reads', 4,
+                        'Number of input TFRecords read in parallel.')
+tf.flags.DEFINE_integer('num_parallel_calls', 4,
+                        'Number of images decoded in parallel.')
+tf.flags.DEFINE_integer('num_output_shards', 0,
+                        'If positive, the output is written to this number '
+                        'of TFRecord shards named '
+                        '<output_tfrecord_path>-?????-of-?????, each example '
+                        'going to shard <example index> % num_output_shards.')
+tf.flags.DEFINE_boolean('resumable', False,
+                        'Scores each input TFRecord into its own output shard, '
+                        'recording progress in a manifest so that a restarted '
+                        'job resumes where it stopped. Implied by '
+                        '--num_tasks > 1.')
+tf.flags.DEFINE_integer('checkpoint_every', 1000,
+                        'Number of records between two progress checkpoints '
+                        'in resumable mode.')
+tf.flags.DEFINE_integer('task_index', 0,
+                        'Index of this task, in [0, num_tasks).')
+tf.flags.DEFINE_integer('num_tasks', 1,
+                        'Number of tasks splitting the input shards, task k '
+                        'processing the shards k, k + num_tasks, ...')
+
 FLAGS = tf.flags.FLAGS
 
 
@@ -62,34 +110,147 @@ def main(_):
     if not getattr(FLAGS, flag_name):
       raise ValueError('Flag --{} is required'.format(flag_name))
 
+  input_tfrecord_paths = [
+      v for v in FLAGS.input_tfrecord_paths.split(',') if v]
+  tf.logging.info('Reading input from %d files', len(input_tfrecord_paths))
+  if FLAGS.resumable or FLAGS.num_tasks > 1:
+    if FLAGS.num_output_shards > 0:
+      raise ValueError('--num_output_shards can not be used in resumable mode, '
+                       'which writes one output shard per input TFRecord')
+    _run_resumable_inference(input_tfrecord_paths)
+  else:
+    _run_inference(input_tfrecord_paths)
+
+
+def _run_inference(input_tfrecord_paths):
+  """Scores all the inputs in a single pass."""
   with tf.Session() as sess:
-    input_tfrecord_paths = [
-        v for v in FLAGS.input_tfrecord_paths.split(',') if v]
-    tf.logging.info('Reading input from %d files', len(input_tfrecord_paths))
-    serialized_example_tensor, image_tensor = detection_inference.build_input(
-        input_tfrecord_paths)
+    (serialized_examples_tensor, image_tensor,
+     image_shapes_tensor) = detection_inference.build_batched_input(
+         input_tfrecord_paths, FLAGS.batch_size,
+         num_parallel_reads=FLAGS.num_parallel_reads,
+         num_parallel_calls=FLAGS.num_parallel_calls)
     tf.logging.info('Reading graph and building model...')
-    (detected_boxes_tensor, detected_scores_tensor,
-     detected_labels_tensor) = detection_inference.build_inference_graph(
-         image_tensor, FLAGS.inference_graph)
+    (num_detections_tensor, detected_boxes_tensor, detected_scores_tensor,
+     detected_labels_tensor) = detection_inference.build_batched_inference_graph(
+         image_tensor, image_shapes_tensor, FLAGS.inference_graph)
 
     tf.logging.info('Running inference and writing output to {}'.format(
         FLAGS.output_tfrecord_path))
-    sess.run(tf.local_variables_initializer())
-    tf.train.start_queue_runners()
-    with tf.python_io.TFRecordWriter(
-        FLAGS.output_tfrecord_path) as tf_record_writer:
+    with contextlib2.ExitStack() as tf_record_close_stack:
+      if FLAGS.num_output_shards > 0:
+        tf_record_writers = (
+            tf_record_creation_util.open_sharded_output_tfrecords(
+                tf_record_close_stack, FLAGS.output_tfrecord_path,
+                FLAGS.num_output_shards))
+      else:
+        tf_record_writers = [tf_record_close_stack.enter_context(
+            tf.python_io.TFRecordWriter(FLAGS.output_tfrecord_path))]
+      counter = 0
       try:
-        for counter in itertools.count():
+        for batch_counter in itertools.count():
           tf.logging.log_every_n(tf.logging.INFO, 'Processed %d images...', 10,
                                  counter)
-          tf_example = detection_inference.infer_detections_and_add_to_example(
-              serialized_example_tensor, detected_boxes_tensor,
-              detected_scores_tensor, detected_labels_tensor,
-              FLAGS.discard_image_pixels)
-          tf_record_writer.write(tf_example.SerializeToString())
+          tf_examples = (
+              detection_inference.infer_detections_and_add_to_examples(
+                  serialized_examples_tensor, num_detections_tensor,
+                  detected_boxes_tensor, detected_scores_tensor,
+                  detected_labels_tensor, FLAGS.discard_image_pixels))
+          for tf_example in tf_examples:
+            tf_record_writers[counter % len(tf_record_writers)].write(
+                tf_example.SerializeToString())
+            counter += 1
       except tf.errors.OutOfRangeError:
-        tf.logging.info('Finished processing records')
+        tf.logging.info('Finished processing %d records in %d batches',
+                        counter, batch_counter)
+
+
+def _run_resumable_inference(input_tfrecord_paths):
+  """Scores the input shards of this task, resuming from its manifest."""
+  num_shards = len(input_tfrecord_paths)
+  shard_indices = detection_inference.get_task_shards(
+      num_shards, FLAGS.task_index, FLAGS.num_tasks)
+  manifest_path = '{}.manifest-{:05d}-of-{:05d}.json'.format(
+      FLAGS.output_tfrecord_path, FLAGS.task_index, FLAGS.num_tasks)
+  manifest = detection_inference.load_manifest(manifest_path)
+  tf.logging.info('Task %d/%d processing %d shards, manifest %s',
+                  FLAGS.task_index, FLAGS.num_tasks, len(shard_indices),
+                  manifest_path)
+
+  with tf.Session() as sess:
+    (tfrecord_path_placeholder, skip_records_placeholder, input_initializer,
+     (serialized_examples_tensor, image_tensor,
+      image_shapes_tensor)) = detection_inference.build_resumable_input(
+          FLAGS.batch_size, num_parallel_calls=FLAGS.num_parallel_calls)
+    tf.logging.info('Reading graph and building model...')
+    (num_detections_tensor, detected_boxes_tensor, detected_scores_tensor,
+     detected_labels_tensor) = detection_inference.build_batched_inference_graph(
+         image_tensor, image_shapes_tensor, FLAGS.inference_graph)
+
+    for shard_index in shard_indices:
+      input_path = input_tfrecord_paths[shard_index]
+      output_path = '{}-{:05d}-of-{:05d}'.format(
+          FLAGS.output_tfrecord_path, shard_index, num_shards)
+      shard = manifest['shards'].setdefault(str(shard_index), {
+          'input': input_path, 'output': output_path, 'records': 0,
+          'done': False})
+      if shard['input'] != input_path:
+        raise ValueError('Shard {} was started on {}, not {}: the input paths '
+                         'changed since the manifest {} was written'.format(
+                             shard_index, shard['input'], input_path,
+                             manifest_path))
+      if shard['done']:
+        tf.logging.info('Skipping completed shard %d', shard_index)
+        continue
+      if shard.get('finalizing'):
+        tf.logging.info('Finishing shard %d with %d records', shard_index,
+                        shard['records'])
+        detection_inference.finalize_shard(manifest_path, manifest, shard)
+        continue
+
+      # Records are written to a temporary file renamed when the shard is done.
+      # Records of a previous run are first recovered from a partial file, which
+      # is deleted once they are safely copied.
+      tmp_output_path = output_path + '.tmp'
+      partial_output_path = output_path + '.partial'
+      if shard['records'] and not tf.gfile.Exists(partial_output_path):
+        tf.gfile.Rename(tmp_output_path, partial_output_path)
+      tf.logging.info('Processing shard %d from record %d', shard_index,
+                      shard['records'])
+
+      with tf.python_io.TFRecordWriter(tmp_output_path) as tf_record_writer:
+        if shard['records']:
+          detection_inference.copy_records(
+              partial_output_path, tf_record_writer, shard['records'])
+          tf_record_writer.flush()
+          tf.gfile.Remove(partial_output_path)
+        sess.run(input_initializer, feed_dict={
+            tfrecord_path_placeholder: input_path,
+            skip_records_placeholder: shard['records']})
+        records_since_checkpoint = 0
+        try:
+          while True:
+            tf_examples = (
+                detection_inference.infer_detections_and_add_to_examples(
+                    serialized_examples_tensor, num_detections_tensor,
+                    detected_boxes_tensor, detected_scores_tensor,
+                    detected_labels_tensor, FLAGS.discard_image_pixels))
+            for tf_example in tf_examples:
+              tf_record_writer.write(tf_example.SerializeToString())
+            shard['records'] += len(tf_examples)
+            records_since_checkpoint += len(tf_examples)
+            if records_since_checkpoint >= FLAGS.checkpoint_every:
+              tf_record_writer.flush()
+              detection_inference.save_manifest(manifest_path, manifest)
+              records_since_checkpoint = 0
+              tf.logging.info('Shard %d: processed %d records', shard_index,
+                              shard['records'])
+        except tf.errors.OutOfRangeError:
+          pass
+
+      detection_inference.finalize_shard(manifest_path, manifest, shard)
+      tf.logging.info('Finished shard %d with %d records', shard_index,
+                      shard['records'])
 
 
 if __name__ == '__main__':
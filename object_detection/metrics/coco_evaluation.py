@@ -18,7 +18,6 @@ import tensorflow as tf
 
 from object_detection.core import standard_fields
 from object_detection.metrics import coco_tools
-from object_detection.utils import json_utils
 from object_detection.utils import object_detection_evaluation
 
 
@@ -28,7 +27,8 @@ class CocoDetectionEvaluator(object_detection_evaluation.DetectionEvaluator):
   def __init__(self,
                categories,
                include_metrics_per_category=False,
-               all_metrics_per_category=False):
+               all_metrics_per_category=False,
+               use_numpy_engine=False):
     """Constructor.
 
     Args:
@@ -40,24 +40,29 @@ class CocoDetectionEvaluator(object_detection_evaluation.DetectionEvaluator):
         each category in per_category_ap. Be careful with setting it to true if
         you have more than handful of categories, because it will pollute
         your mldash.
+      use_numpy_engine: If True, compute the metrics with
+        coco_tools.COCONumpyEvalWrapper instead of the pycocotools loops.
     """
     super(CocoDetectionEvaluator, self).__init__(categories)
     # _image_ids is a dictionary that maps unique image ids to Booleans which
     # indicate whether a corresponding detection has been added.
     self._image_ids = {}
     self._groundtruth_list = []
-    self._detection_boxes_list = []
     self._category_id_set = set([cat['id'] for cat in self._categories])
+    self._detection_boxes_list = coco_tools.DetectionStore(
+        self._category_id_set)
     self._annotation_id = 1
     self._metrics = None
     self._include_metrics_per_category = include_metrics_per_category
     self._all_metrics_per_category = all_metrics_per_category
+    self._use_numpy_engine = use_numpy_engine
 
   def clear(self):
     """Clears the state to prepare for a fresh evaluation."""
     self._image_ids.clear()
     self._groundtruth_list = []
-    self._detection_boxes_list = []
+    self._detection_boxes_list = coco_tools.DetectionStore(
+        self._category_id_set)
 
   def add_single_ground_truth_image_info(self,
                                          image_id,
@@ -134,19 +139,17 @@ class CocoDetectionEvaluator(object_detection_evaluation.DetectionEvaluator):
                          'previously added', image_id)
       return
 
-    self._detection_boxes_list.extend(
-        coco_tools.ExportSingleImageDetectionBoxesToCoco(
-            image_id=image_id,
-            category_id_set=self._category_id_set,
-            detection_boxes=detections_dict[standard_fields.
-                                            DetectionResultFields
-                                            .detection_boxes],
-            detection_scores=detections_dict[standard_fields.
-                                             DetectionResultFields.
-                                             detection_scores],
-            detection_classes=detections_dict[standard_fields.
-                                              DetectionResultFields.
-                                              detection_classes]))
+    self._detection_boxes_list.AddSingleImageDetectionBoxes(
+        image_id=image_id,
+        detection_boxes=detections_dict[standard_fields.
+                                        DetectionResultFields
+                                        .detection_boxes],
+        detection_scores=detections_dict[standard_fields.
+                                         DetectionResultFields.
+                                         detection_scores],
+        detection_classes=detections_dict[standard_fields.
+                                          DetectionResultFields.
+                                          detection_classes])
     self._image_ids[image_id] = True
 
   def dump_detections_to_json_file(self, json_output_path):
@@ -154,13 +157,11 @@ class CocoDetectionEvaluator(object_detection_evaluation.DetectionEvaluator):
 
     Args:
       json_output_path: String containing the output file's path. It can be also
-        None. In that case nothing will be written to the output file.
+        None. In that case nothing will be written to the output file. If the
+        path ends with '.npz', the detections are saved in the numpy format
+        instead, see coco_tools.DetectionStore.SaveNpz.
     """
-    if json_output_path and json_output_path is not None:
-      with tf.gfile.GFile(json_output_path, 'w') as fid:
-        tf.logging.info('Dumping detections to output json file.')
-        json_utils.Dump(
-            obj=self._detection_boxes_list, fid=fid, float_digits=4, indent=2)
+    _dump_detections(self._detection_boxes_list, json_output_path)
 
   def evaluate(self):
     """Evaluates the detection boxes and returns a dictionary of coco metrics.
@@ -204,9 +205,15 @@ class CocoDetectionEvaluator(object_detection_evaluation.DetectionEvaluator):
     }
     coco_wrapped_groundtruth = coco_tools.COCOWrapper(groundtruth_dict)
     coco_wrapped_detections = coco_wrapped_groundtruth.LoadAnnotations(
-        self._detection_boxes_list)
-    box_evaluator = coco_tools.COCOEvalWrapper(
-        coco_wrapped_groundtruth, coco_wrapped_detections, agnostic_mode=False)
+        self._detection_boxes_list.ToList())
+    if self._use_numpy_engine:
+      box_evaluator = coco_tools.COCONumpyEvalWrapper(
+          coco_wrapped_groundtruth, coco_wrapped_detections,
+          agnostic_mode=False)
+    else:
+      box_evaluator = coco_tools.COCOEvalWrapper(
+          coco_wrapped_groundtruth, coco_wrapped_detections,
+          agnostic_mode=False)
     box_metrics, box_per_category_ap = box_evaluator.ComputeMetrics(
         include_metrics_per_category=self._include_metrics_per_category,
         all_metrics_per_category=self._all_metrics_per_category)
@@ -374,6 +381,220 @@ class CocoDetectionEvaluator(object_detection_evaluation.DetectionEvaluator):
     return eval_metric_ops
 
 
+class CocoIncrementalDetectionEvaluator(CocoDetectionEvaluator):
+  """Class to evaluate COCO detection metrics incrementally.
+
+  Computes the same metrics as CocoDetectionEvaluator without building the
+  pycocotools objects. Groundtruth and detections are kept in numpy arrays and
+  the detections of an image are matched to its groundtruth as soon as they
+  are added, so that evaluate() only has to accumulate the matches. It does
+  not clear the state either, and can be called periodically during a long
+  evaluation.
+  """
+
+  def __init__(self,
+               categories,
+               include_metrics_per_category=False,
+               all_metrics_per_category=False):
+    """Constructor.
+
+    Args:
+      categories: A list of dicts, each of which has the following keys -
+        'id': (required) an integer id uniquely identifying this category.
+        'name': (required) string representing category name e.g., 'cat', 'dog'.
+      include_metrics_per_category: If True, include metrics for each category.
+      all_metrics_per_category: Whether to include all the summary metrics for
+        each category in per_category_ap. Be careful with setting it to true if
+        you have more than handful of categories, because it will pollute
+        your mldash.
+    """
+    super(CocoIncrementalDetectionEvaluator, self).__init__(
+        categories, include_metrics_per_category=include_metrics_per_category,
+        all_metrics_per_category=all_metrics_per_category)
+    self._category_ids = np.array(sorted(self._category_id_set))
+    category_names = {cat['id']: cat['name'] for cat in self._categories}
+    self._category_names = [category_names[category_id]
+                            for category_id in self._category_ids]
+    self.clear()
+
+  def clear(self):
+    """Clears the state to prepare for a fresh evaluation."""
+    super(CocoIncrementalDetectionEvaluator, self).clear()
+    # Groundtruth of the images whose detections have not been added yet.
+    self._pending_groundtruth = {}
+    self._num_groundtruth = np.zeros(
+        (len(self._category_ids), len(coco_tools.COCO_AREA_RANGES)),
+        dtype=np.int64)
+    self._image_id_list = []
+    # Kept detections of each image, see
+    # coco_tools.MatchSingleImageDetections. The matches are stored as packed
+    # bits.
+    self._detection_image_indices = []
+    self._detection_categories = []
+    self._detection_scores = []
+    self._detection_ranks = []
+    self._detection_matched = []
+    self._detection_ignored = []
+
+  def _category_indices(self, classes):
+    """Returns the category indices of classes and which classes are valid."""
+    indices = np.searchsorted(self._category_ids, classes)
+    indices = np.minimum(indices, len(self._category_ids) - 1)
+    return indices, self._category_ids[indices] == classes
+
+  def add_single_ground_truth_image_info(self,
+                                         image_id,
+                                         groundtruth_dict):
+    """Adds groundtruth for a single image to be used for evaluation.
+
+    If the image has already been added, a warning is logged, and groundtruth is
+    ignored.
+
+    Args:
+      image_id: A unique string/integer identifier for the image.
+      groundtruth_dict: A dictionary containing -
+        InputDataFields.groundtruth_boxes: float32 numpy array of shape
+          [num_boxes, 4] containing `num_boxes` groundtruth boxes of the format
+          [ymin, xmin, ymax, xmax] in absolute image coordinates.
+        InputDataFields.groundtruth_classes: integer numpy array of shape
+          [num_boxes] containing 1-indexed groundtruth classes for the boxes.
+        InputDataFields.groundtruth_is_crowd (optional): integer numpy array of
+          shape [num_boxes] containing iscrowd flag for groundtruth boxes.
+    """
+    if image_id in self._image_ids:
+      tf.logging.warning('Ignoring ground truth with image id %s since it was '
+                         'previously added', image_id)
+      return
+
+    groundtruth_boxes = groundtruth_dict[
+        standard_fields.InputDataFields.groundtruth_boxes]
+    groundtruth_classes = groundtruth_dict[
+        standard_fields.InputDataFields.groundtruth_classes]
+    groundtruth_is_crowd = groundtruth_dict.get(
+        standard_fields.InputDataFields.groundtruth_is_crowd)
+    # Drop groundtruth_is_crowd if empty tensor.
+    if groundtruth_is_crowd is None or not groundtruth_is_crowd.shape[0]:
+      groundtruth_is_crowd = np.zeros(groundtruth_classes.shape, dtype=bool)
+    categories, valid = self._category_indices(groundtruth_classes)
+    groundtruth = (groundtruth_boxes[valid], categories[valid],
+                   groundtruth_is_crowd[valid].astype(bool))
+    self._num_groundtruth += coco_tools.CountGroundtruth(
+        len(self._category_ids), *groundtruth)
+    self._pending_groundtruth[image_id] = groundtruth
+    self._image_ids[image_id] = False
+
+  def add_single_detected_image_info(self,
+                                     image_id,
+                                     detections_dict):
+    """Adds detections for a single image and matches them to groundtruth.
+
+    If a detection has already been added for this image id, a warning is
+    logged, and the detection is skipped.
+
+    Args:
+      image_id: A unique string/integer identifier for the image.
+      detections_dict: A dictionary containing -
+        DetectionResultFields.detection_boxes: float32 numpy array of shape
+          [num_boxes, 4] containing `num_boxes` detection boxes of the format
+          [ymin, xmin, ymax, xmax] in absolute image coordinates.
+        DetectionResultFields.detection_scores: float32 numpy array of shape
+          [num_boxes] containing detection scores for the boxes.
+        DetectionResultFields.detection_classes: integer numpy array of shape
+          [num_boxes] containing 1-indexed detection classes for the boxes.
+
+    Raises:
+      ValueError: If groundtruth for the image_id is not available.
+    """
+    if image_id not in self._image_ids:
+      raise ValueError('Missing groundtruth for image id: {}'.format(image_id))
+
+    if self._image_ids[image_id]:
+      tf.logging.warning('Ignoring detection with image id %s since it was '
+                         'previously added', image_id)
+      return
+
+    detection_boxes = detections_dict[
+        standard_fields.DetectionResultFields.detection_boxes]
+    detection_scores = detections_dict[
+        standard_fields.DetectionResultFields.detection_scores]
+    detection_classes = detections_dict[
+        standard_fields.DetectionResultFields.detection_classes]
+    categories, valid = self._category_indices(detection_classes)
+    detection_boxes = detection_boxes[valid]
+    detection_scores = detection_scores[valid]
+    categories = categories[valid]
+
+    groundtruth_boxes, groundtruth_categories, groundtruth_is_crowd = (
+        self._pending_groundtruth.pop(image_id))
+    indices, ranks, matched, ignored = coco_tools.MatchSingleImageDetections(
+        len(self._category_ids), groundtruth_boxes, groundtruth_categories,
+        groundtruth_is_crowd, detection_boxes, detection_scores, categories)
+    num_matches = (len(coco_tools.COCO_AREA_RANGES) *
+                   len(coco_tools.COCO_IOU_THRESHOLDS))
+    self._detection_image_indices.append(
+        np.full(len(indices), len(self._image_id_list), dtype=np.int64))
+    self._detection_categories.append(categories[indices])
+    self._detection_scores.append(detection_scores[indices])
+    self._detection_ranks.append(ranks)
+    self._detection_matched.append(
+        np.packbits(matched.reshape(len(indices), num_matches), axis=1))
+    self._detection_ignored.append(
+        np.packbits(ignored.reshape(len(indices), num_matches), axis=1))
+    self._detection_boxes_list.AddSingleImageDetectionBoxes(
+        image_id, detection_boxes, detection_scores,
+        self._category_ids[categories])
+    self._image_id_list.append(image_id)
+    self._image_ids[image_id] = True
+
+  def evaluate(self):
+    """Evaluates the detection boxes and returns a dictionary of coco metrics.
+
+    The groundtruth of the images without detections is also evaluated. See
+    CocoDetectionEvaluator.evaluate for the returned metrics.
+
+    Returns:
+      A dictionary holding the metrics of CocoDetectionEvaluator.evaluate.
+    """
+    num_area_ranges = len(coco_tools.COCO_AREA_RANGES)
+    num_iou_thresholds = len(coco_tools.COCO_IOU_THRESHOLDS)
+
+    def _unpack(packed_matches):
+      # np.unpackbits has no count argument before numpy 1.17.
+      matches = np.unpackbits(np.concatenate(packed_matches), axis=1)
+      return matches[:, :num_area_ranges * num_iou_thresholds].reshape(
+          -1, num_area_ranges, num_iou_thresholds).astype(bool)
+
+    if self._detection_scores:
+      # pycocotools breaks ties between scores using the sorted image ids.
+      image_ranks = np.argsort(np.argsort(self._image_id_list,
+                                          kind='mergesort'))
+      precision, recall = coco_tools.AccumulateMatches(
+          self._num_groundtruth,
+          np.concatenate(self._detection_categories),
+          np.concatenate(self._detection_scores),
+          image_ranks[np.concatenate(self._detection_image_indices)],
+          np.concatenate(self._detection_ranks),
+          _unpack(self._detection_matched),
+          _unpack(self._detection_ignored))
+    else:
+      shape = (0, num_area_ranges, num_iou_thresholds)
+      precision, recall = coco_tools.AccumulateMatches(
+          self._num_groundtruth, np.zeros(0, np.int64), np.zeros(0),
+          np.zeros(0, np.int64), np.zeros(0, np.int64),
+          np.zeros(shape, bool), np.zeros(shape, bool))
+    stats, category_stats = coco_tools.SummarizeMatches(precision, recall)
+    if self._include_metrics_per_category:
+      box_metrics, box_per_category_ap = coco_tools.MetricsFromStats(
+          stats, category_stats, self._category_names,
+          self._all_metrics_per_category)
+    else:
+      box_metrics, box_per_category_ap = coco_tools.MetricsFromStats(stats)
+    box_metrics.update(box_per_category_ap)
+    box_metrics = {'DetectionBoxes_'+ key: value
+                   for key, value in iter(box_metrics.items())}
+    return box_metrics
+
+
 def _check_mask_type_and_value(array_name, masks):
   """Checks whether mask dtype is uint8 and the values are either 0 or 1."""
   if masks.dtype != np.uint8:
@@ -384,6 +605,20 @@ def _check_mask_type_and_value(array_name, masks):
         array_name))
 
 
+def _dump_detections(detection_store, output_path):
+  """Writes a coco_tools.DetectionStore to a json or a .npz file."""
+  if not output_path:
+    return
+  if output_path.endswith('.npz'):
+    tf.logging.info('Dumping detections to output npz file.')
+    with tf.gfile.GFile(output_path, 'wb') as fid:
+      detection_store.SaveNpz(fid)
+  else:
+    tf.logging.info('Dumping detections to output json file.')
+    with tf.gfile.GFile(output_path, 'w') as fid:
+      detection_store.WriteJson(fid, float_digits=4)
+
+
 class CocoMaskEvaluator(object_detection_evaluation.DetectionEvaluator):
   """Class to evaluate COCO detection metrics."""
 
@@ -400,8 +635,9 @@ class CocoMaskEvaluator(object_detection_evaluation.DetectionEvaluator):
     self._image_id_to_mask_shape_map = {}
     self._image_ids_with_detections = set([])
     self._groundtruth_list = []
-    self._detection_masks_list = []
     self._category_id_set = set([cat['id'] for cat in self._categories])
+    self._detection_masks_list = coco_tools.DetectionStore(
+        self._category_id_set, detection_type='segmentation')
     self._annotation_id = 1
     self._include_metrics_per_category = include_metrics_per_category
 
@@ -410,7 +646,8 @@ class CocoMaskEvaluator(object_detection_evaluation.DetectionEvaluator):
     self._image_id_to_mask_shape_map.clear()
     self._image_ids_with_detections.clear()
     self._groundtruth_list = []
-    self._detection_masks_list = []
+    self._detection_masks_list = coco_tools.DetectionStore(
+        self._category_id_set, detection_type='segmentation')
 
   def add_single_ground_truth_image_info(self,
                                          image_id,
@@ -504,17 +741,15 @@ class CocoMaskEvaluator(object_detection_evaluation.DetectionEvaluator):
     _check_mask_type_and_value(standard_fields.DetectionResultFields.
                                detection_masks,
                                detection_masks)
-    self._detection_masks_list.extend(
-        coco_tools.ExportSingleImageDetectionMasksToCoco(
-            image_id=image_id,
-            category_id_set=self._category_id_set,
-            detection_masks=detection_masks,
-            detection_scores=detections_dict[standard_fields.
-                                             DetectionResultFields.
-                                             detection_scores],
-            detection_classes=detections_dict[standard_fields.
-                                              DetectionResultFields.
-                                              detection_classes]))
+    self._detection_masks_list.AddSingleImageDetectionMasks(
+        image_id=image_id,
+        detection_masks=detection_masks,
+        detection_scores=detections_dict[standard_fields.
+                                         DetectionResultFields.
+                                         detection_scores],
+        detection_classes=detections_dict[standard_fields.
+                                          DetectionResultFields.
+                                          detection_classes])
     self._image_ids_with_detections.update([image_id])
 
   def dump_detections_to_json_file(self, json_output_path):
@@ -522,13 +757,11 @@ class CocoMaskEvaluator(object_detection_evaluation.DetectionEvaluator):
 
     Args:
       json_output_path: String containing the output file's path. It can be also
-        None. In that case nothing will be written to the output file.
+        None. In that case nothing will be written to the output file. If the
+        path ends with '.npz', the detections are saved in the numpy format
+        instead, see coco_tools.DetectionStore.SaveNpz.
     """
-    if json_output_path and json_output_path is not None:
-      tf.logging.info('Dumping detections to output json file.')
-      with tf.gfile.GFile(json_output_path, 'w') as fid:
-        json_utils.Dump(
-            obj=self._detection_masks_list, fid=fid, float_digits=4, indent=2)
+    _dump_detections(self._detection_masks_list, json_output_path)
 
   def evaluate(self):
     """Evaluates the detection masks and returns a dictionary of coco metrics.
@@ -574,7 +807,7 @@ class CocoMaskEvaluator(object_detection_evaluation.DetectionEvaluator):
     coco_wrapped_groundtruth = coco_tools.COCOWrapper(
         groundtruth_dict, detection_type='segmentation')
     coco_wrapped_detection_masks = coco_wrapped_groundtruth.LoadAnnotations(
-        self._detection_masks_list)
+        self._detection_masks_list.ToList())
     mask_evaluator = coco_tools.COCOEvalWrapper(
         coco_wrapped_groundtruth, coco_wrapped_detection_masks,
         agnostic_mode=False, iou_type='segm')
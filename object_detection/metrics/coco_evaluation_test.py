@@ -231,6 +231,257 @@ class CocoDetectionEvaluationTest(tf.test.TestCase):
           })
 
 
+def _add_random_images(coco_evaluator, num_images, seed):
+  """Adds random groundtruth and detections, some matching, to an evaluator."""
+  random_state = np.random.RandomState(seed)
+  for image_index in range(num_images):
+    num_groundtruth = random_state.randint(1, 8)
+    corners = random_state.uniform(0, 300, size=(num_groundtruth, 2))
+    sizes = random_state.choice([10, 50, 150], size=(num_groundtruth, 2))
+    groundtruth_boxes = np.concatenate(
+        [corners, corners + sizes], axis=1).astype(np.float32)
+    groundtruth_classes = random_state.randint(1, 4, size=num_groundtruth)
+    sources = random_state.randint(0, num_groundtruth, size=30)
+    detection_boxes = (groundtruth_boxes[sources] + random_state.normal(
+        0, 5, size=(30, 4))).astype(np.float32)
+    coco_evaluator.add_single_ground_truth_image_info(
+        image_id='image{}'.format(image_index),
+        groundtruth_dict={
+            standard_fields.InputDataFields.groundtruth_boxes:
+                groundtruth_boxes,
+            standard_fields.InputDataFields.groundtruth_classes:
+                groundtruth_classes,
+            standard_fields.InputDataFields.groundtruth_is_crowd:
+                (random_state.rand(num_groundtruth) < .1).astype(int)
+        })
+    coco_evaluator.add_single_detected_image_info(
+        image_id='image{}'.format(image_index),
+        detections_dict={
+            standard_fields.DetectionResultFields.detection_boxes:
+                detection_boxes,
+            standard_fields.DetectionResultFields.detection_scores:
+                np.round(random_state.rand(30), 1).astype(np.float32),
+            standard_fields.DetectionResultFields.detection_classes:
+                np.where(random_state.rand(30) < .8,
+                         groundtruth_classes[sources],
+                         random_state.randint(1, 4, size=30))
+        })
+
+
+class CocoDetectionEvaluationNumpyEngineTest(tf.test.TestCase):
+
+  def _assertSameMetrics(self, add_images_fn):
+    coco_evaluator = coco_evaluation.CocoDetectionEvaluator(
+        _get_categories_list())
+    numpy_coco_evaluator = coco_evaluation.CocoDetectionEvaluator(
+        _get_categories_list(), use_numpy_engine=True)
+    add_images_fn(coco_evaluator)
+    add_images_fn(numpy_coco_evaluator)
+    expected_metrics = coco_evaluator.evaluate()
+    metrics = numpy_coco_evaluator.evaluate()
+    self.assertEqual(sorted(expected_metrics), sorted(metrics))
+    for key, value in expected_metrics.items():
+      self.assertAlmostEqual(value, metrics[key], msg=key)
+    return metrics
+
+  def testGetOneMAPWithMatchingGroundtruthAndDetections(self):
+    def add_images(coco_evaluator):
+      for image_id, box in [('image1', [100., 100., 200., 200.]),
+                            ('image2', [50., 50., 100., 100.]),
+                            ('image3', [25., 25., 50., 50.])]:
+        coco_evaluator.add_single_ground_truth_image_info(
+            image_id=image_id,
+            groundtruth_dict={
+                standard_fields.InputDataFields.groundtruth_boxes:
+                np.array([box]),
+                standard_fields.InputDataFields.groundtruth_classes:
+                np.array([1])
+            })
+        coco_evaluator.add_single_detected_image_info(
+            image_id=image_id,
+            detections_dict={
+                standard_fields.DetectionResultFields.detection_boxes:
+                np.array([box]),
+                standard_fields.DetectionResultFields.detection_scores:
+                np.array([.8]),
+                standard_fields.DetectionResultFields.detection_classes:
+                np.array([1])
+            })
+    metrics = self._assertSameMetrics(add_images)
+    self.assertAlmostEqual(metrics['DetectionBoxes_Precision/mAP'], 1.0)
+
+  def testGetOneMAPWithMatchingGroundtruthAndDetectionsSkipCrowd(self):
+    def add_images(coco_evaluator):
+      coco_evaluator.add_single_ground_truth_image_info(
+          image_id='image1',
+          groundtruth_dict={
+              standard_fields.InputDataFields.groundtruth_boxes:
+                  np.array([[100., 100., 200., 200.], [99., 99., 200., 200.]]),
+              standard_fields.InputDataFields.groundtruth_classes:
+                  np.array([1, 2]),
+              standard_fields.InputDataFields.groundtruth_is_crowd:
+                  np.array([0, 1])
+          })
+      coco_evaluator.add_single_detected_image_info(
+          image_id='image1',
+          detections_dict={
+              standard_fields.DetectionResultFields.detection_boxes:
+                  np.array([[100., 100., 200., 200.]]),
+              standard_fields.DetectionResultFields.detection_scores:
+                  np.array([.8]),
+              standard_fields.DetectionResultFields.detection_classes:
+                  np.array([1])
+          })
+    metrics = self._assertSameMetrics(add_images)
+    self.assertAlmostEqual(metrics['DetectionBoxes_Precision/mAP'], 1.0)
+
+  def testRandomImages(self):
+    self._assertSameMetrics(
+        lambda evaluator: _add_random_images(evaluator, 50, seed=2))
+
+
+class CocoIncrementalDetectionEvaluationTest(tf.test.TestCase):
+
+  def _add_image(self, coco_evaluator, image_id, boxes):
+    coco_evaluator.add_single_ground_truth_image_info(
+        image_id=image_id,
+        groundtruth_dict={
+            standard_fields.InputDataFields.groundtruth_boxes: boxes,
+            standard_fields.InputDataFields.groundtruth_classes: np.array([1])
+        })
+    coco_evaluator.add_single_detected_image_info(
+        image_id=image_id,
+        detections_dict={
+            standard_fields.DetectionResultFields.detection_boxes: boxes,
+            standard_fields.DetectionResultFields.detection_scores:
+            np.array([.8]),
+            standard_fields.DetectionResultFields.detection_classes:
+            np.array([1])
+        })
+
+  def testGetOneMAPWithMatchingGroundtruthAndDetections(self):
+    coco_evaluator = coco_evaluation.CocoIncrementalDetectionEvaluator(
+        _get_categories_list())
+    self._add_image(coco_evaluator, 'image1',
+                    np.array([[100., 100., 200., 200.]]))
+    self._add_image(coco_evaluator, 'image2',
+                    np.array([[50., 50., 100., 100.]]))
+    self._add_image(coco_evaluator, 'image3',
+                    np.array([[25., 25., 50., 50.]]))
+    metrics = coco_evaluator.evaluate()
+    self.assertAlmostEqual(metrics['DetectionBoxes_Precision/mAP'], 1.0)
+    self.assertAlmostEqual(metrics['DetectionBoxes_Recall/AR@100 (large)'], 1.0)
+    self.assertAlmostEqual(metrics['DetectionBoxes_Precision/mAP (small)'],
+                           1.0)
+
+  def testEvaluateDoesNotClearState(self):
+    coco_evaluator = coco_evaluation.CocoIncrementalDetectionEvaluator(
+        _get_categories_list())
+    self._add_image(coco_evaluator, 'image1',
+                    np.array([[100., 100., 200., 200.]]))
+    self.assertAlmostEqual(
+        coco_evaluator.evaluate()['DetectionBoxes_Precision/mAP'], 1.0)
+    # Groundtruth without detections lowers the recall of the next snapshot.
+    coco_evaluator.add_single_ground_truth_image_info(
+        image_id='image2',
+        groundtruth_dict={
+            standard_fields.InputDataFields.groundtruth_boxes:
+            np.array([[50., 50., 100., 100.]]),
+            standard_fields.InputDataFields.groundtruth_classes: np.array([1])
+        })
+    metrics = coco_evaluator.evaluate()
+    self.assertAlmostEqual(metrics['DetectionBoxes_Recall/AR@100'], 0.5)
+    coco_evaluator.clear()
+    self._add_image(coco_evaluator, 'image2',
+                    np.array([[50., 50., 100., 100.]]))
+    self.assertAlmostEqual(
+        coco_evaluator.evaluate()['DetectionBoxes_Recall/AR@100'], 1.0)
+
+  def testGetOneMAPWithMatchingGroundtruthAndDetectionsSkipCrowd(self):
+    coco_evaluator = coco_evaluation.CocoIncrementalDetectionEvaluator(
+        _get_categories_list())
+    coco_evaluator.add_single_ground_truth_image_info(
+        image_id='image1',
+        groundtruth_dict={
+            standard_fields.InputDataFields.groundtruth_boxes:
+                np.array([[100., 100., 200., 200.], [99., 99., 200., 200.]]),
+            standard_fields.InputDataFields.groundtruth_classes:
+                np.array([1, 1]),
+            standard_fields.InputDataFields.groundtruth_is_crowd:
+                np.array([0, 1])
+        })
+    coco_evaluator.add_single_detected_image_info(
+        image_id='image1',
+        detections_dict={
+            standard_fields.DetectionResultFields.detection_boxes:
+                np.array([[100., 100., 200., 200.], [99., 99., 200., 200.]]),
+            standard_fields.DetectionResultFields.detection_scores:
+                np.array([.8, .9]),
+            standard_fields.DetectionResultFields.detection_classes:
+                np.array([1, 1])
+        })
+    metrics = coco_evaluator.evaluate()
+    self.assertAlmostEqual(metrics['DetectionBoxes_Precision/mAP'], 1.0)
+
+  def testPerCategoryMetrics(self):
+    coco_evaluator = coco_evaluation.CocoIncrementalDetectionEvaluator(
+        _get_categories_list(), include_metrics_per_category=True)
+    self._add_image(coco_evaluator, 'image1',
+                    np.array([[100., 100., 200., 200.]]))
+    metrics = coco_evaluator.evaluate()
+    self.assertAlmostEqual(
+        metrics['DetectionBoxes_PerformanceByCategory/mAP/person'], 1.0)
+    self.assertAlmostEqual(
+        metrics['DetectionBoxes_PerformanceByCategory/mAP/dog'], -1.0)
+
+  def testMatchesCocoDetectionEvaluator(self):
+    coco_evaluator = coco_evaluation.CocoDetectionEvaluator(
+        _get_categories_list())
+    incremental_coco_evaluator = (
+        coco_evaluation.CocoIncrementalDetectionEvaluator(
+            _get_categories_list()))
+    _add_random_images(coco_evaluator, num_images=20, seed=1)
+    _add_random_images(incremental_coco_evaluator, num_images=20, seed=1)
+    expected_metrics = coco_evaluator.evaluate()
+    metrics = incremental_coco_evaluator.evaluate()
+    self.assertEqual(sorted(expected_metrics), sorted(metrics))
+    for key, value in expected_metrics.items():
+      self.assertAlmostEqual(value, metrics[key], msg=key)
+
+  def testRejectionOnDuplicateDetections(self):
+    coco_evaluator = coco_evaluation.CocoIncrementalDetectionEvaluator(
+        _get_categories_list())
+    self._add_image(coco_evaluator, 'image1',
+                    np.array([[100., 100., 200., 200.]]))
+    coco_evaluator.add_single_detected_image_info(
+        image_id='image1',
+        detections_dict={
+            standard_fields.DetectionResultFields.detection_boxes:
+            np.array([[0., 0., 10., 10.]]),
+            standard_fields.DetectionResultFields.detection_scores:
+            np.array([.9]),
+            standard_fields.DetectionResultFields.detection_classes:
+            np.array([1])
+        })
+    self.assertAlmostEqual(
+        coco_evaluator.evaluate()['DetectionBoxes_Precision/mAP'], 1.0)
+
+  def testExceptionRaisedWithMissingGroundtruth(self):
+    coco_evaluator = coco_evaluation.CocoIncrementalDetectionEvaluator(
+        _get_categories_list())
+    with self.assertRaises(ValueError):
+      coco_evaluator.add_single_detected_image_info(
+          image_id='image1',
+          detections_dict={
+              standard_fields.DetectionResultFields.detection_boxes:
+                  np.array([[100., 100., 200., 200.]]),
+              standard_fields.DetectionResultFields.detection_scores:
+                  np.array([.8]),
+              standard_fields.DetectionResultFields.detection_classes:
+                  np.array([1])
+          })
+
+
 class CocoEvaluationPyFuncTest(tf.test.TestCase):
 
   def testGetOneMAPWithMatchingGroundtruthAndDetections(self):
@@ -41,6 +41,7 @@ then evaluation (in multi-class mode) can be invoked as follows:
 """
 from collections import OrderedDict
 import copy
+import json
 import time
 import numpy as np
 
@@ -237,59 +238,85 @@ class COCOEvalWrapper(cocoeval.COCOeval):
     self.accumulate()
     self.summarize()
 
-    summary_metrics = OrderedDict([
-        ('Precision/mAP', self.stats[0]),
-        ('Precision/mAP@.50IOU', self.stats[1]),
-        ('Precision/mAP@.75IOU', self.stats[2]),
-        ('Precision/mAP (small)', self.stats[3]),
-        ('Precision/mAP (medium)', self.stats[4]),
-        ('Precision/mAP (large)', self.stats[5]),
-        ('Recall/AR@1', self.stats[6]),
-        ('Recall/AR@10', self.stats[7]),
-        ('Recall/AR@100', self.stats[8]),
-        ('Recall/AR@100 (small)', self.stats[9]),
-        ('Recall/AR@100 (medium)', self.stats[10]),
-        ('Recall/AR@100 (large)', self.stats[11])
-    ])
     if not include_metrics_per_category:
-      return summary_metrics, {}
+      return MetricsFromStats(self.stats)[0], {}
     if not hasattr(self, 'category_stats'):
       raise ValueError('Category stats do not exist')
-    per_category_ap = OrderedDict([])
     if self.GetAgnosticMode():
-      return summary_metrics, per_category_ap
-    for category_index, category_id in enumerate(self.GetCategoryIdList()):
-      category = self.GetCategory(category_id)['name']
-      # Kept for backward compatilbility
-      per_category_ap['PerformanceByCategory/mAP/{}'.format(
-          category)] = self.category_stats[0][category_index]
-      if all_metrics_per_category:
-        per_category_ap['Precision mAP ByCategory/{}'.format(
-            category)] = self.category_stats[0][category_index]
-        per_category_ap['Precision mAP@.50IOU ByCategory/{}'.format(
-            category)] = self.category_stats[1][category_index]
-        per_category_ap['Precision mAP@.75IOU ByCategory/{}'.format(
-            category)] = self.category_stats[2][category_index]
-        per_category_ap['Precision mAP (small) ByCategory/{}'.format(
-            category)] = self.category_stats[3][category_index]
-        per_category_ap['Precision mAP (medium) ByCategory/{}'.format(
-            category)] = self.category_stats[4][category_index]
-        per_category_ap['Precision mAP (large) ByCategory/{}'.format(
-            category)] = self.category_stats[5][category_index]
-        per_category_ap['Recall AR@1 ByCategory/{}'.format(
-            category)] = self.category_stats[6][category_index]
-        per_category_ap['Recall AR@10 ByCategory/{}'.format(
-            category)] = self.category_stats[7][category_index]
-        per_category_ap['Recall AR@100 ByCategory/{}'.format(
-            category)] = self.category_stats[8][category_index]
-        per_category_ap['Recall AR@100 (small) ByCategory/{}'.format(
-            category)] = self.category_stats[9][category_index]
-        per_category_ap['Recall AR@100 (medium) ByCategory/{}'.format(
-            category)] = self.category_stats[10][category_index]
-        per_category_ap['Recall AR@100 (large) ByCategory/{}'.format(
-            category)] = self.category_stats[11][category_index]
+      return MetricsFromStats(self.stats)
+    category_names = [self.GetCategory(category_id)['name']
+                      for category_id in self.GetCategoryIdList()]
+    return MetricsFromStats(self.stats, self.category_stats, category_names,
+                            all_metrics_per_category)
 
+
+def MetricsFromStats(stats,
+                     category_stats=None,
+                     category_names=None,
+                     all_metrics_per_category=False):
+  """Names the summary statistics computed by the COCO evaluation.
+
+  Args:
+    stats: the 12 summary statistics of cocoeval.COCOeval.summarize.
+    category_stats: optional [12, num_categories] array holding the same
+      statistics for each category.
+    category_names: names of the categories of category_stats.
+    all_metrics_per_category: If true, include all the summary metrics for
+      each category in per_category_ap.
+
+  Returns:
+    1. summary_metrics: a dictionary holding the metrics described in
+      COCOEvalWrapper.ComputeMetrics.
+    2. per_category_ap: a dictionary holding category specific results, see
+      COCOEvalWrapper.ComputeMetrics. It is empty if category_stats is None.
+  """
+  summary_metrics = OrderedDict([
+      ('Precision/mAP', stats[0]),
+      ('Precision/mAP@.50IOU', stats[1]),
+      ('Precision/mAP@.75IOU', stats[2]),
+      ('Precision/mAP (small)', stats[3]),
+      ('Precision/mAP (medium)', stats[4]),
+      ('Precision/mAP (large)', stats[5]),
+      ('Recall/AR@1', stats[6]),
+      ('Recall/AR@10', stats[7]),
+      ('Recall/AR@100', stats[8]),
+      ('Recall/AR@100 (small)', stats[9]),
+      ('Recall/AR@100 (medium)', stats[10]),
+      ('Recall/AR@100 (large)', stats[11])
+  ])
+  per_category_ap = OrderedDict([])
+  if category_stats is None:
     return summary_metrics, per_category_ap
+  for category_index, category in enumerate(category_names):
+    # Kept for backward compatilbility
+    per_category_ap['PerformanceByCategory/mAP/{}'.format(
+        category)] = category_stats[0][category_index]
+    if all_metrics_per_category:
+      per_category_ap['Precision mAP ByCategory/{}'.format(
+          category)] = category_stats[0][category_index]
+      per_category_ap['Precision mAP@.50IOU ByCategory/{}'.format(
+          category)] = category_stats[1][category_index]
+      per_category_ap['Precision mAP@.75IOU ByCategory/{}'.format(
+          category)] = category_stats[2][category_index]
+      per_category_ap['Precision mAP (small) ByCategory/{}'.format(
+          category)] = category_stats[3][category_index]
+      per_category_ap['Precision mAP (medium) ByCategory/{}'.format(
+          category)] = category_stats[4][category_index]
+      per_category_ap['Precision mAP (large) ByCategory/{}'.format(
+          category)] = category_stats[5][category_index]
+      per_category_ap['Recall AR@1 ByCategory/{}'.format(
+          category)] = category_stats[6][category_index]
+      per_category_ap['Recall AR@10 ByCategory/{}'.format(
+          category)] = category_stats[7][category_index]
+      per_category_ap['Recall AR@100 ByCategory/{}'.format(
+          category)] = category_stats[8][category_index]
+      per_category_ap['Recall AR@100 (small) ByCategory/{}'.format(
+          category)] = category_stats[9][category_index]
+      per_category_ap['Recall AR@100 (medium) ByCategory/{}'.format(
+          category)] = category_stats[10][category_index]
+      per_category_ap['Recall AR@100 (large) ByCategory/{}'.format(
+          category)] = category_stats[11][category_index]
+  return summary_metrics, per_category_ap
 
 
 def _ConvertBoxToCOCOFormat(box):
@@ -484,6 +511,57 @@ def ExportGroundtruthToCOCO(image_ids,
   return groundtruth_dict
 
 
+def _CheckDetectionBoxes(detection_boxes, detection_scores, detection_classes):
+  """Checks the shapes of the detections of an image.
+
+  Raises:
+    ValueError: if (1) detection_boxes, detection_scores and detection_classes
+      do not have the right lengths or (2) if each of the elements inside these
+      lists do not have the correct shapes.
+  """
+  if len(detection_classes.shape) != 1 or len(detection_scores.shape) != 1:
+    raise ValueError('All entries in detection_classes and detection_scores'
+                     'expected to be of rank 1.')
+  if len(detection_boxes.shape) != 2:
+    raise ValueError('All entries in detection_boxes expected to be of '
+                     'rank 2.')
+  if detection_boxes.shape[1] != 4:
+    raise ValueError('All entries in detection_boxes should have '
+                     'shape[1] == 4.')
+  num_boxes = detection_classes.shape[0]
+  if not num_boxes == detection_boxes.shape[0] == detection_scores.shape[0]:
+    raise ValueError('Corresponding entries in detection_classes, '
+                     'detection_scores and detection_boxes should have '
+                     'compatible shapes (i.e., agree on the 0th dimension). '
+                     'Classes shape: %d. Boxes shape: %d. '
+                     'Scores shape: %d' % (
+                         detection_classes.shape[0], detection_boxes.shape[0],
+                         detection_scores.shape[0]
+                     ))
+
+
+def _CheckDetectionMasks(detection_masks, detection_scores, detection_classes):
+  """Checks the shapes of the detection masks of an image.
+
+  Raises:
+    ValueError: if detection_masks, detection_scores and detection_classes do
+      not have the right lengths or shapes.
+  """
+  if len(detection_classes.shape) != 1 or len(detection_scores.shape) != 1:
+    raise ValueError('All entries in detection_classes and detection_scores'
+                     'expected to be of rank 1.')
+  num_boxes = detection_classes.shape[0]
+  if not num_boxes == len(detection_masks) == detection_scores.shape[0]:
+    raise ValueError('Corresponding entries in detection_classes, '
+                     'detection_scores and detection_masks should have '
+                     'compatible lengths and shapes '
+                     'Classes length: %d.  Masks length: %d. '
+                     'Scores length: %d' % (
+                         detection_classes.shape[0], len(detection_masks),
+                         detection_scores.shape[0]
+                     ))
+
+
 def ExportSingleImageDetectionBoxesToCoco(image_id,
                                           category_id_set,
                                           detection_boxes,
@@ -518,25 +596,8 @@ def ExportSingleImageDetectionBoxesToCoco(image_id,
       lists do not have the correct shapes or (3) if image_ids are not integers.
   """
 
-  if len(detection_classes.shape) != 1 or len(detection_scores.shape) != 1:
-    raise ValueError('All entries in detection_classes and detection_scores'
-                     'expected to be of rank 1.')
-  if len(detection_boxes.shape) != 2:
-    raise ValueError('All entries in detection_boxes expected to be of '
-                     'rank 2.')
-  if detection_boxes.shape[1] != 4:
-    raise ValueError('All entries in detection_boxes should have '
-                     'shape[1] == 4.')
+  _CheckDetectionBoxes(detection_boxes, detection_scores, detection_classes)
   num_boxes = detection_classes.shape[0]
-  if not num_boxes == detection_boxes.shape[0] == detection_scores.shape[0]:
-    raise ValueError('Corresponding entries in detection_classes, '
-                     'detection_scores and detection_boxes should have '
-                     'compatible shapes (i.e., agree on the 0th dimension). '
-                     'Classes shape: %d. Boxes shape: %d. '
-                     'Scores shape: %d' % (
-                         detection_classes.shape[0], detection_boxes.shape[0],
-                         detection_scores.shape[0]
-                     ))
   detections_list = []
   for i in range(num_boxes):
     if detection_classes[i] in category_id_set:
@@ -582,19 +643,8 @@ def ExportSingleImageDetectionMasksToCoco(image_id,
       lists do not have the correct shapes or (3) if image_ids are not integers.
   """
 
-  if len(detection_classes.shape) != 1 or len(detection_scores.shape) != 1:
-    raise ValueError('All entries in detection_classes and detection_scores'
-                     'expected to be of rank 1.')
+  _CheckDetectionMasks(detection_masks, detection_scores, detection_classes)
   num_boxes = detection_classes.shape[0]
-  if not num_boxes == len(detection_masks) == detection_scores.shape[0]:
-    raise ValueError('Corresponding entries in detection_classes, '
-                     'detection_scores and detection_masks should have '
-                     'compatible lengths and shapes '
-                     'Classes length: %d.  Masks length: %d. '
-                     'Scores length: %d' % (
-                         detection_classes.shape[0], len(detection_masks),
-                         detection_scores.shape[0]
-                     ))
   detections_list = []
   for i in range(num_boxes):
     if detection_classes[i] in category_id_set:
@@ -607,6 +657,242 @@ def ExportSingleImageDetectionMasksToCoco(image_id,
   return detections_list
 
 
+# Records of the detections held by a DetectionStore, 32 bytes per box.
+_DETECTION_BOXES_DTYPE = np.dtype([('image_index', np.int32),
+                                   ('category_id', np.int32),
+                                   ('score', np.float64),
+                                   ('bbox', np.float32, (4,))])
+# Masks are run-length encoded in a byte blob shared by all the records.
+_DETECTION_MASKS_DTYPE = np.dtype([('image_index', np.int32),
+                                   ('category_id', np.int32),
+                                   ('score', np.float64),
+                                   ('size', np.int32, (2,)),
+                                   ('rle_offset', np.int64),
+                                   ('rle_length', np.int64)])
+
+
+class DetectionStore(object):
+  """Columnar store of the detections of a set of images.
+
+  Holds the same detections as the lists built with
+  ExportSingleImageDetectionBoxesToCoco or ExportSingleImageDetectionMasksToCoco
+  but in a structured numpy array instead of one dictionary per detection,
+  i.e. 32 bytes per detection box instead of several hundreds. Box coordinates
+  are stored as float32, the precision of the model outputs.
+
+  The detections can be exported to the COCO format with a streaming json
+  writer, to a numpy .npz file, or to a list of dictionaries for evaluation.
+  """
+
+  def __init__(self, category_id_set, detection_type='bbox'):
+    """DetectionStore constructor.
+
+    Args:
+      category_id_set: A set of valid class ids. Detections with classes not in
+        category_id_set are dropped.
+      detection_type: type of the detections stored. Can be one of ['bbox',
+        'segmentation']
+
+    Raises:
+      ValueError: if detection_type is unsupported.
+    """
+    if detection_type not in ('bbox', 'segmentation'):
+      raise ValueError('Unsupported detection type: {}'.format(detection_type))
+    self._detection_type = detection_type
+    self._dtype = (_DETECTION_BOXES_DTYPE if detection_type == 'bbox' else
+                   _DETECTION_MASKS_DTYPE)
+    self._category_ids = np.array(sorted(category_id_set), dtype=np.int64)
+    self._image_ids = []
+    # The records of every 1024 images are merged in a chunk, an array per
+    # image would cost about as much as the records of a few detections.
+    # Merged chunks are never copied again.
+    self._chunks = []
+    self._pending_records = []
+    self._num_records = 0
+    self._rle_blob = bytearray()
+
+  def __len__(self):
+    return self._num_records
+
+  def _ValidCategories(self, detection_classes):
+    """Returns which detection classes are in the category id set."""
+    return np.isin(detection_classes, self._category_ids)
+
+  def _AddRecords(self, image_id, records):
+    records['image_index'] = len(self._image_ids)
+    self._image_ids.append(image_id)
+    self._num_records += len(records)
+    self._pending_records.append(records)
+    if len(self._pending_records) >= 1024:
+      self._chunks.append(np.concatenate(self._pending_records))
+      self._pending_records = []
+
+  def AddSingleImageDetectionBoxes(self,
+                                   image_id,
+                                   detection_boxes,
+                                   detection_scores,
+                                   detection_classes):
+    """Adds the detection boxes of a single image.
+
+    Args:
+      image_id: unique image identifier either of type integer or string.
+      detection_boxes: float numpy array of shape [num_detections, 4]
+        containing detection boxes in [ymin, xmin, ymax, xmax] format.
+      detection_scores: float numpy array of shape [num_detections] containing
+        scored for the detection boxes.
+      detection_classes: integer numpy array of shape [num_detections]
+        containing the classes for detection boxes.
+
+    Raises:
+      ValueError: if the store holds masks, or if detection_boxes,
+        detection_scores and detection_classes do not have the right shapes.
+    """
+    if self._detection_type != 'bbox':
+      raise ValueError('Cannot add boxes to a store of detection masks.')
+    _CheckDetectionBoxes(detection_boxes, detection_scores, detection_classes)
+    valid = self._ValidCategories(detection_classes)
+    records = np.zeros(np.count_nonzero(valid), dtype=self._dtype)
+    records['category_id'] = detection_classes[valid]
+    records['score'] = detection_scores[valid]
+    records['bbox'] = ConvertBoxesToCOCOFormat(detection_boxes[valid])
+    self._AddRecords(image_id, records)
+
+  def AddSingleImageDetectionMasks(self,
+                                   image_id,
+                                   detection_masks,
+                                   detection_scores,
+                                   detection_classes):
+    """Adds the detection masks of a single image.
+
+    Args:
+      image_id: unique image identifier either of type integer or string.
+      detection_masks: uint8 numpy array of shape [num_detections,
+        image_height, image_width] containing detection_masks.
+      detection_scores: float numpy array of shape [num_detections] containing
+        scores for detection masks.
+      detection_classes: integer numpy array of shape [num_detections]
+        containing the classes for detection masks.
+
+    Raises:
+      ValueError: if the store holds boxes, or if detection_masks,
+        detection_scores and detection_classes do not have the right shapes.
+    """
+    if self._detection_type != 'segmentation':
+      raise ValueError('Cannot add masks to a store of detection boxes.')
+    _CheckDetectionMasks(detection_masks, detection_scores, detection_classes)
+    valid = self._ValidCategories(detection_classes)
+    records = np.zeros(np.count_nonzero(valid), dtype=self._dtype)
+    records['category_id'] = detection_classes[valid]
+    records['score'] = detection_scores[valid]
+    if len(records):
+      # Encodes all the masks of the image in a single call.
+      rles = mask.encode(np.asfortranarray(
+          np.transpose(detection_masks[valid], (1, 2, 0))))
+      records['size'] = [rle['size'] for rle in rles]
+      records['rle_length'] = [len(rle['counts']) for rle in rles]
+      records['rle_offset'] = len(self._rle_blob) + np.concatenate(
+          [[0], np.cumsum(records['rle_length'][:-1])])
+      for rle in rles:
+        self._rle_blob.extend(rle['counts'])
+    self._AddRecords(image_id, records)
+
+  def GetRecords(self):
+    """Returns the structured array of all the detections."""
+    return np.concatenate(
+        [np.zeros(0, dtype=self._dtype)] + self._chunks +
+        self._pending_records)
+
+  def GetImageIds(self):
+    """Returns the image ids, indexed by the `image_index` of the records."""
+    return list(self._image_ids)
+
+  def _Segmentation(self, record):
+    offset = record['rle_offset']
+    return {'size': [int(record['size'][0]), int(record['size'][1])],
+            'counts': bytes(self._rle_blob[offset:offset +
+                                           record['rle_length']])}
+
+  def ToList(self):
+    """Returns the detections in the COCO format, see the Export* functions.
+
+    Returns:
+      a list of detection annotations in the COCO format.
+    """
+    records = self.GetRecords()
+    image_ids = self._image_ids
+    categories = records['category_id'].tolist()
+    scores = records['score'].tolist()
+    if self._detection_type == 'bbox':
+      boxes = records['bbox'].astype(np.float64).tolist()
+      return [{'image_id': image_ids[image_index],
+               'category_id': category_id,
+               'bbox': box,
+               'score': score}
+              for image_index, category_id, box, score in zip(
+                  records['image_index'].tolist(), categories, boxes, scores)]
+    return [{'image_id': image_ids[record['image_index']],
+             'category_id': category_id,
+             'segmentation': self._Segmentation(record),
+             'score': score}
+            for record, category_id, score in zip(records, categories, scores)]
+
+  def WriteJson(self, fid, float_digits=4, chunk_size=1 << 16):
+    """Writes the detections to a json file in the COCO format.
+
+    The file is written a chunk of detections at a time, with one detection
+    per line, without building the dictionaries of all the detections.
+
+    Args:
+      fid: a file object opened for writing text.
+      float_digits: the number of digits of precision of the floats.
+      chunk_size: number of detections formatted at once.
+    """
+    float_format = '%.{}f'.format(float_digits)
+    if self._detection_type == 'bbox':
+      line_format = ('{"image_id": %s, "category_id": %d, "bbox": ['
+                     + ', '.join([float_format] * 4) +
+                     '], "score": ' + float_format + '}')
+    else:
+      line_format = ('{"image_id": %s, "category_id": %d, "segmentation": '
+                     '{"size": [%d, %d], "counts": %s}, "score": '
+                     + float_format + '}')
+    image_ids = [json.dumps(image_id) for image_id in self._image_ids]
+    records = self.GetRecords()
+    separator = '[\n'
+    for start in range(0, len(records), chunk_size):
+      chunk = records[start:start + chunk_size]
+      columns = [[image_ids[index] for index in chunk['image_index'].tolist()],
+                 chunk['category_id'].tolist()]
+      if self._detection_type == 'bbox':
+        columns.extend(chunk['bbox'].astype(np.float64).T.tolist())
+      else:
+        columns.extend(chunk['size'].T.tolist())
+        columns.append([
+            json.dumps(self._Segmentation(record)['counts'].decode('ascii'))
+            for record in chunk])
+      columns.append(chunk['score'].tolist())
+      fid.write(separator + ',\n'.join(
+          line_format % values for values in zip(*columns)))
+      separator = ',\n'
+    fid.write('[]' if separator == '[\n' else '\n]')
+
+  def SaveNpz(self, fid):
+    """Saves the detections in the numpy .npz format.
+
+    The file holds the `records` structured array, the `image_ids` array
+    indexed by the `image_index` field of the records and, for masks, the
+    `rle_blob` uint8 array holding the run-length encodings.
+
+    Args:
+      fid: a file object opened for writing bytes, or a path.
+    """
+    arrays = {'records': self.GetRecords(),
+              'image_ids': np.array(self._image_ids)}
+    if self._detection_type == 'segmentation':
+      arrays['rle_blob'] = np.frombuffer(bytes(self._rle_blob), dtype=np.uint8)
+    np.savez(fid, **arrays)
+
+
 def ExportDetectionsToCOCO(image_ids,
                            detection_boxes,
                            detection_scores,
@@ -848,3 +1134,580 @@ def ExportKeypointsToCOCO(image_ids,
     with tf.gfile.GFile(output_path, 'w') as fid:
       json_utils.Dump(keypoints_export_list, fid, float_digits=4, indent=2)
   return keypoints_export_list
+
+
+# Parameters of the COCO box evaluation, as set by cocoeval.Params.
+COCO_IOU_THRESHOLDS = np.linspace(.5, 0.95, 10, endpoint=True)
+COCO_RECALL_THRESHOLDS = np.linspace(.0, 1.00, 101, endpoint=True)
+COCO_AREA_RANGES = np.array([[0 ** 2, 1e5 ** 2], [0 ** 2, 32 ** 2],
+                             [32 ** 2, 96 ** 2], [96 ** 2, 1e5 ** 2]])
+COCO_MAX_DETECTIONS = [1, 10, 100]
+
+# (precision or recall, IOU threshold, area range index, max detections index)
+# of each statistic computed by cocoeval.COCOeval.summarize.
+_SUMMARY_STATS = [(True, None, 0, 2), (True, .5, 0, 2), (True, .75, 0, 2),
+                  (True, None, 1, 2), (True, None, 2, 2), (True, None, 3, 2),
+                  (False, None, 0, 0), (False, None, 0, 1),
+                  (False, None, 0, 2), (False, None, 1, 2),
+                  (False, None, 2, 2), (False, None, 3, 2)]
+
+
+def ConvertBoxesToCOCOFormat(boxes):
+  """Converts [N, 4] boxes in [ymin, xmin, ymax, xmax] format to COCO format.
+
+  This is the vectorized version of _ConvertBoxToCOCOFormat: the widths and
+  heights are computed in the dtype of `boxes`, so that the results are the
+  same as the ones of the exported annotations.
+
+  Args:
+    boxes: a [N, 4] numpy array.
+
+  Returns:
+    a [N, 4] float64 numpy array of [xmin, ymin, width, height] boxes.
+  """
+  return np.stack([boxes[:, 1], boxes[:, 0], boxes[:, 3] - boxes[:, 1],
+                   boxes[:, 2] - boxes[:, 0]], axis=1).astype(np.float64)
+
+
+def ComputeBoxIous(detection_boxes, groundtruth_boxes, groundtruth_is_crowd):
+  """Computes the IOUs between boxes as pycocotools.mask.iou does.
+
+  The intersection with a crowd groundtruth box is divided by the area of the
+  detection box instead of the area of the union. The arrays can have leading
+  batch dimensions to compute the IOUs of several groups of boxes at once.
+
+  Args:
+    detection_boxes: [..., num_detections, 4] array of boxes in COCO format.
+    groundtruth_boxes: [..., num_gt, 4] array of boxes in COCO format.
+    groundtruth_is_crowd: [..., num_gt] boolean array.
+
+  Returns:
+    a [..., num_detections, num_gt] float64 array of IOUs.
+  """
+  detection_boxes = detection_boxes[..., :, np.newaxis, :]
+  groundtruth_boxes = groundtruth_boxes[..., np.newaxis, :, :]
+  widths = (np.minimum(detection_boxes[..., 2] + detection_boxes[..., 0],
+                       groundtruth_boxes[..., 2] + groundtruth_boxes[..., 0]) -
+            np.maximum(detection_boxes[..., 0], groundtruth_boxes[..., 0]))
+  heights = (np.minimum(detection_boxes[..., 3] + detection_boxes[..., 1],
+                        groundtruth_boxes[..., 3] + groundtruth_boxes[..., 1]) -
+             np.maximum(detection_boxes[..., 1], groundtruth_boxes[..., 1]))
+  intersections = np.where((widths > 0) & (heights > 0), widths * heights, 0.)
+  detection_areas = detection_boxes[..., 2] * detection_boxes[..., 3]
+  groundtruth_areas = groundtruth_boxes[..., 2] * groundtruth_boxes[..., 3]
+  unions = np.where(groundtruth_is_crowd[..., np.newaxis, :], detection_areas,
+                    detection_areas + groundtruth_areas - intersections)
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return np.where(intersections > 0, intersections / unions, 0.)
+
+
+def MatchDetections(ious, groundtruth_ignore, groundtruth_is_crowd,
+                    num_detections=None):
+  """Greedily matches detections to groundtruth as COCOeval.evaluateImg does.
+
+  Detections are matched in order at all the IOU thresholds and area ranges at
+  once, and for a batch of groups of detections and groundtruth, e.g. one
+  group per image and category. A detection is matched to the available
+  groundtruth with the highest IOU above the threshold, preferring groundtruth
+  that is not ignored. Crowd groundtruth can be matched several times.
+  Padding groundtruth must be given negative IOUs, so that it is never
+  matched.
+
+  Args:
+    ious: [batch_size, max_num_detections, num_gt] array of IOUs, with the
+      detections sorted by decreasing score.
+    groundtruth_ignore: [batch_size, num_area_ranges, num_gt] boolean array,
+      True for the groundtruth ignored in an area range.
+    groundtruth_is_crowd: [batch_size, num_gt] boolean array.
+    num_detections: optional [batch_size] int array of the number of
+      detections of each group, the following ones being padding. All the
+      detections are matched by default.
+
+  Returns:
+    matched: [batch_size, num_area_ranges, num_iou_thresholds,
+      max_num_detections] boolean array, True for the matched detections.
+    matched_ignored: boolean array of the same shape, True for the detections
+      matched to ignored groundtruth.
+  """
+  batch_size, max_num_detections, num_groundtruth = ious.shape
+  num_area_ranges = groundtruth_ignore.shape[1]
+  shape = (batch_size, num_area_ranges, len(COCO_IOU_THRESHOLDS))
+  matched = np.zeros(shape + (max_num_detections,), dtype=bool)
+  matched_ignored = np.zeros(shape + (max_num_detections,), dtype=bool)
+  if not num_groundtruth:
+    return matched, matched_ignored
+  if num_detections is None:
+    num_detections = np.full(batch_size, max_num_detections)
+  # Groups are matched by decreasing number of detections, so that the groups
+  # with a detection of a given rank are a prefix of the batch.
+  order = np.argsort(-num_detections, kind='mergesort')
+  num_active_groups = np.searchsorted(-num_detections[order],
+                                      -np.arange(max_num_detections))
+  ious = ious[order]
+  groundtruth_ignore = groundtruth_ignore[order, :, np.newaxis, :]
+  groundtruth_not_crowd = ~groundtruth_is_crowd[order, np.newaxis, np.newaxis]
+  thresholds = np.minimum(COCO_IOU_THRESHOLDS, 1 - 1e-10)[:, np.newaxis]
+  groundtruth_range = np.arange(num_groundtruth)
+  available = np.ones(shape + (num_groundtruth,), dtype=bool)
+  for detection_index, num_active in enumerate(num_active_groups):
+    if not num_active:
+      break
+    group_available = available[:num_active]
+    detection_ious = ious[:num_active, np.newaxis, np.newaxis, detection_index]
+    candidates = group_available & (detection_ious >= thresholds)
+    regular_candidates = candidates & ~groundtruth_ignore[:num_active]
+    has_regular_match = regular_candidates.any(axis=-1)
+    candidates = np.where(has_regular_match[..., np.newaxis],
+                          regular_candidates, candidates)
+    found = candidates.any(axis=-1)
+    # Among the groundtruth with the highest IOU, the last one is matched.
+    candidate_ious = np.where(candidates, detection_ious, -1.)[..., ::-1]
+    best = num_groundtruth - 1 - np.argmax(candidate_ious, axis=-1)
+    matched[:num_active, ..., detection_index] = found
+    matched_ignored[:num_active, ..., detection_index] = (
+        found & ~has_regular_match)
+    group_available &= ~((groundtruth_range == best[..., np.newaxis]) &
+                         found[..., np.newaxis] &
+                         groundtruth_not_crowd[:num_active])
+  inverse_order = np.argsort(order)
+  return matched[inverse_order], matched_ignored[inverse_order]
+
+
+def _GroundtruthIgnore(groundtruth_boxes, groundtruth_is_crowd):
+  """Returns which groundtruth boxes are ignored in each COCO area range."""
+  # The areas are computed as in ExportSingleImageGroundtruthToCoco.
+  groundtruth_areas = ((groundtruth_boxes[:, 2] - groundtruth_boxes[:, 0]) *
+                       (groundtruth_boxes[:, 3] - groundtruth_boxes[:, 1]))
+  return (groundtruth_is_crowd |
+          (groundtruth_areas < COCO_AREA_RANGES[:, 0:1]) |
+          (groundtruth_areas > COCO_AREA_RANGES[:, 1:2]))
+
+
+def CountGroundtruth(num_categories,
+                     groundtruth_boxes,
+                     groundtruth_categories,
+                     groundtruth_is_crowd):
+  """Counts the groundtruth boxes that are not ignored in each area range.
+
+  Args:
+    num_categories: number of categories.
+    groundtruth_boxes: [num_gt, 4] array of [ymin, xmin, ymax, xmax] boxes.
+    groundtruth_categories: [num_gt] int array of category indices in
+      [0, num_categories).
+    groundtruth_is_crowd: [num_gt] boolean array.
+
+  Returns:
+    a [num_categories, num_area_ranges] int64 array.
+  """
+  groundtruth_ignore = _GroundtruthIgnore(groundtruth_boxes,
+                                          groundtruth_is_crowd)
+  return np.stack(
+      [np.bincount(groundtruth_categories[~area_ignore],
+                   minlength=num_categories)
+       for area_ignore in groundtruth_ignore], axis=1).astype(np.int64)
+
+
+def MatchSingleImageDetections(num_categories,
+                               groundtruth_boxes,
+                               groundtruth_categories,
+                               groundtruth_is_crowd,
+                               detection_boxes,
+                               detection_scores,
+                               detection_categories):
+  """Runs the per image step of the COCO box evaluation on a single image.
+
+  The results are the ones of COCOeval.evaluateImg for all the categories and
+  area ranges, in a columnar form that can be accumulated with
+  AccumulateMatches.
+
+  Args:
+    num_categories: number of categories.
+    groundtruth_boxes: [num_gt, 4] array of [ymin, xmin, ymax, xmax] boxes.
+    groundtruth_categories: [num_gt] int array of category indices in
+      [0, num_categories).
+    groundtruth_is_crowd: [num_gt] boolean array.
+    detection_boxes: [num_detections, 4] array of [ymin, xmin, ymax, xmax]
+      boxes.
+    detection_scores: [num_detections] array of scores.
+    detection_categories: [num_detections] int array of category indices in
+      [0, num_categories).
+
+  Returns:
+    detection_indices: [num_kept] int array of the indices of the detections
+      kept, i.e. the `max(COCO_MAX_DETECTIONS)` highest scoring detections of
+      each category, grouped by category and sorted by decreasing score.
+    detection_ranks: [num_kept] int array of the rank of these detections
+      among the detections of the image with the same category.
+    matched: [num_kept, num_area_ranges, num_iou_thresholds] boolean array,
+      True for the detections matched to a groundtruth box.
+    ignored: boolean array of the same shape, True for the detections that are
+      ignored.
+  """
+  groundtruth_ignore = _GroundtruthIgnore(groundtruth_boxes,
+                                          groundtruth_is_crowd)
+  groundtruth_boxes = ConvertBoxesToCOCOFormat(groundtruth_boxes)
+  detection_boxes = ConvertBoxesToCOCOFormat(detection_boxes)
+  detection_areas = detection_boxes[:, 2] * detection_boxes[:, 3]
+  detection_outside = ((detection_areas < COCO_AREA_RANGES[:, 0:1]) |
+                       (detection_areas > COCO_AREA_RANGES[:, 1:2]))
+
+  detection_indices = []
+  detection_ranks = []
+  matched = []
+  ignored = []
+  # Stable sorts keep the pycocotools order of the tied detections.
+  detection_order = np.argsort(-np.asarray(detection_scores, np.float64),
+                               kind='mergesort')
+  detection_order = detection_order[
+      np.argsort(detection_categories[detection_order], kind='mergesort')]
+  category_starts = np.searchsorted(
+      detection_categories[detection_order], np.arange(num_categories + 1))
+  for category in np.unique(detection_categories):
+    indices = detection_order[category_starts[category]:
+                              category_starts[category + 1]]
+    indices = indices[:COCO_MAX_DETECTIONS[-1]]
+    groundtruth_indices = np.flatnonzero(groundtruth_categories == category)
+    ious = ComputeBoxIous(detection_boxes[indices],
+                          groundtruth_boxes[groundtruth_indices],
+                          groundtruth_is_crowd[groundtruth_indices])
+    category_matched, category_ignored = MatchDetections(
+        ious[np.newaxis],
+        groundtruth_ignore[np.newaxis, :, groundtruth_indices],
+        groundtruth_is_crowd[np.newaxis, groundtruth_indices])
+    category_matched = category_matched[0]
+    category_ignored = category_ignored[0]
+    # Unmatched detections outside of an area range are ignored in it.
+    category_ignored |= (~category_matched &
+                         detection_outside[:, np.newaxis, indices])
+    detection_indices.append(indices)
+    detection_ranks.append(np.arange(len(indices)))
+    matched.append(category_matched.transpose(2, 0, 1))
+    ignored.append(category_ignored.transpose(2, 0, 1))
+  if not detection_indices:
+    shape = (0, len(COCO_AREA_RANGES), len(COCO_IOU_THRESHOLDS))
+    return (np.zeros(0, np.int64), np.zeros(0, np.int64),
+            np.zeros(shape, bool), np.zeros(shape, bool))
+  return (np.concatenate(detection_indices),
+          np.concatenate(detection_ranks), np.concatenate(matched),
+          np.concatenate(ignored))
+
+
+def AccumulateMatches(num_groundtruth,
+                      detection_categories,
+                      detection_scores,
+                      detection_image_ranks,
+                      detection_ranks,
+                      matched,
+                      ignored):
+  """Computes the precision and recall curves as COCOeval.accumulate does.
+
+  Args:
+    num_groundtruth: [num_categories, num_area_ranges] int array of the number
+      of groundtruth boxes that are not ignored, over all the images.
+    detection_categories: [N] int array of the category index of each kept
+      detection, over all the images.
+    detection_scores: [N] array of the scores of the detections.
+    detection_image_ranks: [N] int array of the rank of the image of each
+      detection when the image ids are sorted. Ties between scores are broken
+      by image and then by detection rank, as in pycocotools.
+    detection_ranks: [N] int array of the rank of each detection among the
+      detections of its image with the same category, by decreasing score.
+    matched: [N, num_area_ranges, num_iou_thresholds] boolean array, see
+      MatchSingleImageDetections.
+    ignored: boolean array of the same shape, see MatchSingleImageDetections.
+
+  Returns:
+    precision: [num_iou_thresholds, num_recall_thresholds, num_categories,
+      num_area_ranges, num_max_detections] array, -1 where there is no
+      groundtruth.
+    recall: [num_iou_thresholds, num_categories, num_area_ranges,
+      num_max_detections] array, -1 where there is no groundtruth.
+  """
+  num_categories, num_area_ranges = num_groundtruth.shape
+  num_thresholds = len(COCO_IOU_THRESHOLDS)
+  precision = -np.ones((num_thresholds, len(COCO_RECALL_THRESHOLDS),
+                        num_categories, num_area_ranges,
+                        len(COCO_MAX_DETECTIONS)))
+  recall = -np.ones((num_thresholds, num_categories, num_area_ranges,
+                     len(COCO_MAX_DETECTIONS)))
+  order = np.lexsort((detection_ranks, detection_image_ranks,
+                      -np.asarray(detection_scores, np.float64),
+                      detection_categories))
+  category_starts = np.searchsorted(detection_categories[order],
+                                    np.arange(num_categories + 1))
+  for category in range(num_categories):
+    if not num_groundtruth[category].any():
+      continue
+    category_order = order[category_starts[category]:
+                           category_starts[category + 1]]
+    for max_index, max_detections in enumerate(COCO_MAX_DETECTIONS):
+      kept = category_order[detection_ranks[category_order] < max_detections]
+      num_detections = len(kept)
+      true_positives = np.cumsum(matched[kept] & ~ignored[kept], axis=0,
+                                 dtype=np.float64)
+      false_positives = np.cumsum(~matched[kept] & ~ignored[kept], axis=0,
+                                  dtype=np.float64)
+      for area_index in range(num_area_ranges):
+        if not num_groundtruth[category, area_index]:
+          continue
+        tp = true_positives[:, area_index].T
+        fp = false_positives[:, area_index].T
+        recalls = tp / num_groundtruth[category, area_index]
+        precisions = tp / (fp + tp + np.spacing(1))
+        recall[:, category, area_index, max_index] = (
+            recalls[:, -1] if num_detections else 0)
+        # Makes the precision monotonically decreasing.
+        precisions = np.maximum.accumulate(precisions[:, ::-1], axis=1)[:, ::-1]
+        for threshold_index in range(num_thresholds):
+          indices = np.searchsorted(recalls[threshold_index],
+                                    COCO_RECALL_THRESHOLDS, side='left')
+          reached = indices < num_detections
+          precision[threshold_index, reached, category, area_index,
+                    max_index] = precisions[threshold_index, indices[reached]]
+          precision[threshold_index, ~reached, category, area_index,
+                    max_index] = 0
+  return precision, recall
+
+
+def SummarizeMatches(precision, recall):
+  """Computes the summary statistics as COCOeval.summarize does.
+
+  Args:
+    precision: precision array returned by AccumulateMatches.
+    recall: recall array returned by AccumulateMatches.
+
+  Returns:
+    stats: [12] array of the summary statistics, see MetricsFromStats.
+    category_stats: [12, num_categories] array of the same statistics for each
+      category.
+  """
+  def _Mean(values):
+    values = values[values > -1]
+    return np.mean(values) if values.size else -1
+
+  num_categories = precision.shape[2]
+  stats = np.zeros((len(_SUMMARY_STATS),))
+  category_stats = np.zeros((len(_SUMMARY_STATS), num_categories))
+  for stat_index, (is_precision, iou_threshold, area_index,
+                   max_index) in enumerate(_SUMMARY_STATS):
+    values = precision if is_precision else recall
+    if iou_threshold is not None:
+      values = values[np.where(iou_threshold == COCO_IOU_THRESHOLDS)[0]]
+    values = values[..., area_index, max_index]
+    stats[stat_index] = _Mean(values)
+    for category in range(num_categories):
+      category_stats[stat_index, category] = _Mean(values[..., category])
+  return stats, category_stats
+
+
+class COCONumpyEvalWrapper(COCOEvalWrapper):
+  """COCOEvalWrapper computing the box metrics with vectorized numpy code.
+
+  The evaluate, accumulate and summarize steps of cocoeval.COCOeval are
+  replaced by vectorized versions giving the same metrics. The detections and
+  groundtruth of each (image, category) group are padded into batches of
+  groups of similar sizes, whose IOUs are computed at once and whose
+  detections are greedily matched at all the IOU thresholds and area ranges
+  at once. Only the `bbox` IOU type with the default parameters is supported.
+
+  Usage is the same as COCOEvalWrapper:
+
+    evaluator = coco_tools.COCONumpyEvalWrapper(groundtruth, detections)
+    metrics = evaluator.ComputeMetrics()
+  """
+
+  def __init__(self, groundtruth=None, detections=None, agnostic_mode=False,
+               iou_type='bbox', max_batch_size=1 << 22):
+    """COCONumpyEvalWrapper constructor.
+
+    Args:
+      groundtruth: a coco.COCO (or coco_tools.COCOWrapper) object holding
+        groundtruth annotations
+      detections: a coco.COCO (or coco_tools.COCOWrapper) object holding
+        detections
+      agnostic_mode: boolean (default: False).  If True, evaluation ignores
+        class labels, treating all detections as proposals.
+      iou_type: IOU type to use for evaluation. Only `bbox` is supported.
+      max_batch_size: maximum number of IOUs computed in a batch of groups of
+        detections and groundtruth boxes, at most 100 detections times the
+        number of groundtruth boxes per group.
+
+    Raises:
+      ValueError: if iou_type is not `bbox`.
+    """
+    if iou_type != 'bbox':
+      raise ValueError('Unsupported iou type for numpy evaluation: {}'.format(
+          iou_type))
+    super(COCONumpyEvalWrapper, self).__init__(
+        groundtruth, detections, agnostic_mode=agnostic_mode,
+        iou_type=iou_type)
+    self._max_batch_size = max_batch_size
+    self._num_groundtruth = None
+    self._matches = None
+
+  def _LoadAnnotations(self, coco_data, image_indices, category_indices):
+    """Loads the annotations to evaluate into numpy arrays.
+
+    Args:
+      coco_data: a coco.COCO object.
+      image_indices: dictionary mapping the image ids to evaluate to their
+        index.
+      category_indices: dictionary mapping the category ids to evaluate to
+        their index.
+
+    Returns:
+      group_indices: [N] int array of the (image, category) group index of
+        each annotation.
+      boxes: [N, 4] float64 array of boxes in COCO format.
+      areas: [N] float64 array of annotation areas.
+      annotations: the list of the N annotations.
+    """
+    params = self.params
+    if params.useCats:
+      annotations = coco_data.loadAnns(coco_data.getAnnIds(
+          imgIds=params.imgIds, catIds=params.catIds))
+      category_index = [category_indices[ann['category_id']]
+                        for ann in annotations]
+    else:
+      # As in COCOeval.evaluateImg, the annotations of an image are ordered by
+      # category.
+      annotations = [
+          ann for ann in coco_data.loadAnns(coco_data.getAnnIds(
+              imgIds=params.imgIds))
+          if ann['category_id'] in category_indices]
+      annotations.sort(key=lambda ann: category_indices[ann['category_id']])
+      category_index = 0
+    num_categories = len(category_indices) if params.useCats else 1
+    group_indices = (np.array([image_indices[ann['image_id']]
+                               for ann in annotations], dtype=np.int64) *
+                     num_categories + np.array(category_index, np.int64))
+    boxes = np.array([ann['bbox'] for ann in annotations],
+                     dtype=np.float64).reshape(-1, 4)
+    areas = np.array([ann['area'] for ann in annotations], dtype=np.float64)
+    return group_indices, boxes, areas, annotations
+
+  def evaluate(self):
+    """Matches the detections of each image and category to groundtruth."""
+    tic = time.time()
+    params = self.params
+    params.imgIds = list(np.unique(params.imgIds))
+    if params.useCats:
+      params.catIds = list(np.unique(params.catIds))
+    params.maxDets = sorted(params.maxDets)
+    if (params.maxDets != COCO_MAX_DETECTIONS or
+        not np.array_equal(params.areaRng, COCO_AREA_RANGES) or
+        not np.array_equal(params.iouThrs, COCO_IOU_THRESHOLDS) or
+        not np.array_equal(params.recThrs, COCO_RECALL_THRESHOLDS)):
+      raise ValueError('Only the default COCO box evaluation parameters are '
+                       'supported.')
+    image_indices = {image_id: index
+                     for index, image_id in enumerate(params.imgIds)}
+    category_indices = {category_id: index
+                        for index, category_id in enumerate(params.catIds)}
+    num_categories = len(params.catIds) if params.useCats else 1
+
+    (groundtruth_groups, groundtruth_boxes, groundtruth_areas,
+     groundtruth_annotations) = self._LoadAnnotations(
+         self.cocoGt, image_indices, category_indices)
+    groundtruth_is_crowd = np.array(
+        [bool(ann.get('iscrowd', 0)) for ann in groundtruth_annotations],
+        dtype=bool)
+    groundtruth_ignore = (
+        groundtruth_is_crowd |
+        (groundtruth_areas < COCO_AREA_RANGES[:, 0:1]) |
+        (groundtruth_areas > COCO_AREA_RANGES[:, 1:2]))
+    self._num_groundtruth = np.stack(
+        [np.bincount(groundtruth_groups[~area_ignore] % num_categories,
+                     minlength=num_categories)
+         for area_ignore in groundtruth_ignore], axis=1).astype(np.int64)
+
+    (detection_groups, detection_boxes, detection_areas,
+     detection_annotations) = self._LoadAnnotations(
+         self.cocoDt, image_indices, category_indices)
+    detection_scores = np.array([ann['score'] for ann in detection_annotations],
+                                dtype=np.float64)
+    # Sorts the detections by group and decreasing score, keeping the order of
+    # the tied detections, and keeps the highest scoring ones of each group.
+    order = np.lexsort((-detection_scores, detection_groups))
+    groups, starts, counts = np.unique(
+        detection_groups[order], return_index=True, return_counts=True)
+    ranks = np.arange(len(order)) - np.repeat(starts, counts)
+    order = order[ranks < COCO_MAX_DETECTIONS[-1]]
+    ranks = ranks[ranks < COCO_MAX_DETECTIONS[-1]]
+    counts = np.minimum(counts, COCO_MAX_DETECTIONS[-1])
+    starts = np.cumsum(counts) - counts
+
+    groundtruth_order = np.argsort(groundtruth_groups, kind='mergesort')
+    groundtruth_starts = np.searchsorted(groundtruth_groups[groundtruth_order],
+                                         groups)
+    groundtruth_counts = np.searchsorted(
+        groundtruth_groups[groundtruth_order], groups,
+        side='right') - groundtruth_starts
+
+    num_area_ranges = len(COCO_AREA_RANGES)
+    num_thresholds = len(COCO_IOU_THRESHOLDS)
+    matched = np.zeros((len(order), num_area_ranges, num_thresholds), bool)
+    ignored = np.zeros((len(order), num_area_ranges, num_thresholds), bool)
+    # Batches the groups with the same number of groundtruth boxes, so that
+    # only the detections are padded.
+    batch_order = np.argsort(groundtruth_counts, kind='mergesort')
+    batch_num_groundtruth, batch_starts = np.unique(
+        groundtruth_counts[batch_order], return_index=True)
+    batch_ends = np.append(batch_starts[1:], len(batch_order))
+    for num_groundtruth, start, end in zip(batch_num_groundtruth, batch_starts,
+                                           batch_ends):
+      batch_size = max(1, self._max_batch_size // (
+          max(num_groundtruth, 1) * COCO_MAX_DETECTIONS[-1]))
+      for batch_start in range(start, end, batch_size):
+        batch = batch_order[batch_start:min(batch_start + batch_size, end)]
+        num_detections = counts[batch].max()
+        detection_indices = (starts[batch, np.newaxis] +
+                             np.arange(num_detections))
+        detection_valid = (np.arange(num_detections) <
+                           counts[batch, np.newaxis])
+        detection_indices = np.where(detection_valid, detection_indices, 0)
+        batch_detections = order[detection_indices]
+        batch_groundtruth = groundtruth_order[
+            groundtruth_starts[batch, np.newaxis] +
+            np.arange(num_groundtruth)]
+
+        ious = ComputeBoxIous(detection_boxes[batch_detections],
+                              groundtruth_boxes[batch_groundtruth],
+                              groundtruth_is_crowd[batch_groundtruth])
+        batch_matched, batch_ignored = MatchDetections(
+            ious, groundtruth_ignore[:, batch_groundtruth].transpose(1, 0, 2),
+            groundtruth_is_crowd[batch_groundtruth], counts[batch])
+        # Unmatched detections outside of an area range are ignored in it.
+        batch_areas = detection_areas[batch_detections][:, np.newaxis, :]
+        detection_outside = ((batch_areas < COCO_AREA_RANGES[:, 0:1]) |
+                             (batch_areas > COCO_AREA_RANGES[:, 1:2]))
+        batch_ignored |= (~batch_matched &
+                          detection_outside[:, :, np.newaxis, :])
+        detection_indices = detection_indices[detection_valid]
+        matched[detection_indices] = batch_matched.transpose(
+            0, 3, 1, 2)[detection_valid]
+        ignored[detection_indices] = batch_ignored.transpose(
+            0, 3, 1, 2)[detection_valid]
+
+    self._matches = (detection_groups[order] % num_categories,
+                     detection_scores[order],
+                     detection_groups[order] // num_categories,
+                     ranks, matched, ignored)
+    tf.logging.info('Matched %d detections in %0.2fs', len(order),
+                    time.time() - tic)
+
+  def accumulate(self, p=None):
+    """Computes the precision and recall curves of the matched detections."""
+    precision, recall = AccumulateMatches(self._num_groundtruth,
+                                          *self._matches)
+    self.eval = {
+        'params': self.params,
+        'counts': list(precision.shape),
+        'precision': precision,
+        'recall': recall,
+    }
+
+  def summarize(self):
+    """Computes the summary statistics, overall and for each category."""
+    self.stats, self.category_stats = SummarizeMatches(
+        self.eval['precision'], self.eval['recall'])
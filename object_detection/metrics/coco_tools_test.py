@@ -13,6 +13,7 @@
 # limitations under the License.
 # ==============================================================================
 """Tests for tensorflow_model.object_detection.metrics.coco_tools."""
+import io
 import json
 import os
 import re
@@ -78,6 +79,66 @@ class CocoToolsTest(tf.test.TestCase):
     summary_metrics, _ = evaluator.ComputeMetrics()
     self.assertAlmostEqual(1.0, summary_metrics['Precision/mAP'])
 
+  def testCocoNumpyEvalWrapperMatchesCocoEvalWrapper(self):
+    random_state = np.random.RandomState(0)
+    groundtruth_dict = dict(self._groundtruth_dict)
+    groundtruth_dict['annotations'] = []
+    detections_list = []
+    for image in self._groundtruth_dict['images']:
+      for _ in range(10):
+        box = random_state.uniform(10, 100, size=4).tolist()
+        category_id = int(random_state.randint(0, 3))
+        groundtruth_dict['annotations'].append({
+            'id': len(groundtruth_dict['annotations']) + 1,
+            'image_id': image['id'],
+            'category_id': category_id,
+            'bbox': box,
+            'area': box[2] * box[3],
+            'iscrowd': int(random_state.rand() < .1)
+        })
+        for _ in range(5):
+          detections_list.append({
+              'image_id': image['id'],
+              'category_id': (category_id if random_state.rand() < .8 else
+                              int(random_state.randint(0, 3))),
+              'bbox': (np.array(box) +
+                       random_state.normal(0, 5, size=4)).tolist(),
+              'score': round(random_state.rand(), 1)
+          })
+    for agnostic_mode in [False, True]:
+      groundtruth = coco_tools.COCOWrapper(groundtruth_dict)
+      detections = groundtruth.LoadAnnotations(
+          [dict(detection) for detection in detections_list])
+      expected_metrics, _ = coco_tools.COCOEvalWrapper(
+          groundtruth, detections,
+          agnostic_mode=agnostic_mode).ComputeMetrics()
+      detections = groundtruth.LoadAnnotations(
+          [dict(detection) for detection in detections_list])
+      metrics, _ = coco_tools.COCONumpyEvalWrapper(
+          groundtruth, detections, agnostic_mode=agnostic_mode,
+          max_batch_size=1000).ComputeMetrics()
+      self.assertEqual(list(expected_metrics), list(metrics))
+      for key, value in expected_metrics.items():
+        self.assertAlmostEqual(value, metrics[key], msg=key)
+
+  def testCocoNumpyEvalWrapperPerCategory(self):
+    groundtruth = coco_tools.COCOWrapper(self._groundtruth_dict)
+    detections = groundtruth.LoadAnnotations(self._detections_list)
+    evaluator = coco_tools.COCONumpyEvalWrapper(groundtruth, detections)
+    summary_metrics, per_category_ap = evaluator.ComputeMetrics(
+        include_metrics_per_category=True)
+    self.assertAlmostEqual(1.0, summary_metrics['Precision/mAP'])
+    self.assertAlmostEqual(1.0,
+                           per_category_ap['PerformanceByCategory/mAP/cat'])
+    self.assertAlmostEqual(-1.0,
+                           per_category_ap['PerformanceByCategory/mAP/dog'])
+
+  def testCocoNumpyEvalWrapperRejectsSegmentation(self):
+    groundtruth = coco_tools.COCOWrapper(self._groundtruth_dict)
+    detections = groundtruth.LoadAnnotations(self._detections_list)
+    with self.assertRaises(ValueError):
+      coco_tools.COCONumpyEvalWrapper(groundtruth, detections, iou_type='segm')
+
   def testExportGroundtruthToCOCO(self):
     image_ids = ['first', 'second']
     groundtruth_boxes = [np.array([[100, 100, 200, 200]], np.float),
@@ -96,9 +157,10 @@ class CocoToolsTest(tf.test.TestCase):
     self.assertDictEqual(result, self._groundtruth_dict)
     with tf.gfile.GFile(output_path, 'r') as f:
       written_result = f.read()
-      # The json output should have floats written to 4 digits of precision.
-      matcher = re.compile(r'"bbox":\s+\[\n\s+\d+.\d\d\d\d,', re.MULTILINE)
+      # The json output should have floats rounded to 4 digits of precision.
+      matcher = re.compile(r'"bbox":\s+\[\n\s+\d+.\d{1,4},', re.MULTILINE)
       self.assertTrue(matcher.findall(written_result))
+      self.assertFalse(re.findall(r'\d\.\d{5}', written_result))
       written_result = json.loads(written_result)
       self.assertAlmostEqual(result, written_result)
 
@@ -122,9 +184,10 @@ class CocoToolsTest(tf.test.TestCase):
     self.assertListEqual(result, self._detections_list)
     with tf.gfile.GFile(output_path, 'r') as f:
       written_result = f.read()
-      # The json output should have floats written to 4 digits of precision.
-      matcher = re.compile(r'"bbox":\s+\[\n\s+\d+.\d\d\d\d,', re.MULTILINE)
+      # The json output should have floats rounded to 4 digits of precision.
+      matcher = re.compile(r'"bbox":\s+\[\n\s+\d+.\d{1,4},', re.MULTILINE)
       self.assertTrue(matcher.findall(written_result))
+      self.assertFalse(re.findall(r'\d\.\d{5}', written_result))
       written_result = json.loads(written_result)
       self.assertAlmostEqual(result, written_result)
 
@@ -236,6 +299,110 @@ class CocoToolsTest(tf.test.TestCase):
       self.assertEqual(mask_annotation['category_id'], classes[i])
       self.assertAlmostEqual(mask_annotation['score'], scores[i])
 
+  def testDetectionStoreBoxes(self):
+    boxes = np.array([[0, 0, 1, 1],
+                      [0, 0, .5, .5],
+                      [.5, .5, 1, 1]], dtype=np.float32)
+    classes = np.array([1, 2, 4], dtype=np.int32)
+    scores = np.array([0.8, 0.2, 0.7], dtype=np.float32)
+    store = coco_tools.DetectionStore(set([1, 2, 3]))
+    store.AddSingleImageDetectionBoxes('first_image', boxes, scores, classes)
+    store.AddSingleImageDetectionBoxes(2, boxes[::-1], scores, classes[::-1])
+    store.AddSingleImageDetectionBoxes('empty_image', boxes[:0], scores[:0],
+                                       classes[:0])
+    expected = []
+    for image_id, image_boxes, image_classes in [
+        ('first_image', boxes, classes), (2, boxes[::-1], classes[::-1])]:
+      expected.extend(coco_tools.ExportSingleImageDetectionBoxesToCoco(
+          image_id=image_id,
+          category_id_set=set([1, 2, 3]),
+          detection_boxes=image_boxes,
+          detection_classes=image_classes,
+          detection_scores=scores))
+    self.assertEqual(len(store), 4)
+    self.assertEqual(store.ToList(), expected)
+    self.assertEqual(store.GetImageIds(), ['first_image', 2, 'empty_image'])
+
+    fid = io.StringIO()
+    store.WriteJson(fid)
+    written_result = fid.getvalue()
+    # The json output should have floats written to 4 digits of precision.
+    self.assertTrue(re.findall(r'"bbox": \[\d+.\d\d\d\d,', written_result))
+    written_result = json.loads(written_result)
+    self.assertEqual(len(written_result), len(expected))
+    for written, annotation in zip(written_result, expected):
+      self.assertEqual(written['image_id'], annotation['image_id'])
+      self.assertEqual(written['category_id'], annotation['category_id'])
+      self.assertAllClose(written['bbox'], annotation['bbox'], atol=1e-4)
+      self.assertAlmostEqual(written['score'], annotation['score'], places=4)
+
+    fid = io.BytesIO()
+    store.SaveNpz(fid)
+    fid.seek(0)
+    saved = np.load(fid)
+    self.assertEqual(saved['records'].tobytes(), store.GetRecords().tobytes())
+    self.assertEqual(saved['image_ids'].tolist(),
+                     ['first_image', '2', 'empty_image'])
+
+  def testDetectionStoreKeepsImageOrderAcrossChunks(self):
+    store = coco_tools.DetectionStore(set([1, 2]))
+    num_images = 2500
+    for image_index in range(num_images):
+      num_detections = image_index % 3
+      store.AddSingleImageDetectionBoxes(
+          image_index, np.zeros((num_detections, 4), np.float32),
+          np.full(num_detections, image_index, np.float32),
+          np.ones(num_detections, np.int32))
+    records = store.GetRecords()
+    expected_image_indices = np.repeat(np.arange(num_images),
+                                       np.arange(num_images) % 3)
+    self.assertEqual(len(store), len(expected_image_indices))
+    self.assertAllEqual(records['image_index'], expected_image_indices)
+    self.assertAllEqual(records['score'], expected_image_indices)
+    self.assertEqual(store.GetImageIds(), list(range(num_images)))
+
+  def testDetectionStoreEmptyJson(self):
+    fid = io.StringIO()
+    coco_tools.DetectionStore(set([1])).WriteJson(fid)
+    self.assertEqual(json.loads(fid.getvalue()), [])
+
+  def testDetectionStoreMasks(self):
+    masks = np.array(
+        [[[1, 1,], [1, 1]],
+         [[0, 0], [0, 1]],
+         [[0, 0], [0, 0]]], dtype=np.uint8)
+    classes = np.array([1, 2, 3], dtype=np.int32)
+    scores = np.array([0.8, 0.2, 0.7], dtype=np.float32)
+    store = coco_tools.DetectionStore(set([1, 3]),
+                                      detection_type='segmentation')
+    store.AddSingleImageDetectionMasks('first_image', masks, scores, classes)
+    store.AddSingleImageDetectionMasks('second_image', masks[1:], scores[1:],
+                                       classes[1:])
+    expected = []
+    for image_id, start in [('first_image', 0), ('second_image', 1)]:
+      expected.extend(coco_tools.ExportSingleImageDetectionMasksToCoco(
+          image_id=image_id,
+          category_id_set=set([1, 3]),
+          detection_classes=classes[start:],
+          detection_scores=scores[start:],
+          detection_masks=masks[start:]))
+    self.assertEqual(store.ToList(), expected)
+    with self.assertRaises(ValueError):
+      store.AddSingleImageDetectionBoxes(
+          'third_image', np.zeros((1, 4), np.float32), scores[:1],
+          classes[:1])
+
+    fid = io.StringIO()
+    store.WriteJson(fid)
+    written_result = json.loads(fid.getvalue())
+    self.assertEqual(len(written_result), len(expected))
+    for written, annotation in zip(written_result, expected):
+      self.assertEqual(written['image_id'], annotation['image_id'])
+      self.assertEqual(written['category_id'], annotation['category_id'])
+      self.assertTrue(np.all(np.equal(
+          mask.decode(written['segmentation']),
+          mask.decode(annotation['segmentation']))))
+
   def testSingleImageGroundtruthExport(self):
     masks = np.array(
         [[[1, 1,], [1, 1]],
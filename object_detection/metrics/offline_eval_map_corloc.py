@@ -29,11 +29,20 @@ Example usage:
     ./compute_metrics \
         --eval_dir=path/to/eval_dir \
         --eval_config_path=path/to/evaluation/configuration/file \
-        --input_config_path=path/to/input/configuration/file
+        --input_config_path=path/to/input/configuration/file \
+        --num_workers=8
+
+With --num_workers > 1 the input shards are read and parsed by worker
+processes, each worker handling one shard at a time, while the main process
+feeds the parsed records to all the evaluators of the metrics set.
 """
 import csv
+import multiprocessing
 import os
 import re
+import time
+import traceback
+from six.moves import queue
 import tensorflow as tf
 
 from object_detection.core import standard_fields
@@ -50,6 +59,9 @@ flags.DEFINE_string('eval_config_path', None,
                     'Path to an eval_pb2.EvalConfig config file.')
 flags.DEFINE_string('input_config_path', None,
                     'Path to an eval_pb2.InputConfig config file.')
+flags.DEFINE_integer('num_workers', 1,
+                     'Number of processes reading and parsing the input '
+                     'shards, 0 for the number of CPUs.')
 
 FLAGS = flags.FLAGS
 
@@ -73,7 +85,134 @@ def _generate_filenames(filenames):
   return result
 
 
-def read_data_and_evaluate(input_config, eval_config):
+def _parse_records(input_path):
+  """Reads and parses the tf.Examples of a TFRecord file.
+
+  Args:
+    input_path: path to the TFRecord file.
+
+  Yields:
+    the decoded dictionary of each record, None for the records that could not
+    be parsed.
+  """
+  data_parser = tf_example_parser.TfExampleDetectionAndGTParser()
+  for string_record in tf.python_io.tf_record_iterator(path=input_path):
+    example = tf.train.Example()
+    example.ParseFromString(string_record)
+    yield data_parser.parse(example)
+
+
+def _parse_shard(input_path, output_queue, batch_size):
+  """Parses a shard in a worker process and sends the records in batches.
+
+  Args:
+    input_path: path to the TFRecord shard.
+    output_queue: multiprocessing queue receiving lists of decoded records, then
+      None once the shard is read or the error string if it fails.
+    batch_size: number of records sent at once.
+  """
+  try:
+    batch = []
+    for decoded_dict in _parse_records(input_path):
+      batch.append(decoded_dict)
+      if len(batch) == batch_size:
+        output_queue.put(batch)
+        batch = []
+    if batch:
+      output_queue.put(batch)
+    output_queue.put(None)
+  except Exception:  # pylint: disable=broad-except
+    output_queue.put(traceback.format_exc())
+
+
+def _get_batch(input_path, process, output_queue, poll_seconds):
+  """Waits for the next batch of a worker, checking that it is still alive.
+
+  Raises:
+    RuntimeError: if the worker exited without sending all its batches.
+  """
+  while True:
+    try:
+      return output_queue.get(timeout=poll_seconds)
+    except queue.Empty:
+      if not process.is_alive():
+        raise RuntimeError(
+            'The worker parsing {} exited with code {} before sending all its '
+            'records'.format(input_path, process.exitcode))
+
+
+def _parse_shards_in_parallel(input_paths, num_workers, batch_size=64,
+                              max_pending_batches=16, poll_seconds=1.):
+  """Parses TFRecord shards in worker processes, one process per shard.
+
+  At most num_workers shards are read at once and every worker sends at most
+  max_pending_batches batches ahead of the main process, which bounds the
+  memory used. The records are yielded in the order of the files.
+
+  Args:
+    input_paths: paths to the TFRecord shards.
+    num_workers: number of shards read at once.
+    batch_size: number of records sent at once by a worker.
+    max_pending_batches: maximum number of batches waiting in the queue of a
+      worker.
+    poll_seconds: interval at which a worker is checked to be alive while
+      waiting for its next batch.
+
+  Yields:
+    (input_path, decoded_dict) for each record, decoded_dict being None for
+    the records that could not be parsed.
+
+  Raises:
+    RuntimeError: if a worker fails to parse its shard or dies.
+  """
+  workers = []
+
+  def start_worker(input_path):
+    output_queue = multiprocessing.Queue(max_pending_batches)
+    process = multiprocessing.Process(
+        target=_parse_shard, args=(input_path, output_queue, batch_size))
+    process.daemon = True
+    process.start()
+    workers.append((input_path, process, output_queue))
+
+  pending_paths = list(input_paths)
+  try:
+    while pending_paths and len(workers) < num_workers:
+      start_worker(pending_paths.pop(0))
+    while workers:
+      input_path, process, output_queue = workers[0]
+      tf.logging.info('Processing file: {0}'.format(input_path))
+      while True:
+        batch = _get_batch(input_path, process, output_queue, poll_seconds)
+        if batch is None:
+          break
+        if not isinstance(batch, list):
+          raise RuntimeError(
+              'Failed to parse {}:\n{}'.format(input_path, batch))
+        for decoded_dict in batch:
+          yield input_path, decoded_dict
+      process.join()
+      workers.pop(0)
+      if pending_paths:
+        start_worker(pending_paths.pop(0))
+  finally:
+    for _, process, _ in workers:
+      process.terminate()
+
+
+def _iterate_records(input_paths, num_workers):
+  """Yields (input_path, decoded_dict) for all the records of the files."""
+  if num_workers == 1:
+    for input_path in input_paths:
+      tf.logging.info('Processing file: {0}'.format(input_path))
+      for decoded_dict in _parse_records(input_path):
+        yield input_path, decoded_dict
+  else:
+    for record in _parse_shards_in_parallel(input_paths, num_workers):
+      yield record
+
+
+def read_data_and_evaluate(input_config, eval_config, num_workers=1):
   """Reads pre-computed object detections and groundtruth from tf_record.
 
   Args:
@@ -81,12 +220,15 @@ def read_data_and_evaluate(input_config, eval_config):
       object_detection.protos.InputReader.
     eval_config: evaluation config proto of type
       object_detection.protos.EvalConfig.
+    num_workers: number of processes reading and parsing the input shards,
+      None for the number of CPUs. The shards are read in the main process if 1.
 
   Returns:
-    Evaluated detections metrics.
+    Evaluated detections metrics of all the evaluators of the metrics set.
 
   Raises:
-    ValueError: if input_reader type is not supported or metric type is unknown.
+    ValueError: if input_reader type is not supported or metric type is unknown,
+      or if the metric names of two evaluators collide.
   """
   if input_config.WhichOneof('input_reader') == 'tf_record_input_reader':
     input_paths = input_config.tf_record_input_reader.input_path
@@ -96,38 +238,42 @@ def read_data_and_evaluate(input_config, eval_config):
 
     object_detection_evaluators = evaluator.get_evaluators(
         eval_config, categories)
-    # Support a single evaluator
-    object_detection_evaluator = object_detection_evaluators[0]
 
     skipped_images = 0
     processed_images = 0
-    for input_path in _generate_filenames(input_paths):
-      tf.logging.info('Processing file: {0}'.format(input_path))
-
-      record_iterator = tf.python_io.tf_record_iterator(path=input_path)
-      data_parser = tf_example_parser.TfExampleDetectionAndGTParser()
-
-      for string_record in record_iterator:
-        tf.logging.log_every_n(tf.logging.INFO, 'Processed %d images...', 1000,
-                               processed_images)
-        processed_images += 1
-
-        example = tf.train.Example()
-        example.ParseFromString(string_record)
-        decoded_dict = data_parser.parse(example)
-
-        if decoded_dict:
+    start_time = time.time()
+    for _, decoded_dict in _iterate_records(
+        _generate_filenames(input_paths),
+        num_workers or multiprocessing.cpu_count()):
+      if processed_images % 1000 == 0:
+        elapsed_time = time.time() - start_time
+        tf.logging.info(
+            'Processed %d images, %.1f records/s...', processed_images,
+            processed_images / elapsed_time if elapsed_time > 0 else 0.)
+      processed_images += 1
+
+      if decoded_dict:
+        image_id = decoded_dict[standard_fields.DetectionResultFields.key]
+        for object_detection_evaluator in object_detection_evaluators:
           object_detection_evaluator.add_single_ground_truth_image_info(
-              decoded_dict[standard_fields.DetectionResultFields.key],
-              decoded_dict)
+              image_id, decoded_dict)
           object_detection_evaluator.add_single_detected_image_info(
-              decoded_dict[standard_fields.DetectionResultFields.key],
-              decoded_dict)
-        else:
-          skipped_images += 1
-          tf.logging.info('Skipped images: {0}'.format(skipped_images))
-
-    return object_detection_evaluator.evaluate()
+              image_id, decoded_dict)
+      else:
+        skipped_images += 1
+        tf.logging.info('Skipped images: {0}'.format(skipped_images))
+    elapsed_time = time.time() - start_time
+    tf.logging.info('Read %d images in %.1fs, %.1f records/s.',
+                    processed_images, elapsed_time,
+                    processed_images / elapsed_time if elapsed_time > 0 else 0.)
+
+    all_evaluator_metrics = {}
+    for object_detection_evaluator in object_detection_evaluators:
+      metrics = object_detection_evaluator.evaluate()
+      if any(key in all_evaluator_metrics for key in metrics):
+        raise ValueError('Metric names between evaluators must not collide.')
+      all_evaluator_metrics.update(metrics)
+    return all_evaluator_metrics
 
   raise ValueError('Unsupported input_reader_config.')
 
@@ -161,7 +307,8 @@ def main(argv):
   eval_config = configs['eval_config']
   input_config = configs['eval_input_config']
 
-  metrics = read_data_and_evaluate(input_config, eval_config)
+  metrics = read_data_and_evaluate(input_config, eval_config,
+                                   num_workers=FLAGS.num_workers)
 
   # Save metrics
   write_metrics(metrics, FLAGS.eval_dir)
@@ -14,6 +14,9 @@
 # ==============================================================================
 """Tests for utilities in offline_eval_map_corloc binary."""
 
+import os
+
+import mock
 import tensorflow as tf
 
 from object_detection.metrics import offline_eval_map_corloc as offline_eval
@@ -53,6 +56,43 @@ class OfflineEvalMapCorlocTest(tf.test.TestCase):
         '/path/to/-00001-of-00003.record', '/path/to/-00002-of-00003.record'
     ])
 
+  def test_parseShardsInParallel(self):
+    num_records = {'a': 5, 'b': 0, 'c': 130, 'd': 1}
+
+    def parse_records(input_path):
+      for index in range(num_records[input_path]):
+        yield {'index': index}
+
+    with mock.patch.object(offline_eval, '_parse_records', parse_records):
+      records = list(offline_eval._parse_shards_in_parallel(
+          ['a', 'b', 'c', 'd'], num_workers=2, batch_size=8,
+          max_pending_batches=2))
+    self.assertEqual(
+        [(input_path, {'index': index}) for input_path in ['a', 'b', 'c', 'd']
+         for index in range(num_records[input_path])], records)
+
+  def test_parseShardsInParallelRaisesWorkerErrors(self):
+
+    def parse_records(input_path):
+      yield {'index': 0}
+      raise IOError('Cannot read {}'.format(input_path))
+
+    with mock.patch.object(offline_eval, '_parse_records', parse_records):
+      with self.assertRaisesRegexp(RuntimeError, 'Cannot read a'):
+        list(offline_eval._parse_shards_in_parallel(['a'], num_workers=2))
+
+  def test_parseShardsInParallelRaisesWhenWorkerDies(self):
+
+    def parse_records(input_path):
+      del input_path
+      os._exit(3)  # pylint: disable=protected-access
+      yield {'index': 0}
+
+    with mock.patch.object(offline_eval, '_parse_records', parse_records):
+      with self.assertRaisesRegexp(RuntimeError, 'exited with code 3'):
+        list(offline_eval._parse_shards_in_parallel(
+            ['a'], num_workers=2, poll_seconds=0.1))
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -22,6 +22,9 @@ python models/research/object_detection/metrics/oid_od_challenge_evaluation.py \
     --input_predictions=/path/to/input/predictions.csv \
     --output_metrics=/path/to/output/metric.csv \
 
+The inputs can also be Parquet files (with a .parquet extension), in which case
+only the needed columns are read.
+
 CSVs with bounding box annotations and image label (including the image URLs)
 can be downloaded from the Open Images Challenge website:
 https://storage.googleapis.com/openimages/web/challenge.html
@@ -34,7 +37,6 @@ from __future__ import division
 from __future__ import print_function
 
 import argparse
-import pandas as pd
 from google.protobuf import text_format
 
 from object_detection.metrics import io_utils
@@ -67,29 +69,27 @@ def _load_labelmap(labelmap_path):
 
 
 def main(parsed_args):
-  all_box_annotations = pd.read_csv(parsed_args.input_annotations_boxes)
-  all_label_annotations = pd.read_csv(parsed_args.input_annotations_labels)
-  all_label_annotations.rename(
-      columns={'Confidence': 'ConfidenceImageLabel'}, inplace=True)
-  all_annotations = pd.concat([all_box_annotations, all_label_annotations])
+  all_box_annotations = utils.read_table(
+      parsed_args.input_annotations_boxes,
+      ['ImageID', 'LabelName', 'XMin', 'XMax', 'YMin', 'YMax', 'IsGroupOf'])
+  all_label_annotations = utils.read_table(
+      parsed_args.input_annotations_labels, ['ImageID', 'LabelName'])
 
   class_label_map, categories = _load_labelmap(parsed_args.input_class_labelmap)
   challenge_evaluator = (
       object_detection_evaluation.OpenImagesDetectionChallengeEvaluator(
           categories))
 
-  for _, groundtruth in enumerate(all_annotations.groupby('ImageID')):
-    image_id, image_groundtruth = groundtruth
-    groundtruth_dictionary = utils.build_groundtruth_boxes_dictionary(
-        image_groundtruth, class_label_map)
+  for image_id, groundtruth_dictionary in utils.build_groundtruth_dictionaries(
+      all_box_annotations, all_label_annotations, class_label_map):
     challenge_evaluator.add_single_ground_truth_image_info(
         image_id, groundtruth_dictionary)
 
-  all_predictions = pd.read_csv(parsed_args.input_predictions)
-  for _, prediction_data in enumerate(all_predictions.groupby('ImageID')):
-    image_id, image_predictions = prediction_data
-    prediction_dictionary = utils.build_predictions_dictionary(
-        image_predictions, class_label_map)
+  all_predictions = utils.read_table(
+      parsed_args.input_predictions,
+      ['ImageID', 'LabelName', 'XMin', 'XMax', 'YMin', 'YMax', 'Score'])
+  for image_id, prediction_dictionary in utils.build_predictions_dictionaries(
+      all_predictions, class_label_map):
     challenge_evaluator.add_single_detected_image_info(image_id,
                                                        prediction_dictionary)
 
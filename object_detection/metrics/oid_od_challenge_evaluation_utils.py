@@ -19,8 +19,33 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import numpy as np
+import pandas as pd
+
 from object_detection.core import standard_fields
 
+BOX_COLUMNS = ['YMin', 'XMin', 'YMax', 'XMax']
+
+
+def map_label_names(label_names, class_label_map):
+  """Maps a column of label names to integer class ids at once.
+
+  Args:
+    label_names: Pandas Series of string label names.
+    class_label_map: Class labelmap from string label name to an integer.
+
+  Returns:
+    An integer numpy array with the class id of each label name.
+
+  Raises:
+    KeyError: if a label name is not in class_label_map.
+  """
+  class_ids = label_names.map(class_label_map)
+  missing = class_ids.isnull().values
+  if missing.any():
+    raise KeyError(label_names.values[missing][0])
+  return class_ids.values.astype(np.int64)
+
 
 def build_groundtruth_boxes_dictionary(data, class_label_map):
   """Builds a groundtruth dictionary from groundtruth data in CSV file.
@@ -49,14 +74,13 @@ def build_groundtruth_boxes_dictionary(data, class_label_map):
 
   return {
       standard_fields.InputDataFields.groundtruth_boxes:
-          data_boxes[['YMin', 'XMin', 'YMax', 'XMax']].as_matrix(),
+          data_boxes[BOX_COLUMNS].values,
       standard_fields.InputDataFields.groundtruth_classes:
-          data_boxes['LabelName'].map(lambda x: class_label_map[x]).as_matrix(),
+          map_label_names(data_boxes['LabelName'], class_label_map),
       standard_fields.InputDataFields.groundtruth_group_of:
-          data_boxes['IsGroupOf'].as_matrix().astype(int),
+          data_boxes['IsGroupOf'].values.astype(int),
       standard_fields.InputDataFields.groundtruth_image_classes:
-          data_labels['LabelName'].map(lambda x: class_label_map[x])
-          .as_matrix(),
+          map_label_names(data_labels['LabelName'], class_label_map),
   }
 
 
@@ -82,9 +106,127 @@ def build_predictions_dictionary(data, class_label_map):
   """
   return {
       standard_fields.DetectionResultFields.detection_boxes:
-          data[['YMin', 'XMin', 'YMax', 'XMax']].as_matrix(),
+          data[BOX_COLUMNS].values,
       standard_fields.DetectionResultFields.detection_classes:
-          data['LabelName'].map(lambda x: class_label_map[x]).as_matrix(),
+          map_label_names(data['LabelName'], class_label_map),
       standard_fields.DetectionResultFields.detection_scores:
-          data['Score'].as_matrix()
+          data['Score'].values
   }
+
+
+def read_table(path, columns):
+  """Reads only the given columns of a CSV or Parquet file.
+
+  Args:
+    path: Path to a .csv file, or to a .parquet file which is read through
+      pyarrow without parsing the columns that are not needed.
+    columns: List of the column names to read.
+
+  Returns:
+    A Pandas DataFrame with the requested columns.
+  """
+  if path.endswith('.parquet'):
+    return pd.read_parquet(path, columns=columns)
+  return pd.read_csv(path, usecols=columns)
+
+
+def _group_rows_by_image(image_ids, unique_image_ids):
+  """Groups the rows of a table by image id.
+
+  Args:
+    image_ids: numpy array with the image id of each row.
+    unique_image_ids: Pandas Index of all the image ids, sorted.
+
+  Returns:
+    order: rows permutation making the rows of each image contiguous, in the
+      order of unique_image_ids and keeping the file order within an image.
+    ends: numpy array with, for each of unique_image_ids, the end of its rows
+      in the permuted table.
+  """
+  codes = unique_image_ids.get_indexer(image_ids)
+  order = np.argsort(codes, kind='mergesort')
+  ends = np.cumsum(np.bincount(codes, minlength=len(unique_image_ids)))
+  return order, ends
+
+
+def build_groundtruth_dictionaries(box_data, label_data, class_label_map):
+  """Builds the groundtruth dictionaries of all the images at once.
+
+  Label names are mapped to class ids once per column and the rows are sorted
+  by image id, so the dictionary of each image holds contiguous slices of the
+  whole columns instead of being built from a per-image DataFrame.
+
+  Args:
+    box_data: Pandas DataFrame with the groundtruth boxes of all images, with
+      columns ImageID, LabelName, XMin, XMax, YMin, YMax and IsGroupOf.
+    label_data: Pandas DataFrame with the verified image-level labels of all
+      images, with columns ImageID and LabelName.
+    class_label_map: Class labelmap from string label name to an integer.
+
+  Yields:
+    (image_id, groundtruth_dictionary) pairs sorted by image id, with the same
+    dictionary as build_groundtruth_boxes_dictionary.
+  """
+  box_image_ids = box_data['ImageID'].values
+  label_image_ids = label_data['ImageID'].values
+  unique_image_ids = pd.Index(
+      np.concatenate([box_image_ids, label_image_ids])).unique().sort_values()
+
+  box_order, box_ends = _group_rows_by_image(box_image_ids, unique_image_ids)
+  boxes = box_data[BOX_COLUMNS].values[box_order]
+  classes = map_label_names(box_data['LabelName'], class_label_map)[box_order]
+  group_of = box_data['IsGroupOf'].values.astype(int)[box_order]
+
+  label_order, label_ends = _group_rows_by_image(label_image_ids,
+                                                 unique_image_ids)
+  image_classes = map_label_names(label_data['LabelName'],
+                                  class_label_map)[label_order]
+
+  box_start = 0
+  label_start = 0
+  for image_id, box_end, label_end in zip(unique_image_ids, box_ends,
+                                          label_ends):
+    yield image_id, {
+        standard_fields.InputDataFields.groundtruth_boxes:
+            boxes[box_start:box_end],
+        standard_fields.InputDataFields.groundtruth_classes:
+            classes[box_start:box_end],
+        standard_fields.InputDataFields.groundtruth_group_of:
+            group_of[box_start:box_end],
+        standard_fields.InputDataFields.groundtruth_image_classes:
+            image_classes[label_start:label_end],
+    }
+    box_start = box_end
+    label_start = label_end
+
+
+def build_predictions_dictionaries(data, class_label_map):
+  """Builds the predictions dictionaries of all the images at once.
+
+  Args:
+    data: Pandas DataFrame with the predictions of all images, with columns
+      ImageID, LabelName, XMin, XMax, YMin, YMax and Score.
+    class_label_map: Class labelmap from string label name to an integer.
+
+  Yields:
+    (image_id, predictions_dictionary) pairs sorted by image id, with the same
+    dictionary as build_predictions_dictionary.
+  """
+  image_ids = data['ImageID'].values
+  unique_image_ids = pd.Index(image_ids).unique().sort_values()
+  order, ends = _group_rows_by_image(image_ids, unique_image_ids)
+  boxes = data[BOX_COLUMNS].values[order]
+  classes = map_label_names(data['LabelName'], class_label_map)[order]
+  scores = data['Score'].values[order]
+
+  start = 0
+  for image_id, end in zip(unique_image_ids, ends):
+    yield image_id, {
+        standard_fields.DetectionResultFields.detection_boxes:
+            boxes[start:end],
+        standard_fields.DetectionResultFields.detection_classes:
+            classes[start:end],
+        standard_fields.DetectionResultFields.detection_scores:
+            scores[start:end]
+    }
+    start = end
@@ -98,6 +98,77 @@ class OidOdChallengeEvaluationUtilTest(tf.test.TestCase):
         np.array([0.1, 0.2, 0.3]), prediction_dictionary[
             standard_fields.DetectionResultFields.detection_scores], 1e-5)
 
+  def testBuildGroundtruthDictionaries(self):
+    box_data = pd.DataFrame(
+        [['img2', '/m/04bcr3', 0.0, 0.3, 0.5, 0.6, 1],
+         ['img1', '/m/02gy9n', 0.1, 0.2, 0.3, 0.4, 0],
+         ['img2', '/m/083vt', 0.2, 0.4, 0.1, 0.3, 0]],
+        columns=[
+            'ImageID', 'LabelName', 'XMin', 'XMax', 'YMin', 'YMax', 'IsGroupOf'
+        ])
+    label_data = pd.DataFrame(
+        [['img3', '/m/04bcr3'], ['img2', '/m/083vt'], ['img2', '/m/04bcr3']],
+        columns=['ImageID', 'LabelName'])
+    class_label_map = {'/m/04bcr3': 1, '/m/083vt': 2, '/m/02gy9n': 3}
+    groundtruth = list(utils.build_groundtruth_dictionaries(
+        box_data, label_data, class_label_map))
+
+    label_data = label_data.assign(ConfidenceImageLabel=1)
+    all_annotations = pd.concat([box_data, label_data], sort=False)
+    expected_groundtruth = [
+        (image_id, utils.build_groundtruth_boxes_dictionary(
+            image_groundtruth, class_label_map))
+        for image_id, image_groundtruth in all_annotations.groupby('ImageID')]
+
+    self.assertEqual(['img1', 'img2', 'img3'],
+                     [image_id for image_id, _ in groundtruth])
+    for (image_id, groundtruth_dictionary), (expected_image_id,
+                                             expected_dictionary) in zip(
+                                                 groundtruth,
+                                                 expected_groundtruth):
+      self.assertEqual(expected_image_id, image_id)
+      self.assertEqual(
+          sorted(expected_dictionary.keys()),
+          sorted(groundtruth_dictionary.keys()))
+      for key, expected_value in expected_dictionary.items():
+        self.assertAllEqual(
+            np.reshape(expected_value, groundtruth_dictionary[key].shape),
+            groundtruth_dictionary[key])
+    self.assertEqual(
+        (0, 4), groundtruth[2][1][
+            standard_fields.InputDataFields.groundtruth_boxes].shape)
+
+  def testBuildPredictionDictionaries(self):
+    np_data = pd.DataFrame(
+        [['img2', '/m/04bcr3', 0.0, 0.3, 0.5, 0.6, 0.1],
+         ['img1', '/m/02gy9n', 0.1, 0.2, 0.3, 0.4, 0.2],
+         ['img2', '/m/02gy9n', 0.0, 0.1, 0.2, 0.3, 0.3]],
+        columns=[
+            'ImageID', 'LabelName', 'XMin', 'XMax', 'YMin', 'YMax', 'Score'
+        ])
+    class_label_map = {'/m/04bcr3': 1, '/m/083vt': 2, '/m/02gy9n': 3}
+    predictions = list(utils.build_predictions_dictionaries(
+        np_data, class_label_map))
+
+    self.assertEqual(['img1', 'img2'],
+                     [image_id for image_id, _ in predictions])
+    prediction_dictionary = predictions[1][1]
+    self.assertAllEqual(
+        np.array([1, 3]), prediction_dictionary[
+            standard_fields.DetectionResultFields.detection_classes])
+    self.assertNDArrayNear(
+        np.array([[0.5, 0.0, 0.6, 0.3], [0.2, 0.0, 0.3, 0.1]]),
+        prediction_dictionary[
+            standard_fields.DetectionResultFields.detection_boxes], 1e-5)
+    self.assertNDArrayNear(
+        np.array([0.1, 0.3]), prediction_dictionary[
+            standard_fields.DetectionResultFields.detection_scores], 1e-5)
+
+  def testMapLabelNamesRaisesOnUnknownLabel(self):
+    with self.assertRaises(KeyError):
+      utils.map_label_names(
+          pd.Series(['/m/04bcr3', '/m/unknown']), {'/m/04bcr3': 1})
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -0,0 +1,107 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Functions to decode images straight into uint8 numpy arrays.
+
+The decoded pixels are exposed through the PIL buffer protocol instead of
+`Image.getdata()`, which builds a Python list of pixel tuples and an int64 array
+before casting it back to uint8.
+"""
+import math
+
+import numpy as np
+from PIL import Image
+
+
+def load_image_into_numpy_array(image, copy=True):
+  """Converts a PIL image to a [height, width, 3] uint8 numpy array.
+
+  Args:
+    image: a PIL image.
+    copy: whether to return a writable array. When False, the returned array
+      is read-only but one less copy of the pixels is made.
+
+  Returns:
+    a uint8 numpy array of shape [height, width, 3].
+  """
+  if image.mode != 'RGB':
+    image = image.convert('RGB')
+  return np.array(image) if copy else np.asarray(image)
+
+
+def open_image(image_path, min_dimension=None):
+  """Opens an image, letting the JPEG decoder downscale it when possible.
+
+  JPEG images can be decoded directly at 1/2, 1/4 or 1/8 of their size, which
+  is much faster than decoding at full size and resizing. The largest such
+  scale is picked so that the smallest side of the image stays at least
+  `min_dimension`, e.g. the `min_dimension` of the model image resizer.
+
+  Args:
+    image_path: path to the image.
+    min_dimension: smallest side of the decoded image the caller needs, or None
+      to decode at full size.
+
+  Returns:
+    a PIL image in RGB mode.
+  """
+  image = Image.open(image_path)
+  if min_dimension is not None and image.format == 'JPEG':
+    (width, height) = image.size
+    scale = float(min_dimension) / min(width, height)
+    if scale < 1.:
+      image.draft('RGB', (int(math.ceil(width * scale)),
+                          int(math.ceil(height * scale))))
+  return image.convert('RGB')
+
+
+def load_image(image_path, min_dimension=None, copy=True):
+  """Decodes an image file into a [height, width, 3] uint8 numpy array.
+
+  Args:
+    image_path: path to the image.
+    min_dimension: see `open_image`.
+    copy: see `load_image_into_numpy_array`.
+
+  Returns:
+    a uint8 numpy array of shape [height, width, 3].
+  """
+  return load_image_into_numpy_array(
+      open_image(image_path, min_dimension=min_dimension), copy=copy)
+
+
+def load_raw_frame(frame_path, height, width, channels=3, offset=0):
+  """Memory-maps a raw uint8 frame, e.g. a frame dumped by a video decoder.
+
+  No pixel is read until it is accessed, and the pages are shared with the OS
+  file cache instead of being copied in the process memory.
+
+  Args:
+    frame_path: path to the raw frame, or to a `.npy` file in which case the
+      shape is read from its header and the other arguments are ignored.
+    height: height of the frame.
+    width: width of the frame.
+    channels: number of channels of the frame.
+    offset: offset in bytes of the frame in the file, to read one frame of a
+      file holding several frames.
+
+  Returns:
+    a read-only uint8 numpy memmap of shape [height, width, channels].
+  """
+  if frame_path.endswith('.npy'):
+    return np.load(frame_path, mmap_mode='r')
+  return np.memmap(frame_path, dtype=np.uint8, mode='r', offset=offset,
+                   shape=(height, width, channels))
+
@@ -0,0 +1,87 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.utils.image_util."""
+import os
+
+import numpy as np
+from PIL import Image
+import tensorflow as tf
+
+from object_detection.utils import image_util
+
+
+def load_image_with_getdata(image_path):
+  """Previous implementation, the reference of the buffer based loading."""
+  image = Image.open(image_path).convert('RGB')
+  (im_width, im_height) = image.size
+  return np.array(image.getdata()).reshape(
+      (im_height, im_width, 3)).astype(np.uint8)
+
+
+class ImageUtilTest(tf.test.TestCase):
+
+  def _create_image(self, image_format, width=64, height=48):
+    image_np = np.random.randint(0, 256, (height, width, 3)).astype(np.uint8)
+    image_path = os.path.join(self.get_temp_dir(), 'image.' + image_format)
+    Image.fromarray(image_np).save(image_path)
+    return image_np, image_path
+
+  def test_load_image_matches_getdata(self):
+    image_np, image_path = self._create_image('png')
+    expected = load_image_with_getdata(image_path)
+    loaded = image_util.load_image(image_path)
+    self.assertEqual(loaded.dtype, np.uint8)
+    self.assertAllEqual(loaded, expected)
+    self.assertAllEqual(loaded, image_np)
+    self.assertTrue(loaded.flags.writeable)
+
+  def test_load_image_into_numpy_array_converts_grayscale(self):
+    image = Image.fromarray(np.full((4, 5), 7, dtype=np.uint8), 'L')
+    image_np = image_util.load_image_into_numpy_array(image, copy=False)
+    self.assertAllEqual(image_np.shape, [4, 5, 3])
+    self.assertAllEqual(image_np, np.full((4, 5, 3), 7))
+
+  def test_load_image_with_min_dimension_downscales_jpeg(self):
+    _, image_path = self._create_image('jpg', width=640, height=480)
+    image_np = image_util.load_image(image_path, min_dimension=100)
+    self.assertAllEqual(image_np.shape, [120, 160, 3])
+
+  def test_load_image_with_large_min_dimension_keeps_size(self):
+    _, image_path = self._create_image('jpg', width=640, height=480)
+    image_np = image_util.load_image(image_path, min_dimension=600)
+    self.assertAllEqual(image_np.shape, [480, 640, 3])
+
+  def test_load_image_with_min_dimension_ignores_png(self):
+    _, image_path = self._create_image('png', width=640, height=480)
+    image_np = image_util.load_image(image_path, min_dimension=100)
+    self.assertAllEqual(image_np.shape, [480, 640, 3])
+
+  def test_load_raw_frame(self):
+    frames = np.random.randint(0, 256, (2, 4, 5, 3)).astype(np.uint8)
+    frame_path = os.path.join(self.get_temp_dir(), 'frames.raw')
+    frames.tofile(frame_path)
+    frame = image_util.load_raw_frame(frame_path, 4, 5, offset=frames[0].nbytes)
+    self.assertAllEqual(frame, frames[1])
+
+  def test_load_raw_frame_from_npy(self):
+    frame = np.random.randint(0, 256, (4, 5, 3)).astype(np.uint8)
+    frame_path = os.path.join(self.get_temp_dir(), 'frame.npy')
+    np.save(frame_path, frame)
+    self.assertAllEqual(image_util.load_raw_frame(frame_path, None, None), frame)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -16,9 +16,65 @@
 
 json_utils wraps json.dump and json.dumps so that they can be used to safely
 control the precision of floats when writing to json strings or files.
+
+The floats are rounded before encoding, numpy arrays in a single vectorized
+call, and the result is encoded by the standard json encoder. Nothing global is
+modified, so the C encoder stays enabled and the functions can be called from
+several threads at once. Rounded floats are written with at most float_digits
+digits, trailing zeros are not written.
 """
 import json
-from json import encoder
+import math
+
+import numpy as np
+
+
+# Types written as is by the json encoder.
+_NON_FLOAT_TYPES = (int, str, bool, type(None))
+
+
+def _RoundFloat(value, float_digits):
+  if float_digits == 0 and math.isfinite(value):
+    return int(round(value))
+  return round(value, float_digits)
+
+
+def _RoundFloats(obj, float_digits):
+  """Returns a copy of obj with its floats rounded to float_digits digits.
+
+  Numpy arrays and scalars are converted to lists and python numbers.
+
+  Args:
+    obj: The object to round. Dictionaries, lists and tuples are copied
+      recursively, other objects are returned as is.
+    float_digits: The number of digits of precision of the floats.
+
+  Returns:
+    The rounded object.
+  """
+  obj_type = type(obj)
+  if obj_type is float:
+    return _RoundFloat(obj, float_digits)
+  if obj_type in _NON_FLOAT_TYPES:
+    return obj
+  if isinstance(obj, dict):
+    return {key: _RoundFloats(value, float_digits)
+            for key, value in obj.items()}
+  if isinstance(obj, (list, tuple)):
+    return [_RoundFloats(value, float_digits) for value in obj]
+  if isinstance(obj, np.ndarray):
+    if obj.dtype.kind != 'f':
+      return obj.tolist()
+    if float_digits == 0:
+      return _RoundFloats(obj.tolist(), float_digits)
+    # Rounds in float64, a rounded float32 is not the closest float to its
+    # decimal representation.
+    return np.round(obj.astype(np.float64), float_digits).tolist()
+  if isinstance(obj, np.generic):
+    return _RoundFloats(obj.item(), float_digits)
+  if isinstance(obj, float):
+    return _RoundFloat(obj, float_digits)
+  return obj
 
 
 def Dump(obj, fid, float_digits=-1, **params):
@@ -28,15 +84,14 @@ def Dump(obj, fid, float_digits=-1, **params):
     obj: The object to dump.
     fid: The file id to write to.
     float_digits: The number of digits of precision when writing floats out.
+      Floats are rounded, not formatted, so trailing zeros are not written,
+      e.g. 1.0 rather than 1.00 with 2 digits, and numbers with 0 digits are
+      written as integers.
     **params: Additional parameters to pass to json.dumps.
   """
-  original_encoder = encoder.FLOAT_REPR
   if float_digits >= 0:
-    encoder.FLOAT_REPR = lambda o: format(o, '.%df' % float_digits)
-  try:
-    json.dump(obj, fid, **params)
-  finally:
-    encoder.FLOAT_REPR = original_encoder
+    obj = _RoundFloats(obj, float_digits)
+  json.dump(obj, fid, **params)
 
 
 def Dumps(obj, float_digits=-1, **params):
@@ -45,23 +100,17 @@ def Dumps(obj, float_digits=-1, **params):
   Args:
     obj: The object to dump.
     float_digits: The number of digits of precision when writing floats out.
+      Floats are rounded, not formatted, so trailing zeros are not written,
+      e.g. 1.0 rather than 1.00 with 2 digits, and numbers with 0 digits are
+      written as integers.
     **params: Additional parameters to pass to json.dumps.
 
   Returns:
     output: JSON string representation of obj.
   """
-  original_encoder = encoder.FLOAT_REPR
-  original_c_make_encoder = encoder.c_make_encoder
   if float_digits >= 0:
-    encoder.FLOAT_REPR = lambda o: format(o, '.%df' % float_digits)
-    encoder.c_make_encoder = None
-  try:
-    output = json.dumps(obj, **params)
-  finally:
-    encoder.FLOAT_REPR = original_encoder
-    encoder.c_make_encoder = original_c_make_encoder
-
-  return output
+    obj = _RoundFloats(obj, float_digits)
+  return json.dumps(obj, **params)
 
 
 def PrettyParams(**params):
@@ -13,8 +13,11 @@
 # limitations under the License.
 # ==============================================================================
 """Tests for google3.image.understanding.object_detection.utils.json_utils."""
+import json
+import multiprocessing.pool
 import os
 
+import numpy as np
 import tensorflow as tf
 
 from object_detection.utils import json_utils
@@ -27,14 +30,14 @@ class JsonUtilsTest(tf.test.TestCase):
     with tf.gfile.GFile(output_path, 'w') as f:
       json_utils.Dump(1.0, f, float_digits=2)
     with tf.gfile.GFile(output_path, 'r') as f:
-      self.assertEqual(f.read(), '1.00')
+      self.assertEqual(f.read(), '1.0')
 
   def testDumpPassExtraParams(self):
     output_path = os.path.join(tf.test.get_temp_dir(), 'test.json')
     with tf.gfile.GFile(output_path, 'w') as f:
       json_utils.Dump([1.0], f, float_digits=2, indent=3)
     with tf.gfile.GFile(output_path, 'r') as f:
-      self.assertEqual(f.read(), '[\n   1.00\n]')
+      self.assertEqual(f.read(), '[\n   1.0\n]')
 
   def testDumpZeroPrecision(self):
     output_path = os.path.join(tf.test.get_temp_dir(), 'test.json')
@@ -52,16 +55,43 @@ class JsonUtilsTest(tf.test.TestCase):
 
   def testDumpsReasonablePrecision(self):
     s = json_utils.Dumps(1.0, float_digits=2)
-    self.assertEqual(s, '1.00')
+    self.assertEqual(s, '1.0')
+    s = json_utils.Dumps(1.23456, float_digits=2)
+    self.assertEqual(s, '1.23')
 
   def testDumpsPassExtraParams(self):
     s = json_utils.Dumps([1.0], float_digits=2, indent=3)
-    self.assertEqual(s, '[\n   1.00\n]')
+    self.assertEqual(s, '[\n   1.0\n]')
 
   def testDumpsZeroPrecision(self):
     s = json_utils.Dumps(1.0, float_digits=0)
     self.assertEqual(s, '1')
 
+  def testDumpsNumpyArrays(self):
+    s = json_utils.Dumps(
+        {'boxes': np.array([[0.123456, 1.], [2.5, 3.987654]], np.float32),
+         'classes': np.array([1, 2]),
+         'score': np.float64(0.87654)}, float_digits=2, sort_keys=True)
+    self.assertEqual(
+        s, '{"boxes": [[0.12, 1.0], [2.5, 3.99]], "classes": [1, 2], '
+        '"score": 0.88}')
+
+  def testDumpsZeroPrecisionNumpyArrays(self):
+    s = json_utils.Dumps(np.array([1.4, 2.6, np.nan]), float_digits=0)
+    self.assertEqual(s, '[1, 3, NaN]')
+
+  def testDumpsConcurrently(self):
+    def DumpsWithDigits(float_digits):
+      return [json_utils.Dumps([1.23456789] * 100, float_digits=float_digits)
+              for _ in range(100)]
+    pool = multiprocessing.pool.ThreadPool(4)
+    results = pool.map(DumpsWithDigits, [1, 2, 3, 4] * 4)
+    pool.close()
+    for float_digits, outputs in zip([1, 2, 3, 4] * 4, results):
+      expected = json.dumps([round(1.23456789, float_digits)] * 100)
+      for output in outputs:
+        self.assertEqual(output, expected)
+
   def testDumpsUnspecifiedPrecision(self):
     s = json_utils.Dumps(1.012345)
     self.assertEqual(s, '1.012345')
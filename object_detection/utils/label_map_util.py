@@ -15,7 +15,10 @@
 """Label map utility functions."""
 
 import logging
+import os
+import pickle
 
+import numpy as np
 import tensorflow as tf
 from google.protobuf import text_format
 from object_detection.protos import string_int_label_map_pb2
@@ -96,7 +99,7 @@ def convert_label_map_to_categories(label_map,
     categories: a list of dictionaries representing all possible categories.
   """
   categories = []
-  list_of_ids_already_added = []
+  ids_already_added = set()
   if not label_map:
     label_id_offset = 1
     for class_id in range(max_num_classes):
@@ -115,8 +118,8 @@ def convert_label_map_to_categories(label_map,
       name = item.display_name
     else:
       name = item.name
-    if item.id not in list_of_ids_already_added:
-      list_of_ids_already_added.append(item.id)
+    if item.id not in ids_already_added:
+      ids_already_added.add(item.id)
       categories.append({'id': item.id, 'name': name})
   return categories
 
@@ -230,6 +233,115 @@ def create_category_index_from_labelmap(label_map_path, use_display_name=True):
   return create_category_index(categories)
 
 
+class CategoryLookup(object):
+  """Array-backed lookup of the categories of a label map.
+
+  Attributes:
+    ids: int64 numpy array with the category ids, in label map order.
+    names: numpy object array such that names[id] is the name of category id,
+      None for the ids without a category.
+    name_to_id: dictionary mapping category names to ids.
+  """
+
+  def __init__(self, ids, names):
+    """Constructor.
+
+    Args:
+      ids: list of the category ids, in label map order.
+      names: list of the category names, aligned with ids.
+    """
+    self.ids = np.array(ids, dtype=np.int64)
+    self.names = np.full(self.ids.max() + 1 if len(ids) else 0, None,
+                         dtype=object)
+    self.names[self.ids] = names
+    self.name_to_id = dict(zip(names, ids))
+
+  def categories(self, max_num_classes=None):
+    """Returns the categories list, see convert_label_map_to_categories."""
+    ids = self.ids
+    if max_num_classes is not None:
+      ids = ids[ids <= max_num_classes]
+    return [{'id': category_id, 'name': self.names[category_id]}
+            for category_id in ids.tolist()]
+
+  def category_index(self, max_num_classes=None):
+    """Returns the category index, see create_category_index."""
+    return create_category_index(self.categories(max_num_classes))
+
+
+# Category lookups already loaded, keyed by label map path, modification time
+# and use_display_name.
+_CATEGORY_LOOKUP_CACHE = {}
+
+
+def _read_category_lookup_sidecar(sidecar_path, source_key):
+  """Returns the lookup pickled in sidecar_path for source_key, or None."""
+  if not tf.gfile.Exists(sidecar_path):
+    return None
+  try:
+    with tf.gfile.GFile(sidecar_path, 'rb') as fid:
+      sidecar = pickle.load(fid)
+  except (IOError, pickle.UnpicklingError, EOFError, ValueError):
+    logging.warning('Ignoring unreadable label map cache %s.', sidecar_path)
+    return None
+  if sidecar.get('source_key') != source_key:
+    return None
+  return CategoryLookup(sidecar['ids'], sidecar['names'])
+
+
+def _write_category_lookup_sidecar(sidecar_path, source_key, ids, names):
+  """Pickles a lookup to sidecar_path, through a temporary file."""
+  temporary_path = '{}.tmp{}'.format(sidecar_path, os.getpid())
+  try:
+    with tf.gfile.GFile(temporary_path, 'wb') as fid:
+      pickle.dump({'source_key': source_key, 'ids': ids, 'names': names}, fid,
+                  protocol=pickle.HIGHEST_PROTOCOL)
+    tf.gfile.Rename(temporary_path, sidecar_path, overwrite=True)
+  except (IOError, tf.errors.OpError):
+    logging.warning('Could not write the label map cache %s.', sidecar_path)
+
+
+def load_category_lookup(label_map_path, use_display_name=True,
+                         sidecar_path=None):
+  """Loads the categories of a label map, parsing it once per process.
+
+  The lookup is cached by label map path and modification time, so the label
+  map is only parsed again if it changes. With sidecar_path, the lookup is
+  also pickled next to the label map and reused by later processes, which
+  avoids parsing large label maps with protobuf text_format at every run.
+
+  Args:
+    label_map_path: Path to `StringIntLabelMap` proto text file.
+    use_display_name: (boolean) choose whether to load 'display_name' field
+      as category name.  If False or if the display_name field does not exist,
+      uses 'name' field as category names instead.
+    sidecar_path: optional path of a pickle file caching the lookup across
+      processes. It is rewritten when the label map changes.
+
+  Returns:
+    a CategoryLookup, shared between the callers and not to be modified. Its
+    categories are the ones of create_categories_from_labelmap.
+  """
+  stat = tf.gfile.Stat(label_map_path)
+  source_key = (label_map_path, stat.mtime_nsec, stat.length,
+                bool(use_display_name))
+  lookup = _CATEGORY_LOOKUP_CACHE.get(source_key)
+  if lookup is not None:
+    return lookup
+  if sidecar_path:
+    lookup = _read_category_lookup_sidecar(sidecar_path, source_key)
+  if lookup is None:
+    categories = create_categories_from_labelmap(label_map_path,
+                                                 use_display_name)
+    ids = [category['id'] for category in categories]
+    names = [category['name'] for category in categories]
+    lookup = CategoryLookup(ids, names)
+    if sidecar_path:
+      _write_category_lookup_sidecar(sidecar_path, source_key, ids, names)
+  _CATEGORY_LOOKUP_CACHE[source_key] = lookup
+  return lookup
+
+
 def create_class_agnostic_category_index():
   """Creates a category index with a single `object` class."""
   return {1: {'id': 1, 'name': 'object'}}
@@ -15,6 +15,8 @@
 """Tests for object_detection.utils.label_map_util."""
 
 import os
+
+import mock
 import tensorflow as tf
 
 from google.protobuf import text_format
@@ -329,6 +331,82 @@ class LabelMapUtilTest(tf.test.TestCase):
         }
     }, label_map_util.create_category_index_from_labelmap(label_map_path))
 
+  def test_category_lookup(self):
+    lookup = label_map_util.CategoryLookup([3, 1], ['cat', 'dog'])
+    self.assertAllEqual([3, 1], lookup.ids)
+    self.assertEqual([None, 'dog', None, 'cat'], list(lookup.names))
+    self.assertDictEqual({'cat': 3, 'dog': 1}, lookup.name_to_id)
+    self.assertListEqual([{'id': 3, 'name': 'cat'}, {'id': 1, 'name': 'dog'}],
+                         lookup.categories())
+    self.assertDictEqual({1: {'id': 1, 'name': 'dog'}},
+                         lookup.category_index(max_num_classes=2))
+
+  def test_load_category_lookup(self):
+    label_map_string = """
+      item {
+        id:2
+        name:'cat'
+        display_name:'meow'
+      }
+      item {
+        id:1
+        name:'dog'
+        display_name:'woof'
+      }
+    """
+    label_map_path = os.path.join(self.get_temp_dir(), 'lookup_map.pbtxt')
+    with tf.gfile.Open(label_map_path, 'wb') as f:
+      f.write(label_map_string)
+
+    lookup = label_map_util.load_category_lookup(label_map_path)
+    self.assertIs(lookup, label_map_util.load_category_lookup(label_map_path))
+    self.assertDictEqual(
+        label_map_util.create_category_index_from_labelmap(label_map_path),
+        lookup.category_index())
+    self.assertDictEqual(
+        label_map_util.create_category_index_from_labelmap(
+            label_map_path, False),
+        label_map_util.load_category_lookup(label_map_path,
+                                            False).category_index())
+
+    # The label map is parsed again once modified.
+    with tf.gfile.Open(label_map_path, 'wb') as f:
+      f.write(label_map_string.replace('meow', 'purr'))
+    os.utime(label_map_path, (0, 0))
+    self.assertEqual(
+        'purr', label_map_util.load_category_lookup(label_map_path).names[2])
+
+  def test_load_category_lookup_with_sidecar(self):
+    label_map_string = """
+      item {
+        id:1
+        name:'dog'
+      }
+      item {
+        id:3
+        name:'cat'
+      }
+    """
+    label_map_path = os.path.join(self.get_temp_dir(), 'sidecar_map.pbtxt')
+    sidecar_path = label_map_path + '.pkl'
+    with tf.gfile.Open(label_map_path, 'wb') as f:
+      f.write(label_map_string)
+
+    lookup = label_map_util.load_category_lookup(
+        label_map_path, sidecar_path=sidecar_path)
+    self.assertTrue(tf.gfile.Exists(sidecar_path))
+
+    # A new process reads the sidecar instead of parsing the label map.
+    label_map_util._CATEGORY_LOOKUP_CACHE.clear()
+    with mock.patch.object(
+        label_map_util, 'create_categories_from_labelmap') as parse:
+      sidecar_lookup = label_map_util.load_category_lookup(
+          label_map_path, sidecar_path=sidecar_path)
+      self.assertFalse(parse.called)
+    self.assertAllEqual(lookup.ids, sidecar_lookup.ids)
+    self.assertDictEqual(lookup.name_to_id, sidecar_lookup.name_to_id)
+    self.assertEqual(list(lookup.names), list(sidecar_lookup.names))
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -66,6 +66,119 @@ def compute_precision_recall(scores, labels, num_gt):
   return precision, recall
 
 
+def compute_score_histogram(scores, labels, num_score_bins):
+  """Accumulates true/false positive labels in bins of detection scores.
+
+  Scores are expected in [0, 1] and are split into num_score_bins bins of
+  width 1 / num_score_bins, ordered by decreasing score: bin 0 holds the
+  highest scores. Scores out of [0, 1] fall in the first or last bin. Histograms
+  of several sets of detections can simply be added together.
+
+  Args:
+    scores: A float numpy array representing detection score
+    labels: A float numpy array representing weighted true/false positive labels
+    num_score_bins: Number of score bins.
+
+  Returns:
+    true_positives: A float numpy array of length num_score_bins holding the
+      sum of the true positive labels of each bin.
+    false_positives: A float numpy array of length num_score_bins holding the
+      number of false positives of each bin.
+  """
+  bins = num_score_bins - 1 - np.clip(
+      np.floor(scores * num_score_bins).astype(int), 0, num_score_bins - 1)
+  true_positives = np.bincount(
+      bins, weights=labels.astype(float), minlength=num_score_bins)
+  false_positives = np.bincount(
+      bins, weights=(labels <= 0).astype(float), minlength=num_score_bins)
+  return true_positives, false_positives
+
+
+def compute_precision_recall_from_histogram(true_positives, false_positives,
+                                            num_gt):
+  """Compute precision and recall at the end of each non-empty score bin.
+
+  The result is the precision and recall of `compute_precision_recall` with the
+  scores rounded down to the bin resolution and, within a bin, false positives
+  ranked before true positives. See `compute_average_precision_error_bound` for
+  how far the resulting average precision is from the exact one.
+
+  Args:
+    true_positives: A float numpy array of true positive counts per score bin,
+      see `compute_score_histogram`.
+    false_positives: A float numpy array of false positive counts per score
+      bin.
+    num_gt: Number of ground truth instances
+
+  Raises:
+    ValueError: if the input is not of the correct format
+
+  Returns:
+    precision: Fraction of positive instances over detected ones. This value is
+      None if no ground truth labels are present.
+    recall: Fraction of detected positive instance over all positive instances.
+      This value is None if no ground truth labels are present.
+  """
+  if true_positives.shape != false_positives.shape:
+    raise ValueError("true_positives and false_positives must be of the same "
+                     "size.")
+  if num_gt < np.sum(true_positives):
+    raise ValueError("Number of true positives must be smaller than num_gt.")
+  if num_gt == 0:
+    return None, None
+
+  non_empty = (true_positives + false_positives) > 0
+  cum_true_positives = np.cumsum(true_positives)[non_empty]
+  cum_false_positives = np.cumsum(false_positives)[non_empty]
+  precision = cum_true_positives / (cum_true_positives + cum_false_positives)
+  recall = cum_true_positives / num_gt
+  return precision, recall
+
+
+def compute_average_precision_error_bound(true_positives, false_positives,
+                                          num_gt):
+  """Bounds the error of the average precision computed from a histogram.
+
+  The average precision computed from `compute_precision_recall_from_histogram`
+  is never larger than the exact average precision, whatever the order of the
+  detections within the bins, and exceeds it by at most the returned bound.
+
+  For a true positive of bin b, the interpolated precision is at most the
+  largest precision reached within bins b, b + 1, ..., while the histogram
+  uses the largest precision at the end of these bins. Within a bin, the
+  precision is at most the one obtained by ranking all its true positives
+  first, hence the bound. It is zero when no bin holds both true and false
+  positives, and goes to zero as the bins get narrower.
+
+  Args:
+    true_positives: A float numpy array of true positive counts per score bin,
+      see `compute_score_histogram`.
+    false_positives: A float numpy array of false positive counts per score
+      bin.
+    num_gt: Number of ground truth instances
+
+  Returns:
+    error_bound: a float, 0 if there are no groundtruth instances.
+  """
+  if num_gt == 0:
+    return 0.0
+  non_empty = (true_positives + false_positives) > 0
+  true_positives = true_positives[non_empty]
+  cum_true_positives = np.cumsum(true_positives)
+  cum_detections = cum_true_positives + np.cumsum(false_positives[non_empty])
+  end_precision = cum_true_positives / cum_detections
+  # Precision after the true positives of the bin, ranked before its false
+  # positives. It is 0 as long as there are no true positives.
+  max_precision = cum_true_positives / np.maximum(
+      cum_detections - false_positives[non_empty], 1e-12)
+  # The precision within a bin without true positives never exceeds the one at
+  # the end of the previous bin.
+  precision_gap = np.where(true_positives > 0, max_precision - end_precision,
+                           0.)
+  precision_gap = np.maximum.accumulate(precision_gap[::-1])
+  return float(np.sum(true_positives * precision_gap[::-1]) / num_gt)
+
+
 def compute_average_precision(precision, recall):
   """Compute Average Precision according to the definition in VOCdevkit.
 
@@ -92,6 +92,56 @@ class MetricsTest(tf.test.TestCase):
     ap = metrics.compute_average_precision(precision, recall)
     self.assertTrue(np.isnan(ap))
 
+  def test_compute_score_histogram(self):
+    scores = np.array([0.4, 0.3, 0.6, 0.25, 0.7, 1.0, -0.1], dtype=float)
+    labels = np.array([0, 1, 1, 0.5, 0, 1, 0], dtype=float)
+    true_positives, false_positives = metrics.compute_score_histogram(
+        scores, labels, num_score_bins=4)
+    self.assertAllClose(true_positives, [1, 1, 1.5, 0])
+    self.assertAllClose(false_positives, [0, 1, 1, 1])
+
+  def test_compute_precision_recall_from_histogram(self):
+    num_gt = 10
+    scores = np.array([0.4, 0.3, 0.6, 0.2, 0.7, 0.1], dtype=float)
+    labels = np.array([0, 1, 1, 0.5, 0, 1], dtype=float)
+    true_positives, false_positives = metrics.compute_score_histogram(
+        scores, labels, num_score_bins=100)
+    precision, recall = metrics.compute_precision_recall_from_histogram(
+        true_positives, false_positives, num_gt)
+    expected_precision, expected_recall = metrics.compute_precision_recall(
+        scores, labels, num_gt)
+    self.assertAllClose(precision, expected_precision)
+    self.assertAllClose(recall, expected_recall)
+    self.assertEqual(metrics.compute_average_precision_error_bound(
+        true_positives, false_positives, num_gt), 0.)
+
+  def test_histogram_average_precision_within_error_bound(self):
+    np.random.seed(0)
+    num_gt = 300
+    scores = np.random.uniform(size=1000)
+    labels = (np.random.uniform(size=1000) < scores * 0.5).astype(float)
+    precision, recall = metrics.compute_precision_recall(scores, labels, num_gt)
+    expected_ap = metrics.compute_average_precision(precision, recall)
+    previous_error_bound = np.inf
+    for num_score_bins in [10, 100, 1000]:
+      true_positives, false_positives = metrics.compute_score_histogram(
+          scores, labels, num_score_bins)
+      precision, recall = metrics.compute_precision_recall_from_histogram(
+          true_positives, false_positives, num_gt)
+      ap = metrics.compute_average_precision(precision, recall)
+      error_bound = metrics.compute_average_precision_error_bound(
+          true_positives, false_positives, num_gt)
+      self.assertLessEqual(ap, expected_ap + 1e-12)
+      self.assertLessEqual(expected_ap, ap + error_bound + 1e-12)
+      self.assertLess(error_bound, previous_error_bound)
+      previous_error_bound = error_bound
+
+  def test_compute_precision_recall_from_histogram_no_groundtruth(self):
+    precision, recall = metrics.compute_precision_recall_from_histogram(
+        np.zeros(10), np.ones(10), num_gt=0)
+    self.assertIsNone(precision)
+    self.assertIsNone(recall)
+
   def test_compute_recall_at_k(self):
     num_gt = 4
     tp_fp = [
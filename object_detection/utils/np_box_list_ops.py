@@ -161,7 +161,8 @@ def sort_by_field(boxlist, field, order=SortOrder.DESCEND):
 def non_max_suppression(boxlist,
                         max_output_size=10000,
                         iou_threshold=1.0,
-                        score_threshold=-10.0):
+                        score_threshold=-10.0,
+                        pre_nms_top_k=None):
   """Non maximum suppression.
 
   This op greedily selects a subset of detection bounding boxes, pruning
@@ -178,6 +179,8 @@ def non_max_suppression(boxlist,
                      less than this value. Default value is set to -10. A very
                      low threshold to pass pretty much all the boxes, unless
                      the user sets a different score threshold.
+    pre_nms_top_k: if set, only the pre_nms_top_k highest scoring boxes are
+                   considered for NMS.
 
   Returns:
     a BoxList holding M boxes where M <= max_output_size
@@ -198,6 +201,8 @@ def non_max_suppression(boxlist,
     return boxlist
 
   boxlist = sort_by_field(boxlist, 'scores')
+  if pre_nms_top_k is not None and boxlist.num_boxes() > pre_nms_top_k:
+    boxlist = gather(boxlist, np.arange(pre_nms_top_k))
 
   # Prevent further computation if NMS is disabled.
   if iou_threshold == 1.0:
@@ -207,33 +212,178 @@ def non_max_suppression(boxlist,
     else:
       return boxlist
 
+  selected_indices = _greedy_non_max_suppression(
+      boxlist.get(), iou_threshold, max_output_size)
+  return gather(boxlist, selected_indices)
+
+
+def _greedy_non_max_suppression(boxes, iou_threshold, max_output_size):
+  """Greedy NMS of boxes sorted by decreasing score.
+
+  Boxes are processed in windows of a few times max_output_size boxes, so
+  that a small max_output_size never touches most of the boxes. A window is
+  first pruned against the boxes selected in the previous windows with a
+  single IOU matrix, then `_greedy_non_max_suppression_in_window` selects its
+  boxes.
+
+  Args:
+    boxes: a numpy array with shape [N, 4], sorted by decreasing score.
+    iou_threshold: intersection over union threshold.
+    max_output_size: maximum number of retained boxes.
+
+  Returns:
+    a numpy int array with the sorted indices of the M <= max_output_size
+    selected boxes.
+  """
+  num_boxes = boxes.shape[0]
+  window_size = max(4 * max_output_size, 1024)
+  selected_indices = np.zeros(0, dtype=np.int64)
+  for start in range(0, num_boxes, window_size):
+    num_selected = selected_indices.size
+    if num_selected >= max_output_size:
+      break
+    window_indices = np.arange(start, min(start + window_size, num_boxes))
+    if num_selected:
+      max_iou = np.max(np_box_ops.iou(boxes[window_indices],
+                                      boxes[selected_indices]), axis=1)
+      window_indices = window_indices[max_iou <= iou_threshold]
+    window_selected = _greedy_non_max_suppression_in_window(
+        boxes[window_indices], iou_threshold, max_output_size - num_selected)
+    selected_indices = np.concatenate(
+        [selected_indices, window_indices[window_selected]])
+  return selected_indices
+
+
+def _greedy_non_max_suppression_in_window(boxes, iou_threshold,
+                                          max_output_size):
+  """Greedy NMS of a window of boxes sorted by decreasing score.
+
+  The remaining candidates are kept compacted in contiguous coordinate arrays:
+  the next selected box is always the first remaining one, and each selection
+  only computes the IOU with the candidates that survived the previous ones,
+  then drops the suppressed candidates.
+
+  Args:
+    boxes: a numpy array with shape [N, 4], sorted by decreasing score.
+    iou_threshold: intersection over union threshold.
+    max_output_size: maximum number of retained boxes.
+
+  Returns:
+    a numpy int array with the sorted indices of the M <= max_output_size
+    selected boxes.
+  """
+  remaining_indices = np.arange(boxes.shape[0])
+  y_min, x_min, y_max, x_max = [np.ascontiguousarray(boxes[:, i])
+                                for i in range(4)]
+  areas = np_box_ops.area(boxes)
+  selected_indices = []
+  while remaining_indices.size and len(selected_indices) < max_output_size:
+    selected_indices.append(remaining_indices[0])
+    if remaining_indices.size == 1:
+      break
+    intersect_heights = np.maximum(
+        np.minimum(y_max[1:], y_max[0]) - np.maximum(y_min[1:], y_min[0]),
+        0).astype(np.float64)
+    intersect_widths = np.maximum(
+        np.minimum(x_max[1:], x_max[0]) - np.maximum(x_min[1:], x_min[0]),
+        0).astype(np.float64)
+    intersect = intersect_heights * intersect_widths
+    with np.errstate(divide='ignore', invalid='ignore'):
+      is_kept = intersect / (areas[1:] + areas[0] - intersect) <= iou_threshold
+    remaining_indices = remaining_indices[1:][is_kept]
+    y_min, x_min = y_min[1:][is_kept], x_min[1:][is_kept]
+    y_max, x_max = y_max[1:][is_kept], x_max[1:][is_kept]
+    areas = areas[1:][is_kept]
+  return np.array(selected_indices, dtype=np.int64)
+
+
+def soft_non_max_suppression(boxlist,
+                             max_output_size=10000,
+                             iou_threshold=0.3,
+                             sigma=0.5,
+                             score_threshold=0.001,
+                             method='gaussian',
+                             pre_nms_top_k=None):
+  """Soft non maximum suppression (Bodla et al., 2017).
+
+  Instead of discarding the boxes overlapping a selected box, their scores are
+  decayed according to the overlap, and boxes whose score falls below
+  score_threshold are discarded.
+
+  Args:
+    boxlist: BoxList holding N boxes.  Must contain a 'scores' field
+      representing detection scores. All scores belong to the same class.
+    max_output_size: maximum number of retained boxes
+    iou_threshold: with the 'linear' method, only the scores of the boxes
+      overlapping a selected box by more than iou_threshold are decayed.
+    sigma: width of the gaussian decay of the 'gaussian' method.
+    score_threshold: boxes with a (decayed) score lower than this value are
+      discarded.
+    method: 'gaussian' to multiply scores by exp(-iou^2 / sigma) or 'linear'
+      to multiply them by (1 - iou).
+    pre_nms_top_k: if set, only the pre_nms_top_k highest scoring boxes are
+                   considered for NMS.
+
+  Returns:
+    a BoxList holding M boxes where M <= max_output_size, sorted by decreasing
+    decayed score, with the decayed scores in its 'scores' field.
+  Raises:
+    ValueError: if 'scores' field does not exist
+    ValueError: if threshold is not in [0, 1]
+    ValueError: if max_output_size < 0
+    ValueError: if method is not 'gaussian' or 'linear'
+  """
+  if not boxlist.has_field('scores'):
+    raise ValueError('Field scores does not exist')
+  if iou_threshold < 0. or iou_threshold > 1.0:
+    raise ValueError('IOU threshold must be in [0, 1]')
+  if max_output_size < 0:
+    raise ValueError('max_output_size must be bigger than 0.')
+  if method not in ('gaussian', 'linear'):
+    raise ValueError('method must be gaussian or linear')
+
+  boxlist = filter_scores_greater_than(boxlist, score_threshold)
+  if boxlist.num_boxes() == 0:
+    return boxlist
+  boxlist = sort_by_field(boxlist, 'scores')
+  if pre_nms_top_k is not None and boxlist.num_boxes() > pre_nms_top_k:
+    boxlist = gather(boxlist, np.arange(pre_nms_top_k))
+
   boxes = boxlist.get()
-  num_boxes = boxlist.num_boxes()
-  # is_index_valid is True only for all remaining valid boxes,
-  is_index_valid = np.full(num_boxes, 1, dtype=bool)
+  scores = boxlist.get_field('scores').astype(np.float64)
+  remaining_indices = np.arange(boxlist.num_boxes())
   selected_indices = []
-  num_output = 0
-  for i in range(num_boxes):
-    if num_output < max_output_size:
-      if is_index_valid[i]:
-        num_output += 1
-        selected_indices.append(i)
-        is_index_valid[i] = False
-        valid_indices = np.where(is_index_valid)[0]
-        if valid_indices.size == 0:
-          break
-
-        intersect_over_union = np_box_ops.iou(
-            np.expand_dims(boxes[i, :], axis=0), boxes[valid_indices, :])
-        intersect_over_union = np.squeeze(intersect_over_union, axis=0)
-        is_index_valid[valid_indices] = np.logical_and(
-            is_index_valid[valid_indices],
-            intersect_over_union <= iou_threshold)
-  return gather(boxlist, np.array(selected_indices))
+  while remaining_indices.size and len(selected_indices) < max_output_size:
+    best = np.argmax(scores[remaining_indices])
+    selected_index = remaining_indices[best]
+    selected_indices.append(selected_index)
+    remaining_indices = np.delete(remaining_indices, best)
+    if not remaining_indices.size:
+      break
+    intersect_over_union = np_box_ops.iou(
+        boxes[selected_index:selected_index + 1],
+        boxes[remaining_indices])[0]
+    if method == 'linear':
+      decay = np.where(intersect_over_union > iou_threshold,
+                       1. - intersect_over_union, 1.)
+    else:
+      decay = np.exp(-np.square(intersect_over_union) / sigma)
+    scores[remaining_indices] *= decay
+    remaining_indices = remaining_indices[
+        scores[remaining_indices] > score_threshold]
+
+  selected_indices = np.array(selected_indices, dtype=np.int64)
+  selected_boxes = gather(boxlist, selected_indices,
+                          fields=[field for field in boxlist.get_extra_fields()
+                                  if field != 'scores'])
+  selected_boxes.add_field(
+      'scores',
+      scores[selected_indices].astype(boxlist.get_field('scores').dtype))
+  return selected_boxes
 
 
 def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
-                                    max_output_size):
+                                    max_output_size, pre_nms_top_k=None):
   """Multi-class version of non maximum suppression.
 
   This op greedily selects a subset of detection bounding boxes, pruning
@@ -243,6 +393,9 @@ def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
   pruning boxes with score less than a provided threshold prior to
   applying NMS.
 
+  Candidates of all classes are thresholded at once, then each class sorts its
+  contiguous slice of candidates and runs the greedy NMS on it.
+
   Args:
     boxlist: BoxList holding N boxes.  Must contain a 'scores' field
       representing detection scores.  This scores field is a tensor that can
@@ -255,6 +408,8 @@ def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
     iou_thresh: scalar threshold for IOU (boxes that that high IOU overlap
       with previously selected boxes are removed).
     max_output_size: maximum number of retained boxes per class.
+    pre_nms_top_k: if set, only the pre_nms_top_k highest scoring boxes of
+      each class are considered for NMS.
 
   Returns:
     a BoxList holding M boxes with a rank-1 scores field representing
@@ -286,23 +441,38 @@ def multi_class_non_max_suppression(boxlist, score_thresh, iou_thresh,
   if num_boxes != num_scores:
     raise ValueError('Incorrect scores field length: actual vs expected.')
 
-  selected_boxes_list = []
+  # One candidate per (box, class) pair scoring above the threshold, grouped by
+  # class and in box order within each class.
+  class_indices, box_indices = np.nonzero(np.transpose(scores) > score_thresh)
+  candidate_scores = scores[box_indices, class_indices]
+  class_starts = np.searchsorted(class_indices, np.arange(num_classes + 1))
+
+  boxes = boxlist.get()
+  selected_candidates = []
   for class_idx in range(num_classes):
-    boxlist_and_class_scores = np_box_list.BoxList(boxlist.get())
-    class_scores = np.reshape(scores[0:num_scores, class_idx], [-1])
-    boxlist_and_class_scores.add_field('scores', class_scores)
-    boxlist_filt = filter_scores_greater_than(boxlist_and_class_scores,
-                                              score_thresh)
-    nms_result = non_max_suppression(boxlist_filt,
-                                     max_output_size=max_output_size,
-                                     iou_threshold=iou_thresh,
-                                     score_threshold=score_thresh)
-    nms_result.add_field(
-        'classes', np.zeros_like(nms_result.get_field('scores')) + class_idx)
-    selected_boxes_list.append(nms_result)
-  selected_boxes = concatenate(selected_boxes_list)
-  sorted_boxes = sort_by_field(selected_boxes, 'scores')
-  return sorted_boxes
+    start = class_starts[class_idx]
+    end = class_starts[class_idx + 1]
+    # Sorted by decreasing score as sort_by_field does, so that tied scores
+    # come in the same order as with non_max_suppression on the class.
+    class_order = start + np.argsort(candidate_scores[start:end])[::-1]
+    if pre_nms_top_k is not None:
+      class_order = class_order[:pre_nms_top_k]
+    if iou_thresh == 1.0:
+      class_selected = class_order[:max_output_size]
+    else:
+      class_selected = class_order[_greedy_non_max_suppression(
+          boxes[box_indices[class_order]], iou_thresh, max_output_size)]
+    selected_candidates.append(class_selected)
+  selected_candidates = np.concatenate(selected_candidates).astype(np.int64)
+
+  selected_boxes = np_box_list.BoxList(boxes[box_indices[selected_candidates]])
+  selected_scores = scores[box_indices[selected_candidates],
+                           class_indices[selected_candidates]]
+  selected_boxes.add_field('scores', selected_scores)
+  selected_boxes.add_field(
+      'classes',
+      np.zeros_like(selected_scores) + class_indices[selected_candidates])
+  return sort_by_field(selected_boxes, 'scores')
 
 
 def scale(boxlist, y_scale, x_scale):
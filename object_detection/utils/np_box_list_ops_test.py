@@ -20,6 +20,7 @@ import tensorflow as tf
 
 from object_detection.utils import np_box_list
 from object_detection.utils import np_box_list_ops
+from object_detection.utils import np_box_ops
 
 
 class AreaRelatedTest(tf.test.TestCase):
@@ -409,6 +410,115 @@ class NonMaximumSuppressionTest(tf.test.TestCase):
     self.assertAllClose(classes_clean, expected_classes)
     self.assertAllClose(boxes, expected_boxes)
 
+  def test_select_with_pre_nms_top_k(self):
+    boxlist = np_box_list.BoxList(self._boxes)
+    boxlist.add_field('scores',
+                      np.array([.9, .75, .6, .95, .2, .3], dtype=float))
+    expected_boxes = np.array([[0, 10, 1, 11], [0, 0, 1, 1]], dtype=float)
+    nms_boxlist = np_box_list_ops.non_max_suppression(
+        boxlist, max_output_size=3, iou_threshold=0.5, pre_nms_top_k=3)
+    self.assertAllClose(nms_boxlist.get(), expected_boxes)
+
+  def test_nms_matches_exhaustive_greedy_selection(self):
+    np.random.seed(0)
+    num_boxes = 3000
+    corners = np.random.uniform(0, 0.9, (num_boxes, 2))
+    sizes = np.random.uniform(0.01, 0.1, (num_boxes, 2))
+    boxes = np.concatenate([corners, corners + sizes], axis=1)
+    scores = np.random.uniform(size=num_boxes)
+    boxlist = np_box_list.BoxList(boxes)
+    boxlist.add_field('scores', scores)
+
+    iou_threshold = 0.3
+    sorted_indices = np.argsort(-scores)
+    pairwise_iou = np_box_ops.iou(boxes[sorted_indices], boxes[sorted_indices])
+    is_suppressed = np.zeros(num_boxes, dtype=bool)
+    expected_indices = []
+    for i in range(num_boxes):
+      if not is_suppressed[i]:
+        expected_indices.append(sorted_indices[i])
+        is_suppressed |= pairwise_iou[i] > iou_threshold
+
+    for max_output_size in [10, 300, num_boxes]:
+      nms_boxlist = np_box_list_ops.non_max_suppression(
+          boxlist, max_output_size, iou_threshold)
+      self.assertAllClose(nms_boxlist.get(),
+                          boxes[expected_indices[:max_output_size]])
+
+  def test_soft_nms_linear(self):
+    boxes = np.array([[0, 0, 1, 1], [0, 0, 1, 0.5], [0, 10, 1, 11]],
+                     dtype=float)
+    boxlist = np_box_list.BoxList(boxes)
+    boxlist.add_field('scores', np.array([0.9, 0.8, 0.7]))
+    nms_boxlist = np_box_list_ops.soft_non_max_suppression(
+        boxlist, iou_threshold=0.3, method='linear')
+    # The second box overlaps the first one with an IOU of 0.5, so its score
+    # is decayed to 0.8 * (1 - 0.5) and it falls after the third box.
+    self.assertAllClose(nms_boxlist.get(),
+                        [[0, 0, 1, 1], [0, 10, 1, 11], [0, 0, 1, 0.5]])
+    self.assertAllClose(nms_boxlist.get_field('scores'), [0.9, 0.7, 0.4])
+
+  def test_soft_nms_gaussian_discards_low_scores(self):
+    boxes = np.array(3 * [[0, 0, 1, 1]], dtype=float)
+    boxlist = np_box_list.BoxList(boxes)
+    boxlist.add_field('scores', np.array([0.9, 0.8, 0.7]))
+    nms_boxlist = np_box_list_ops.soft_non_max_suppression(
+        boxlist, sigma=0.5, score_threshold=0.1)
+    # Identical boxes are decayed by exp(-2) at each selection.
+    self.assertAllClose(nms_boxlist.get_field('scores'),
+                        [0.9, 0.8 * np.exp(-2.)])
+
+  def test_soft_nms_with_invalid_method(self):
+    boxlist = np_box_list.BoxList(self._boxes)
+    boxlist.add_field('scores', np.ones(6))
+    with self.assertRaises(ValueError):
+      np_box_list_ops.soft_non_max_suppression(boxlist, method='cubic')
+
+  def test_multiclass_nms_with_pre_nms_top_k(self):
+    boxlist = np_box_list.BoxList(
+        np.array([[0, 0, 1, 1], [0, 10, 1, 11], [0, 20, 1, 21]],
+                 dtype=np.float32))
+    boxlist.add_field('scores', np.array([[0.9, 0.1],
+                                          [0.8, 0.7],
+                                          [0.7, 0.6]], dtype=np.float32))
+    boxlist_clean = np_box_list_ops.multi_class_non_max_suppression(
+        boxlist, score_thresh=0.5, iou_thresh=0.5, max_output_size=3,
+        pre_nms_top_k=1)
+    self.assertAllClose(boxlist_clean.get_field('scores'), [0.9, 0.7])
+    self.assertAllClose(boxlist_clean.get_field('classes'), [0, 1])
+
+  def test_multiclass_nms_keeps_order_of_tied_scores(self):
+    boxes = np.array([[0, 0, 1, 1], [0, 10, 1, 11], [0, 20, 1, 21],
+                      [0, 0, 1, 1.1]], dtype=np.float32)
+    scores = np.array([[0.5, 0.9],
+                       [0.5, 0.3],
+                       [0.7, 0.3],
+                       [0.5, 0.3]], dtype=np.float32)
+    boxlist = np_box_list.BoxList(boxes)
+    boxlist.add_field('scores', scores)
+    boxlist_clean = np_box_list_ops.multi_class_non_max_suppression(
+        boxlist, score_thresh=0.1, iou_thresh=0.5, max_output_size=10)
+
+    # Same as non_max_suppression on each class: among tied scores the box
+    # with the higher index comes first, and suppresses the overlapping one.
+    expected_boxlists = []
+    for class_idx in range(2):
+      class_boxlist = np_box_list.BoxList(boxes)
+      class_boxlist.add_field('scores', scores[:, class_idx])
+      class_boxlist = np_box_list_ops.non_max_suppression(
+          class_boxlist, max_output_size=10, iou_threshold=0.5)
+      class_boxlist.add_field(
+          'classes', np.full(class_boxlist.num_boxes(), class_idx, float))
+      expected_boxlists.append(class_boxlist)
+    expected_boxlist = np_box_list_ops.sort_by_field(
+        np_box_list_ops.concatenate(expected_boxlists), 'scores')
+    self.assertAllClose(boxlist_clean.get(), expected_boxlist.get())
+    self.assertAllClose(boxlist_clean.get_field('classes'),
+                        expected_boxlist.get_field('classes'))
+    self.assertAllClose(
+        boxlist_clean.get()[:4],
+        [[0, 0, 1, 1], [0, 20, 1, 21], [0, 10, 1, 11], [0, 0, 1, 1.1]])
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -60,6 +60,28 @@ def intersection(boxes1, boxes2):
   return intersect_heights * intersect_widths
 
 
+def paired_intersection(boxes1, boxes2):
+  """Computes the intersection areas between boxes1[i] and boxes2[i].
+
+  Args:
+    boxes1: a numpy array with shape [N, 4] holding N boxes
+    boxes2: a numpy array with shape [N, 4] holding N boxes
+
+  Returns:
+    a numpy array with shape [N] representing the intersection area of each
+    pair of boxes, equal to the diagonal of intersection(boxes1, boxes2)
+  """
+  intersect_heights = np.maximum(
+      np.zeros(boxes1.shape[0]),
+      np.minimum(boxes1[:, 2], boxes2[:, 2]) -
+      np.maximum(boxes1[:, 0], boxes2[:, 0]))
+  intersect_widths = np.maximum(
+      np.zeros(boxes1.shape[0]),
+      np.minimum(boxes1[:, 3], boxes2[:, 3]) -
+      np.maximum(boxes1[:, 1], boxes2[:, 1]))
+  return intersect_heights * intersect_widths
+
+
 def iou(boxes1, boxes2):
   """Computes pairwise intersection-over-union between box collections.
 
@@ -43,6 +43,12 @@ class BoxOpsTests(tf.test.TestCase):
                                      dtype=float)
     self.assertAllClose(intersection, expected_intersection)
 
+  def testPairedIntersection(self):
+    intersection = np_box_ops.paired_intersection(self.boxes1,
+                                                  self.boxes2[[0, 2]])
+    expected_intersection = np.array([2.0, 5.0], dtype=float)
+    self.assertAllClose(intersection, expected_intersection)
+
   def testIOU(self):
     iou = np_box_ops.iou(self.boxes1, self.boxes2)
     expected_iou = np.array([[2.0 / 16.0, 0.0, 6.0 / 400.0],
@@ -18,11 +18,20 @@
 Example mask operations that are supported:
   * Areas: compute mask areas
   * IOU: pairwise intersection-over-union scores
+
+Pairwise intersections are computed on masks packed into bit arrays, 64 pixels
+per word, and only within the extent of each mask, so that pairs of
+masks whose extents do not overlap are never compared.
 """
 import numpy as np
 
 EPSILON = 1e-7
 
+# Number of bits set in each byte value.
+_POPCOUNT = np.unpackbits(
+    np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(
+        axis=1).astype(np.uint8)
+
 
 def area(masks):
   """Computes area of masks.
@@ -61,13 +70,79 @@ def intersection(masks1, masks2):
     raise ValueError('masks1 and masks2 should be of type np.uint8')
   n = masks1.shape[0]
   m = masks2.shape[0]
+  if n == 0 or m == 0:
+    return np.zeros([n, m], dtype=np.float32)
+  # The loop below runs once per mask of the smaller collection.
+  if n > m:
+    return intersection(masks2, masks1).T
+  words1, extents1 = pack_masks(masks1)
+  words2, extents2 = pack_masks(masks2)
+  overlaps = _extents_overlap(extents1, extents2)
   answer = np.zeros([n, m], dtype=np.float32)
-  for i in np.arange(n):
-    for j in np.arange(m):
-      answer[i, j] = np.sum(np.minimum(masks1[i], masks2[j]), dtype=np.float32)
+  for i in np.nonzero(np.any(overlaps, axis=1))[0]:
+    indices = np.nonzero(overlaps[i])[0]
+    y_min, x_min, y_max, x_max = extents1[i]
+    # masks1[i] is empty outside of its extent, so the intersection only needs
+    # to be counted within it.
+    answer[i, indices] = _popcount(np.bitwise_and(
+        words2[indices, y_min:y_max, x_min:x_max],
+        words1[i, y_min:y_max, x_min:x_max]))
   return answer
 
 
+def pack_masks(masks):
+  """Packs masks into bit arrays and computes their extents.
+
+  Args:
+    masks: a numpy array with shape [N, height, width] holding N masks. Masks
+      values are of type np.uint8 and values are in {0,1}.
+
+  Returns:
+    words: a np.uint64 numpy array with shape [N, height, ceil(width / 64)]
+      holding the masks with 64 pixels per word.
+    extents: a np.int64 numpy array with shape [N, 4] holding the smallest
+      [y_min, x_min, y_max, x_max) window of `words`, with x in words, outside
+      of which each mask is empty. The extents of empty masks are all zeros.
+  """
+  bits = np.packbits(masks, axis=2)
+  padding = -bits.shape[2] % 8
+  if padding:
+    bits = np.pad(bits, [(0, 0), (0, 0), (0, padding)], 'constant')
+  words = bits.view(np.uint64)
+  rows = np.any(words, axis=2)
+  columns = np.bitwise_or.reduce(words, axis=1) != 0
+  extents = np.stack([_first_true(rows), _first_true(columns),
+                      _end_true(rows), _end_true(columns)], axis=1)
+  extents[~np.any(rows, axis=1)] = 0
+  return words, extents
+
+
+def _popcount(words):
+  """Counts the bits set in each [height, width] slice of a [K, h, w] array."""
+  if hasattr(np, 'bitwise_count'):
+    return np.sum(np.bitwise_count(words), axis=(1, 2))
+  return np.sum(_POPCOUNT[words.view(np.uint8)], axis=(1, 2))
+
+
+def _first_true(array):
+  """Returns the index of the first True value of each row of array."""
+  return np.argmax(array, axis=1)
+
+
+def _end_true(array):
+  """Returns one past the index of the last True value of each row of array."""
+  return array.shape[1] - np.argmax(array[:, ::-1], axis=1)
+
+
+def _extents_overlap(extents1, extents2):
+  """Returns a [N, M] boolean array telling which pairs of extents overlap."""
+  y_min = np.maximum(extents1[:, np.newaxis, 0], extents2[np.newaxis, :, 0])
+  x_min = np.maximum(extents1[:, np.newaxis, 1], extents2[np.newaxis, :, 1])
+  y_max = np.minimum(extents1[:, np.newaxis, 2], extents2[np.newaxis, :, 2])
+  x_max = np.minimum(extents1[:, np.newaxis, 3], extents2[np.newaxis, :, 3])
+  return np.logical_and(y_min < y_max, x_min < x_max)
+
+
 def iou(masks1, masks2):
   """Computes pairwise intersection-over-union between mask collections.
 
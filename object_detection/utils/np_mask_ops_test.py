@@ -83,6 +83,66 @@ class MaskOpsTests(tf.test.TestCase):
                               dtype=np.float32)
     self.assertAllClose(ioa21, expected_ioa21)
 
+  def testPackMasks(self):
+    masks = np.zeros([2, 3, 70], dtype=np.uint8)
+    masks[0, 1, 65] = 1
+    words, extents = np_mask_ops.pack_masks(masks)
+    self.assertEqual(words.shape, (2, 3, 2))
+    self.assertAllEqual(extents, [[1, 1, 2, 2], [0, 0, 0, 0]])
+
+  def testIntersectionWithEmptyCollection(self):
+    intersection = np_mask_ops.intersection(
+        self.masks1, np.zeros([0, 5, 8], dtype=np.uint8))
+    self.assertEqual(intersection.shape, (2, 0))
+
+
+class MaskOpsEquivalenceTests(tf.test.TestCase):
+  """Compares the packed mask operations with pixelwise computations."""
+
+  def _random_masks(self, num_masks, height, width):
+    masks = np.zeros([num_masks, height, width], dtype=np.uint8)
+    for mask in masks[1:]:
+      y_min, y_max = np.sort(np.random.randint(0, height + 1, 2))
+      x_min, x_max = np.sort(np.random.randint(0, width + 1, 2))
+      mask[y_min:y_max, x_min:x_max] = np.random.randint(
+          0, 2, [y_max - y_min, x_max - x_min])
+    return masks
+
+  def _reference_intersection(self, masks1, masks2):
+    answer = np.zeros([masks1.shape[0], masks2.shape[0]], dtype=np.float32)
+    for i in range(masks1.shape[0]):
+      for j in range(masks2.shape[0]):
+        answer[i, j] = np.sum(np.minimum(masks1[i], masks2[j]),
+                              dtype=np.float32)
+    return answer
+
+  def testMatchesPixelwiseComputations(self):
+    np.random.seed(0)
+    for num_masks1, num_masks2, height, width in [(7, 5, 40, 150),
+                                                  (4, 9, 33, 64),
+                                                  (6, 6, 20, 5)]:
+      masks1 = self._random_masks(num_masks1, height, width)
+      masks2 = self._random_masks(num_masks2, height, width)
+      intersection = self._reference_intersection(masks1, masks2)
+      area1 = np.sum(masks1, axis=(1, 2), dtype=np.float32)
+      area2 = np.sum(masks2, axis=(1, 2), dtype=np.float32)
+      union = area1[:, np.newaxis] + area2[np.newaxis, :] - intersection
+      self.assertAllEqual(np_mask_ops.intersection(masks1, masks2),
+                          intersection)
+      self.assertAllClose(np_mask_ops.iou(masks1, masks2),
+                          intersection / np.maximum(union, np_mask_ops.EPSILON))
+      self.assertAllClose(np_mask_ops.ioa(masks1, masks2),
+                          intersection / (area2 + np_mask_ops.EPSILON))
+
+  def testPopcount(self):
+    words = np.random.randint(0, 2**63, [3, 4, 5], dtype=np.int64).view(
+        np.uint64)
+    expected_counts = np.sum(
+        np.unpackbits(words.view(np.uint8), axis=2), axis=(1, 2))
+    self.assertAllEqual(np.sum(np_mask_ops._POPCOUNT[words.view(np.uint8)],
+                               axis=(1, 2)), expected_counts)
+    self.assertAllEqual(np_mask_ops._popcount(words), expected_counts)
+
 
 if __name__ == '__main__':
   tf.test.main()
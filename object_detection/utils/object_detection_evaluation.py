@@ -30,7 +30,9 @@ Note: This module operates on numpy boxes and box lists.
 from abc import ABCMeta
 from abc import abstractmethod
 import collections
+import copy
 import logging
+import multiprocessing
 import unicodedata
 import numpy as np
 import tensorflow as tf
@@ -131,7 +133,8 @@ class ObjectDetectionEvaluator(DetectionEvaluator):
                metric_prefix=None,
                use_weighted_mean_ap=False,
                evaluate_masks=False,
-               group_of_weight=0.0):
+               group_of_weight=0.0,
+               num_score_bins=None):
     """Constructor.
 
     Args:
@@ -157,6 +160,9 @@ class ObjectDetectionEvaluator(DetectionEvaluator):
         matching_iou_threshold, weight group_of_weight is added to true
         positives. Consequently, if no detection falls within a group-of box,
         weight group_of_weight is added to false negatives.
+      num_score_bins: (optional) if set, average precisions are computed in
+        constant memory from histograms of num_score_bins score bins, see
+        ObjectDetectionEvaluation.
 
     Raises:
       ValueError: If the category ids are not 1-indexed.
@@ -170,12 +176,14 @@ class ObjectDetectionEvaluator(DetectionEvaluator):
     self._label_id_offset = 1
     self._evaluate_masks = evaluate_masks
     self._group_of_weight = group_of_weight
+    self._num_score_bins = num_score_bins
     self._evaluation = ObjectDetectionEvaluation(
         num_groundtruth_classes=self._num_classes,
         matching_iou_threshold=self._matching_iou_threshold,
         use_weighted_mean_ap=self._use_weighted_mean_ap,
         label_id_offset=self._label_id_offset,
-        group_of_weight=self._group_of_weight)
+        group_of_weight=self._group_of_weight,
+        num_score_bins=self._num_score_bins)
     self._image_ids = set([])
     self._evaluate_corlocs = evaluate_corlocs
     self._evaluate_precision_recall = evaluate_precision_recall
@@ -386,9 +394,46 @@ class ObjectDetectionEvaluator(DetectionEvaluator):
         num_groundtruth_classes=self._num_classes,
         matching_iou_threshold=self._matching_iou_threshold,
         use_weighted_mean_ap=self._use_weighted_mean_ap,
-        label_id_offset=self._label_id_offset)
+        label_id_offset=self._label_id_offset,
+        group_of_weight=self._group_of_weight,
+        num_score_bins=self._num_score_bins)
     self._image_ids.clear()
 
+  def get_state(self):
+    """Returns the picklable state of the evaluator, see `merge_state`."""
+    return {
+        'image_ids': list(self._image_ids),
+        'evaluation': self._evaluation.get_state(),
+    }
+
+  def merge_state(self, state):
+    """Merges the state of an evaluator with the same categories.
+
+    Args:
+      state: a dictionary returned by `get_state`.
+
+    Raises:
+      ValueError: if an image was added to both evaluators.
+    """
+    duplicate_ids = self._image_ids.intersection(state['image_ids'])
+    if duplicate_ids:
+      raise ValueError('Images with ids {} added to both evaluators.'.format(
+          sorted(duplicate_ids)[:10]))
+    self._evaluation.merge_state(state['evaluation'])
+    self._image_ids.update(state['image_ids'])
+
+  def merge(self, other):
+    """Merges another evaluator with the same categories into this one.
+
+    The images of `other` are considered added after the images of this
+    evaluator, so that evaluators of consecutive chunks of images merged in
+    order return the same metrics as a single evaluator.
+
+    Args:
+      other: an evaluator of the same class.
+    """
+    self.merge_state(other.get_state())
+
   def get_estimator_eval_metric_ops(self, eval_dict):
     """Returns dict of metrics to use with `tf.estimator.EstimatorSpec`.
 
@@ -759,6 +804,97 @@ class OpenImagesDetectionChallengeEvaluator(OpenImagesDetectionEvaluator):
     super(OpenImagesDetectionChallengeEvaluator, self).clear()
     self._evaluatable_labels.clear()
 
+  def get_state(self):
+    """Returns the picklable state of the evaluator, see `merge_state`."""
+    state = super(OpenImagesDetectionChallengeEvaluator, self).get_state()
+    state['evaluatable_labels'] = dict(self._evaluatable_labels)
+    return state
+
+  def merge_state(self, state):
+    """Merges the state of an evaluator with the same categories.
+
+    Args:
+      state: a dictionary returned by `get_state`.
+    """
+    super(OpenImagesDetectionChallengeEvaluator, self).merge_state(state)
+    self._evaluatable_labels.update(state['evaluatable_labels'])
+
+
+def _evaluate_chunk(evaluator, examples):
+  """Adds a chunk of images to an empty evaluator and returns its state."""
+  for image_id, groundtruth_dict, detections_dict in examples:
+    evaluator.add_single_ground_truth_image_info(image_id, groundtruth_dict)
+    evaluator.add_single_detected_image_info(image_id, detections_dict)
+  return evaluator.get_state()
+
+
+def _iterate_chunks(iterable, chunk_size):
+  """Yields lists of chunk_size consecutive elements of iterable."""
+  chunk = []
+  for element in iterable:
+    chunk.append(element)
+    if len(chunk) == chunk_size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+
+def add_images_in_parallel(evaluator, examples, num_workers=None,
+                           images_per_chunk=1000, max_pending_chunks=None):
+  """Adds the groundtruth and detections of many images with a process pool.
+
+  The images are split in chunks of consecutive images. Each chunk is added to
+  a copy of `evaluator` in a worker process, which sends back the state of its
+  copy, and the states are merged into `evaluator` in the order of the
+  chunks. The groundtruth and detections of an image are thus always matched
+  by the same worker, and `evaluator.evaluate()` returns the same metrics as
+  if all the images had been added to it one at a time.
+
+  Example usage:
+    examples = ((image_id, groundtruth_dict, detections_dict)
+                for image_id in image_ids)
+    add_images_in_parallel(evaluator, examples, num_workers=16)
+    metrics = evaluator.evaluate()
+
+  Args:
+    evaluator: an ObjectDetectionEvaluator, which must be picklable.
+    examples: an iterable of (image_id, groundtruth_dict, detections_dict)
+      tuples, see `add_single_ground_truth_image_info` and
+      `add_single_detected_image_info` of the evaluator.
+    num_workers: number of worker processes, defaults to the number of CPUs.
+    images_per_chunk: number of images sent to a worker at once.
+    max_pending_chunks: maximum number of chunks read from `examples` and not
+      merged yet, to bound the memory used. Defaults to twice num_workers.
+
+  Returns:
+    evaluator, with all the images added.
+  """
+  num_workers = num_workers or multiprocessing.cpu_count()
+  max_pending_chunks = max_pending_chunks or 2 * num_workers
+  evaluator_template = copy.deepcopy(evaluator)
+  evaluator_template.clear()
+  pool = multiprocessing.Pool(num_workers)
+  try:
+    pending_chunks = collections.deque()
+    for chunk in _iterate_chunks(examples, images_per_chunk):
+      if len(pending_chunks) >= max_pending_chunks:
+        evaluator.merge_state(pending_chunks.popleft().get())
+      pending_chunks.append(
+          pool.apply_async(_evaluate_chunk, (evaluator_template, chunk)))
+    while pending_chunks:
+      evaluator.merge_state(pending_chunks.popleft().get())
+  finally:
+    pool.terminate()
+  return evaluator
+
+
+def _concatenate_or_empty(arrays, dtype):
+  """Concatenates a list of numpy arrays, which may be empty."""
+  if not arrays:
+    return np.array([], dtype=dtype)
+  return np.concatenate(arrays)
+
 
 ObjectDetectionEvalMetrics = collections.namedtuple(
     'ObjectDetectionEvalMetrics', [
@@ -778,7 +914,8 @@ class ObjectDetectionEvaluation(object):
                use_weighted_mean_ap=False,
                label_id_offset=0,
                group_of_weight=0.0,
-               per_image_eval_class=per_image_evaluation.PerImageEvaluation):
+               per_image_eval_class=per_image_evaluation.PerImageEvaluation,
+               num_score_bins=None):
     """Constructor.
 
     Args:
@@ -800,6 +937,13 @@ class ObjectDetectionEvaluation(object):
         weight group_of_weight is added to false negatives.
       per_image_eval_class: The class that contains functions for computing
         per image metrics.
+      num_score_bins: (optional) if set, the scores and tp/fp labels of the
+        detections are not kept but accumulated in histograms of num_score_bins
+        bins of scores in [0, 1], so that the memory used does not grow with
+        the number of detections. The average precisions are then computed
+        with scores rounded down to a resolution of 1 / num_score_bins and are
+        within `average_precision_error_bound_per_class` of the exact ones,
+        see `metrics.compute_average_precision_error_bound`.
 
     Raises:
       ValueError: if num_groundtruth_classes is smaller than 1.
@@ -817,6 +961,7 @@ class ObjectDetectionEvaluation(object):
     self.num_class = num_groundtruth_classes
     self.use_weighted_mean_ap = use_weighted_mean_ap
     self.label_id_offset = label_id_offset
+    self.num_score_bins = num_score_bins
 
     self.groundtruth_boxes = {}
     self.groundtruth_class_labels = {}
@@ -833,6 +978,12 @@ class ObjectDetectionEvaluation(object):
     self.detection_keys = set()
     self.scores_per_class = [[] for _ in range(self.num_class)]
     self.tp_fp_labels_per_class = [[] for _ in range(self.num_class)]
+    if self.num_score_bins:
+      self.true_positives_per_class = np.zeros(
+          [self.num_class, self.num_score_bins], dtype=float)
+      self.false_positives_per_class = np.zeros(
+          [self.num_class, self.num_score_bins], dtype=float)
+    self.average_precision_error_bound_per_class = np.zeros(self.num_class)
     self.num_images_correctly_detected_per_class = np.zeros(self.num_class)
     self.average_precision_per_class = np.empty(self.num_class, dtype=float)
     self.average_precision_per_class.fill(np.nan)
@@ -965,11 +1116,132 @@ class ObjectDetectionEvaluation(object):
 
     for i in range(self.num_class):
       if scores[i].shape[0] > 0:
-        self.scores_per_class[i].append(scores[i])
-        self.tp_fp_labels_per_class[i].append(tp_fp_labels[i])
+        if self.num_score_bins:
+          true_positives, false_positives = metrics.compute_score_histogram(
+              scores[i], tp_fp_labels[i], self.num_score_bins)
+          self.true_positives_per_class[i] += true_positives
+          self.false_positives_per_class[i] += false_positives
+        else:
+          self.scores_per_class[i].append(scores[i])
+          self.tp_fp_labels_per_class[i].append(tp_fp_labels[i])
     (self.num_images_correctly_detected_per_class
     ) += is_class_correctly_detected_in_image
 
+  def get_state(self):
+    """Returns the accumulated state of the evaluation.
+
+    Images whose detections were added are summarized by the per-class
+    counters and the per-class scores and tp/fp labels, while the groundtruth
+    of images still waiting for their detections is kept as is. The state
+    only holds numpy arrays, lists and dicts so that it can be pickled, e.g.
+    to be sent back by a worker process, and merged with `merge_state`.
+
+    Returns:
+      A dictionary with the following keys -
+        'num_gt_instances_per_class': float numpy array of length num_class.
+        'num_gt_imgs_per_class': integer numpy array of length num_class.
+        'num_images_correctly_detected_per_class': numpy array of length
+          num_class.
+        'scores_per_class': list of num_class float numpy arrays holding the
+          scores of the detections of each class.
+        'tp_fp_labels_per_class': list of num_class numpy arrays holding the
+          tp/fp labels of the detections of each class.
+        'detection_keys': list of the keys of the images with detections.
+        'pending_groundtruth': dictionary mapping the keys of the images
+          without detections to a tuple of their groundtruth boxes, class
+          labels, masks, is_difficult and is_group_of lists.
+      and, if num_score_bins is set -
+        'true_positives_per_class': float numpy array of shape
+          [num_class, num_score_bins].
+        'false_positives_per_class': float numpy array of shape
+          [num_class, num_score_bins].
+    """
+    pending_groundtruth = {}
+    for image_key in self.groundtruth_boxes:
+      if image_key not in self.detection_keys:
+        pending_groundtruth[image_key] = (
+            self.groundtruth_boxes[image_key],
+            self.groundtruth_class_labels[image_key],
+            self.groundtruth_masks.get(image_key),
+            self.groundtruth_is_difficult_list[image_key],
+            self.groundtruth_is_group_of_list[image_key])
+    state = {
+        'num_gt_instances_per_class': self.num_gt_instances_per_class.copy(),
+        'num_gt_imgs_per_class': self.num_gt_imgs_per_class.copy(),
+        'num_images_correctly_detected_per_class':
+            self.num_images_correctly_detected_per_class.copy(),
+        'scores_per_class': [
+            _concatenate_or_empty(scores, dtype=float)
+            for scores in self.scores_per_class],
+        'tp_fp_labels_per_class': [
+            _concatenate_or_empty(tp_fp_labels, dtype=bool)
+            for tp_fp_labels in self.tp_fp_labels_per_class],
+        'detection_keys': list(self.detection_keys),
+        'pending_groundtruth': pending_groundtruth,
+    }
+    if self.num_score_bins:
+      state['true_positives_per_class'] = self.true_positives_per_class.copy()
+      state['false_positives_per_class'] = (
+          self.false_positives_per_class.copy())
+    return state
+
+  def merge_state(self, state):
+    """Merges the state of another evaluation into this one.
+
+    The scores and tp/fp labels of `state` are appended after the ones of this
+    evaluation. Merging the states of evaluations of consecutive chunks of
+    images in order thus gives the same metrics as adding all the images to a
+    single evaluation.
+
+    Args:
+      state: a dictionary returned by `get_state` of an evaluation with the
+        same number of classes.
+
+    Raises:
+      ValueError: if the number of classes or of score bins differ or if the
+        detections of an image were added to both evaluations.
+    """
+    if len(state['scores_per_class']) != self.num_class:
+      raise ValueError('Cannot merge evaluations with {} and {} classes.'.format(
+          self.num_class, len(state['scores_per_class'])))
+    if self.num_score_bins and (
+        'true_positives_per_class' not in state or
+        state['true_positives_per_class'].shape[1] != self.num_score_bins):
+      raise ValueError('Cannot merge evaluations with different score bins.')
+    duplicate_keys = self.detection_keys.intersection(state['detection_keys'])
+    if duplicate_keys:
+      raise ValueError('Detections of images {} were added to both '
+                       'evaluations.'.format(sorted(duplicate_keys)[:10]))
+
+    self.num_gt_instances_per_class += state['num_gt_instances_per_class']
+    self.num_gt_imgs_per_class += state['num_gt_imgs_per_class']
+    self.num_images_correctly_detected_per_class += state[
+        'num_images_correctly_detected_per_class']
+    for class_index in range(self.num_class):
+      if state['scores_per_class'][class_index].shape[0] > 0:
+        self.scores_per_class[class_index].append(
+            state['scores_per_class'][class_index])
+        self.tp_fp_labels_per_class[class_index].append(
+            state['tp_fp_labels_per_class'][class_index])
+    if self.num_score_bins:
+      self.true_positives_per_class += state['true_positives_per_class']
+      self.false_positives_per_class += state['false_positives_per_class']
+    self.detection_keys.update(state['detection_keys'])
+    for image_key, groundtruth in state['pending_groundtruth'].items():
+      (self.groundtruth_boxes[image_key],
+       self.groundtruth_class_labels[image_key],
+       self.groundtruth_masks[image_key],
+       self.groundtruth_is_difficult_list[image_key],
+       self.groundtruth_is_group_of_list[image_key]) = groundtruth
+
+  def merge(self, other):
+    """Merges another ObjectDetectionEvaluation into this one.
+
+    Args:
+      other: an ObjectDetectionEvaluation, see `merge_state`.
+    """
+    self.merge_state(other.get_state())
+
   def _update_ground_truth_statistics(self, groundtruth_class_labels,
                                       groundtruth_is_difficult_list,
                                       groundtruth_is_group_of_list):
@@ -1019,9 +1291,11 @@ class ObjectDetectionEvaluation(object):
           np.squeeze(np.argwhere(self.num_gt_instances_per_class == 0)) +
           self.label_id_offset)
 
-    if self.use_weighted_mean_ap:
-      all_scores = np.array([], dtype=float)
-      all_tp_fp_labels = np.array([], dtype=bool)
+    if self.num_score_bins:
+      return self._evaluate_histograms()
+
+    all_scores = []
+    all_tp_fp_labels = []
     for class_index in range(self.num_class):
       if self.num_gt_instances_per_class[class_index] == 0:
         continue
@@ -1032,8 +1306,8 @@ class ObjectDetectionEvaluation(object):
         scores = np.concatenate(self.scores_per_class[class_index])
         tp_fp_labels = np.concatenate(self.tp_fp_labels_per_class[class_index])
       if self.use_weighted_mean_ap:
-        all_scores = np.append(all_scores, scores)
-        all_tp_fp_labels = np.append(all_tp_fp_labels, tp_fp_labels)
+        all_scores.append(scores)
+        all_tp_fp_labels.append(tp_fp_labels)
       precision, recall = metrics.compute_precision_recall(
           scores, tp_fp_labels, self.num_gt_instances_per_class[class_index])
 
@@ -1050,7 +1324,55 @@ class ObjectDetectionEvaluation(object):
     if self.use_weighted_mean_ap:
       num_gt_instances = np.sum(self.num_gt_instances_per_class)
       precision, recall = metrics.compute_precision_recall(
-          all_scores, all_tp_fp_labels, num_gt_instances)
+          _concatenate_or_empty(all_scores, dtype=float),
+          _concatenate_or_empty(all_tp_fp_labels, dtype=bool),
+          num_gt_instances)
+      mean_ap = metrics.compute_average_precision(precision, recall)
+    else:
+      mean_ap = np.nanmean(self.average_precision_per_class)
+    mean_corloc = np.nanmean(self.corloc_per_class)
+    return ObjectDetectionEvalMetrics(
+        self.average_precision_per_class, mean_ap, self.precisions_per_class,
+        self.recalls_per_class, self.corloc_per_class, mean_corloc)
+
+  def _evaluate_histograms(self):
+    """Computes the evaluation result from the score histograms.
+
+    Returns:
+      An ObjectDetectionEvalMetrics, see `evaluate`. The precisions and recalls
+      are computed at the end of each non-empty score bin.
+    """
+    for class_index in range(self.num_class):
+      num_gt_instances = self.num_gt_instances_per_class[class_index]
+      if num_gt_instances == 0:
+        continue
+      true_positives = self.true_positives_per_class[class_index]
+      false_positives = self.false_positives_per_class[class_index]
+      precision, recall = metrics.compute_precision_recall_from_histogram(
+          true_positives, false_positives, num_gt_instances)
+      self.precisions_per_class[class_index] = precision
+      self.recalls_per_class[class_index] = recall
+      average_precision = metrics.compute_average_precision(precision, recall)
+      self.average_precision_per_class[class_index] = average_precision
+      self.average_precision_error_bound_per_class[class_index] = (
+          metrics.compute_average_precision_error_bound(
+              true_positives, false_positives, num_gt_instances))
+      logging.info('average_precision: %f (error bound %f)', average_precision,
+                   self.average_precision_error_bound_per_class[class_index])
+
+    self.corloc_per_class = metrics.compute_cor_loc(
+        self.num_gt_imgs_per_class,
+        self.num_images_correctly_detected_per_class)
+
+    if self.use_weighted_mean_ap:
+      has_groundtruth = self.num_gt_instances_per_class > 0
+      num_gt_instances = np.sum(self.num_gt_instances_per_class)
+      true_positives = np.sum(
+          self.true_positives_per_class[has_groundtruth], axis=0)
+      false_positives = np.sum(
+          self.false_positives_per_class[has_groundtruth], axis=0)
+      precision, recall = metrics.compute_precision_recall_from_histogram(
+          true_positives, false_positives, num_gt_instances)
       mean_ap = metrics.compute_average_precision(precision, recall)
     else:
       mean_ap = np.nanmean(self.average_precision_per_class)
@@ -683,6 +683,151 @@ class ObjectDetectionEvaluationTest(tf.test.TestCase):
     self.assertAlmostEqual(expected_mean_ap, mean_ap)
     self.assertAlmostEqual(expected_mean_corloc, mean_corloc)
 
+  def test_merge_matches_single_evaluation(self):
+    od_eval1 = object_detection_evaluation.ObjectDetectionEvaluation(3)
+    od_eval1.add_single_ground_truth_image_info(
+        'img1', np.array([[0, 0, 1, 1], [0, 0, 2, 2], [0, 0, 3, 3]],
+                         dtype=float), np.array([0, 2, 0], dtype=int))
+    od_eval1.add_single_ground_truth_image_info(
+        'img2', np.array([[10, 10, 11, 11], [500, 500, 510, 510],
+                          [10, 10, 12, 12]], dtype=float),
+        np.array([0, 0, 2], dtype=int),
+        np.array([False, True, False], dtype=bool),
+        np.array([False, False, True], dtype=bool))
+    od_eval2 = object_detection_evaluation.ObjectDetectionEvaluation(3)
+    od_eval2.add_single_ground_truth_image_info(
+        'img3', np.array([[0, 0, 1, 1]], dtype=float),
+        np.array([1], dtype=int))
+    od_eval1.merge(od_eval2)
+    # The groundtruth of img2 is still pending and must be matched after the
+    # merge.
+    od_eval1.add_single_detected_image_info(
+        'img2', np.array([[10, 10, 11, 11], [100, 100, 120, 120],
+                          [100, 100, 220, 220]], dtype=float),
+        np.array([0.7, 0.8, 0.9], dtype=float), np.array([0, 0, 2], dtype=int))
+
+    metrics = od_eval1.evaluate()
+    expected_metrics = self.od_eval.evaluate()
+    self.assertAllClose(metrics.average_precisions,
+                        expected_metrics.average_precisions)
+    self.assertAllClose(metrics.corlocs, expected_metrics.corlocs)
+    self.assertAlmostEqual(metrics.mean_ap, expected_metrics.mean_ap)
+    for i in range(self.od_eval.num_class):
+      self.assertAllClose(metrics.precisions[i], expected_metrics.precisions[i])
+      self.assertAllClose(metrics.recalls[i], expected_metrics.recalls[i])
+
+  def test_value_error_on_merging_duplicate_detections(self):
+    od_eval = object_detection_evaluation.ObjectDetectionEvaluation(3)
+    od_eval.add_single_detected_image_info(
+        'img2', np.array([[0, 0, 1, 1]], dtype=float),
+        np.array([0.5], dtype=float), np.array([0], dtype=int))
+    with self.assertRaises(ValueError):
+      self.od_eval.merge(od_eval)
+
+  def test_evaluate_with_score_histograms(self):
+    od_eval = object_detection_evaluation.ObjectDetectionEvaluation(3)
+    histogram_od_eval = object_detection_evaluation.ObjectDetectionEvaluation(
+        3, num_score_bins=100)
+    for evaluation in [od_eval, histogram_od_eval]:
+      evaluation.add_single_ground_truth_image_info(
+          'img1', np.array([[0, 0, 1, 1], [0, 0, 2, 2], [0, 0, 3, 3]],
+                           dtype=float), np.array([0, 2, 0], dtype=int))
+      evaluation.add_single_ground_truth_image_info(
+          'img2', np.array([[10, 10, 11, 11], [10, 10, 12, 12]], dtype=float),
+          np.array([0, 2], dtype=int))
+      evaluation.add_single_detected_image_info(
+          'img1', np.array([[0, 0, 1, 1], [0, 0, 2, 2], [5, 5, 6, 6]],
+                           dtype=float),
+          np.array([0.65, 0.5, 0.2], dtype=float),
+          np.array([0, 2, 0], dtype=int))
+      evaluation.add_single_detected_image_info(
+          'img2', np.array([[10, 10, 11, 11], [100, 100, 120, 120],
+                            [10, 10, 12, 12]], dtype=float),
+          np.array([0.7, 0.8, 0.9], dtype=float),
+          np.array([0, 0, 2], dtype=int))
+
+    # The scores of all the detections of a class fall in different bins.
+    metrics = histogram_od_eval.evaluate()
+    expected_metrics = od_eval.evaluate()
+    self.assertAllClose(metrics.average_precisions,
+                        expected_metrics.average_precisions)
+    self.assertAlmostEqual(metrics.mean_ap, expected_metrics.mean_ap)
+    self.assertAllClose(
+        histogram_od_eval.average_precision_error_bound_per_class, np.zeros(3))
+    self.assertFalse(histogram_od_eval.scores_per_class[0])
+
+  def test_value_error_on_merging_different_score_bins(self):
+    histogram_od_eval = object_detection_evaluation.ObjectDetectionEvaluation(
+        3, num_score_bins=100)
+    with self.assertRaises(ValueError):
+      histogram_od_eval.merge(self.od_eval)
+
+  def test_value_error_on_merging_different_number_of_classes(self):
+    with self.assertRaises(ValueError):
+      self.od_eval.merge(
+          object_detection_evaluation.ObjectDetectionEvaluation(2))
+
+
+class ParallelEvaluationTest(tf.test.TestCase):
+
+  def _random_examples(self, num_images, num_classes):
+    np.random.seed(0)
+    examples = []
+    for image_index in range(num_images):
+      num_groundtruth = np.random.randint(0, 5)
+      num_detections = np.random.randint(0, 10)
+      groundtruth_corners = np.random.uniform(0, 50, (num_groundtruth, 2))
+      detection_corners = np.concatenate([
+          groundtruth_corners + np.random.uniform(-3, 3, groundtruth_corners.shape),
+          np.random.uniform(0, 50, (num_detections, 2))])
+      groundtruth_dict = {
+          standard_fields.InputDataFields.groundtruth_boxes:
+              np.concatenate([groundtruth_corners, groundtruth_corners + 10],
+                             axis=1),
+          standard_fields.InputDataFields.groundtruth_classes:
+              np.random.randint(1, num_classes + 1, num_groundtruth),
+          standard_fields.InputDataFields.groundtruth_group_of:
+              np.random.uniform(size=num_groundtruth) < 0.2,
+          standard_fields.InputDataFields.groundtruth_image_classes:
+              np.random.randint(1, num_classes + 1, 2),
+      }
+      detections_dict = {
+          standard_fields.DetectionResultFields.detection_boxes:
+              np.concatenate([detection_corners, detection_corners + 10],
+                             axis=1),
+          standard_fields.DetectionResultFields.detection_scores:
+              np.round(np.random.uniform(size=len(detection_corners)), 1),
+          standard_fields.DetectionResultFields.detection_classes:
+              np.random.randint(1, num_classes + 1, len(detection_corners)),
+      }
+      examples.append(('image%d' % image_index, groundtruth_dict,
+                       detections_dict))
+    return examples
+
+  def _assert_parallel_matches_sequential(self, evaluator_class):
+    categories = [{'id': 1, 'name': 'cat'}, {'id': 2, 'name': 'dog'},
+                  {'id': 3, 'name': 'bird'}]
+    examples = self._random_examples(num_images=50, num_classes=3)
+    sequential_evaluator = evaluator_class(categories)
+    for image_id, groundtruth_dict, detections_dict in examples:
+      sequential_evaluator.add_single_ground_truth_image_info(
+          image_id, groundtruth_dict)
+      sequential_evaluator.add_single_detected_image_info(
+          image_id, detections_dict)
+    parallel_evaluator = object_detection_evaluation.add_images_in_parallel(
+        evaluator_class(categories), iter(examples), num_workers=2,
+        images_per_chunk=7, max_pending_chunks=3)
+    self.assertEqual(sequential_evaluator.evaluate(),
+                     parallel_evaluator.evaluate())
+
+  def test_pascal_evaluator(self):
+    self._assert_parallel_matches_sequential(
+        object_detection_evaluation.PascalDetectionEvaluator)
+
+  def test_open_images_challenge_evaluator(self):
+    self._assert_parallel_matches_sequential(
+        object_detection_evaluation.OpenImagesDetectionChallengeEvaluator)
+
 
 class ObjectDetectionEvaluatorTest(tf.test.TestCase, parameterized.TestCase):
 
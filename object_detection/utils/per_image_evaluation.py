@@ -26,6 +26,8 @@ from object_detection.utils import np_box_list
 from object_detection.utils import np_box_list_ops
 from object_detection.utils import np_box_mask_list
 from object_detection.utils import np_box_mask_list_ops
+from object_detection.utils import np_box_ops
+from object_detection.utils import np_mask_ops
 
 
 class PerImageEvaluation(object):
@@ -167,67 +169,27 @@ class PerImageEvaluation(object):
 
     is_class_correctly_detected_in_image = np.zeros(
         self.num_groundtruth_classes, dtype=int)
-    for i in range(self.num_groundtruth_classes):
-      (gt_boxes_at_ith_class, gt_masks_at_ith_class,
-       detected_boxes_at_ith_class, detected_scores_at_ith_class,
-       detected_masks_at_ith_class) = self._get_ith_class_arrays(
-           detected_boxes, detected_scores, detected_masks,
-           detected_class_labels, groundtruth_boxes, groundtruth_masks,
-           groundtruth_class_labels, i)
-      is_class_correctly_detected_in_image[i] = (
-          self._compute_is_class_correctly_detected_in_image(
-              detected_boxes=detected_boxes_at_ith_class,
-              detected_scores=detected_scores_at_ith_class,
-              groundtruth_boxes=gt_boxes_at_ith_class,
-              detected_masks=detected_masks_at_ith_class,
-              groundtruth_masks=gt_masks_at_ith_class))
-
+    if detected_boxes.size == 0 or groundtruth_boxes.size == 0:
+      return is_class_correctly_detected_in_image
+
+    # Top scoring detection of each class, the first one in case of ties.
+    order = np.lexsort((-detected_scores, detected_class_labels))
+    class_indices, first_ids = np.unique(detected_class_labels[order],
+                                         return_index=True)
+    in_range = ((class_indices >= 0) &
+                (class_indices < self.num_groundtruth_classes))
+    class_indices = class_indices[in_range]
+    max_score_ids = order[first_ids[in_range]]
+    if detected_masks is not None:
+      iou = np_mask_ops.iou(detected_masks[max_score_ids], groundtruth_masks)
+    else:
+      iou = np_box_ops.iou(detected_boxes[max_score_ids], groundtruth_boxes)
+    iou = np.where(class_indices[:, np.newaxis] ==
+                   groundtruth_class_labels[np.newaxis, :], iou, -np.inf)
+    is_class_correctly_detected_in_image[class_indices] = (
+        np.max(iou, axis=1) >= self.matching_iou_threshold)
     return is_class_correctly_detected_in_image
 
-  def _compute_is_class_correctly_detected_in_image(
-      self, detected_boxes, detected_scores, groundtruth_boxes,
-      detected_masks=None, groundtruth_masks=None):
-    """Compute CorLoc score for a single class.
-
-    Args:
-      detected_boxes: A numpy array of shape [N, 4] representing detected box
-          coordinates
-      detected_scores: A 1-d numpy array of length N representing classification
-          score
-      groundtruth_boxes: A numpy array of shape [M, 4] representing ground truth
-          box coordinates
-      detected_masks: (optional) A np.uint8 numpy array of shape
-        [N, height, width]. If not None, the scores will be computed based
-        on masks.
-      groundtruth_masks: (optional) A np.uint8 numpy array of shape
-        [M, height, width].
-
-    Returns:
-      is_class_correctly_detected_in_image: An integer 1 or 0 denoting whether a
-          class is correctly detected in the image or not
-    """
-    if detected_boxes.size > 0:
-      if groundtruth_boxes.size > 0:
-        max_score_id = np.argmax(detected_scores)
-        mask_mode = False
-        if detected_masks is not None and groundtruth_masks is not None:
-          mask_mode = True
-        if mask_mode:
-          detected_boxlist = np_box_mask_list.BoxMaskList(
-              box_data=np.expand_dims(detected_boxes[max_score_id], axis=0),
-              mask_data=np.expand_dims(detected_masks[max_score_id], axis=0))
-          gt_boxlist = np_box_mask_list.BoxMaskList(
-              box_data=groundtruth_boxes, mask_data=groundtruth_masks)
-          iou = np_box_mask_list_ops.iou(detected_boxlist, gt_boxlist)
-        else:
-          detected_boxlist = np_box_list.BoxList(
-              np.expand_dims(detected_boxes[max_score_id, :], axis=0))
-          gt_boxlist = np_box_list.BoxList(groundtruth_boxes)
-          iou = np_box_list_ops.iou(detected_boxlist, gt_boxlist)
-        if np.max(iou) >= self.matching_iou_threshold:
-          return 1
-    return 0
-
   def _compute_tp_fp(self, detected_boxes, detected_scores,
                      detected_class_labels, groundtruth_boxes,
                      groundtruth_class_labels, groundtruth_is_difficult_list,
@@ -276,119 +238,17 @@ class PerImageEvaluation(object):
       raise ValueError(
           'Groundtruth masks is available but detected masks is not.')
 
-    result_scores = []
-    result_tp_fp_labels = []
-    for i in range(self.num_groundtruth_classes):
-      groundtruth_is_difficult_list_at_ith_class = (
-          groundtruth_is_difficult_list[groundtruth_class_labels == i])
-      groundtruth_is_group_of_list_at_ith_class = (
-          groundtruth_is_group_of_list[groundtruth_class_labels == i])
-      (gt_boxes_at_ith_class, gt_masks_at_ith_class,
-       detected_boxes_at_ith_class, detected_scores_at_ith_class,
-       detected_masks_at_ith_class) = self._get_ith_class_arrays(
-           detected_boxes, detected_scores, detected_masks,
-           detected_class_labels, groundtruth_boxes, groundtruth_masks,
-           groundtruth_class_labels, i)
-      scores, tp_fp_labels = self._compute_tp_fp_for_single_class(
-          detected_boxes=detected_boxes_at_ith_class,
-          detected_scores=detected_scores_at_ith_class,
-          groundtruth_boxes=gt_boxes_at_ith_class,
-          groundtruth_is_difficult_list=
-          groundtruth_is_difficult_list_at_ith_class,
-          groundtruth_is_group_of_list=
-          groundtruth_is_group_of_list_at_ith_class,
-          detected_masks=detected_masks_at_ith_class,
-          groundtruth_masks=gt_masks_at_ith_class)
-      result_scores.append(scores)
-      result_tp_fp_labels.append(tp_fp_labels)
-    return result_scores, result_tp_fp_labels
-
-  def _get_overlaps_and_scores_mask_mode(
-      self, detected_boxes, detected_scores, detected_masks, groundtruth_boxes,
-      groundtruth_masks, groundtruth_is_group_of_list):
-    """Computes overlaps and scores between detected and groudntruth masks.
-
-    Args:
-      detected_boxes: A numpy array of shape [N, 4] representing detected box
-          coordinates
-      detected_scores: A 1-d numpy array of length N representing classification
-          score
-      detected_masks: A uint8 numpy array of shape [N, height, width]. If not
-          None, the scores will be computed based on masks.
-      groundtruth_boxes: A numpy array of shape [M, 4] representing ground truth
-          box coordinates
-      groundtruth_masks: A uint8 numpy array of shape [M, height, width].
-      groundtruth_is_group_of_list: A boolean numpy array of length M denoting
-          whether a ground truth box has group-of tag. If a groundtruth box
-          is group-of box, every detection matching this box is ignored.
-
-    Returns:
-      iou: A float numpy array of size [num_detected_boxes, num_gt_boxes]. If
-          gt_non_group_of_boxlist.num_boxes() == 0 it will be None.
-      ioa: A float numpy array of size [num_detected_boxes, num_gt_boxes]. If
-          gt_group_of_boxlist.num_boxes() == 0 it will be None.
-      scores: The score of the detected boxlist.
-      num_boxes: Number of non-maximum suppressed detected boxes.
-    """
-    detected_boxlist = np_box_mask_list.BoxMaskList(
-        box_data=detected_boxes, mask_data=detected_masks)
-    detected_boxlist.add_field('scores', detected_scores)
-    detected_boxlist = np_box_mask_list_ops.non_max_suppression(
-        detected_boxlist, self.nms_max_output_boxes, self.nms_iou_threshold)
-    gt_non_group_of_boxlist = np_box_mask_list.BoxMaskList(
-        box_data=groundtruth_boxes[~groundtruth_is_group_of_list],
-        mask_data=groundtruth_masks[~groundtruth_is_group_of_list])
-    gt_group_of_boxlist = np_box_mask_list.BoxMaskList(
-        box_data=groundtruth_boxes[groundtruth_is_group_of_list],
-        mask_data=groundtruth_masks[groundtruth_is_group_of_list])
-    iou = np_box_mask_list_ops.iou(detected_boxlist, gt_non_group_of_boxlist)
-    ioa = np.transpose(
-        np_box_mask_list_ops.ioa(gt_group_of_boxlist, detected_boxlist))
-    scores = detected_boxlist.get_field('scores')
-    num_boxes = detected_boxlist.num_boxes()
-    return iou, ioa, scores, num_boxes
-
-  def _get_overlaps_and_scores_box_mode(
-      self,
-      detected_boxes,
-      detected_scores,
-      groundtruth_boxes,
-      groundtruth_is_group_of_list):
-    """Computes overlaps and scores between detected and groudntruth boxes.
-
-    Args:
-      detected_boxes: A numpy array of shape [N, 4] representing detected box
-          coordinates
-      detected_scores: A 1-d numpy array of length N representing classification
-          score
-      groundtruth_boxes: A numpy array of shape [M, 4] representing ground truth
-          box coordinates
-      groundtruth_is_group_of_list: A boolean numpy array of length M denoting
-          whether a ground truth box has group-of tag. If a groundtruth box
-          is group-of box, every detection matching this box is ignored.
-
-    Returns:
-      iou: A float numpy array of size [num_detected_boxes, num_gt_boxes]. If
-          gt_non_group_of_boxlist.num_boxes() == 0 it will be None.
-      ioa: A float numpy array of size [num_detected_boxes, num_gt_boxes]. If
-          gt_group_of_boxlist.num_boxes() == 0 it will be None.
-      scores: The score of the detected boxlist.
-      num_boxes: Number of non-maximum suppressed detected boxes.
-    """
-    detected_boxlist = np_box_list.BoxList(detected_boxes)
-    detected_boxlist.add_field('scores', detected_scores)
-    detected_boxlist = np_box_list_ops.non_max_suppression(
-        detected_boxlist, self.nms_max_output_boxes, self.nms_iou_threshold)
-    gt_non_group_of_boxlist = np_box_list.BoxList(
-        groundtruth_boxes[~groundtruth_is_group_of_list])
-    gt_group_of_boxlist = np_box_list.BoxList(
-        groundtruth_boxes[groundtruth_is_group_of_list])
-    iou = np_box_list_ops.iou(detected_boxlist, gt_non_group_of_boxlist)
-    ioa = np.transpose(
-        np_box_list_ops.ioa(gt_group_of_boxlist, detected_boxlist))
-    scores = detected_boxlist.get_field('scores')
-    num_boxes = detected_boxlist.num_boxes()
-    return iou, ioa, scores, num_boxes
+    return self._compute_tp_fp_for_classes(
+        detected_boxes=detected_boxes,
+        detected_scores=detected_scores,
+        detected_class_labels=detected_class_labels,
+        groundtruth_boxes=groundtruth_boxes,
+        groundtruth_class_labels=groundtruth_class_labels,
+        groundtruth_is_difficult_list=groundtruth_is_difficult_list,
+        groundtruth_is_group_of_list=groundtruth_is_group_of_list,
+        num_classes=self.num_groundtruth_classes,
+        detected_masks=detected_masks,
+        groundtruth_masks=groundtruth_masks)
 
   def _compute_tp_fp_for_single_class(
       self, detected_boxes, detected_scores, groundtruth_boxes,
@@ -425,129 +285,218 @@ class PerImageEvaluation(object):
       tp_fp_labels: a boolean numpy array indicating whether a detection is a
           true positive.
     """
-    if detected_boxes.size == 0:
-      return np.array([], dtype=float), np.array([], dtype=bool)
-
-    mask_mode = False
-    if detected_masks is not None and groundtruth_masks is not None:
-      mask_mode = True
-
-    if mask_mode:
-      (iou, ioa, scores,
-       num_detected_boxes) = self._get_overlaps_and_scores_mask_mode(
-           detected_boxes=detected_boxes,
-           detected_scores=detected_scores,
-           detected_masks=detected_masks,
-           groundtruth_boxes=groundtruth_boxes,
-           groundtruth_masks=groundtruth_masks,
-           groundtruth_is_group_of_list=groundtruth_is_group_of_list)
-    else:
-      (iou, ioa, scores,
-       num_detected_boxes) = self._get_overlaps_and_scores_box_mode(
-           detected_boxes=detected_boxes,
-           detected_scores=detected_scores,
-           groundtruth_boxes=groundtruth_boxes,
-           groundtruth_is_group_of_list=groundtruth_is_group_of_list)
-
-    if groundtruth_boxes.size == 0:
-      return scores, np.zeros(num_detected_boxes, dtype=bool)
-
-    tp_fp_labels = np.zeros(num_detected_boxes, dtype=bool)
-    is_matched_to_difficult_box = np.zeros(num_detected_boxes, dtype=bool)
-    is_matched_to_group_of_box = np.zeros(num_detected_boxes, dtype=bool)
-
-    # The evaluation is done in two stages:
-    # 1. All detections are matched to non group-of boxes; true positives are
-    #    determined and detections matched to difficult boxes are ignored.
-    # 2. Detections that are determined as false positives are matched against
-    #    group-of boxes and scored with weight w per ground truth box is
-    # matched.
-
-    # Tp-fp evaluation for non-group of boxes (if any).
-    if iou.shape[1] > 0:
-      groundtruth_nongroup_of_is_difficult_list = groundtruth_is_difficult_list[
-          ~groundtruth_is_group_of_list]
+    if detected_masks is None or groundtruth_masks is None:
+      detected_masks = None
+      groundtruth_masks = None
+    scores, tp_fp_labels = self._compute_tp_fp_for_classes(
+        detected_boxes=detected_boxes,
+        detected_scores=detected_scores,
+        detected_class_labels=np.zeros(detected_boxes.shape[0], dtype=int),
+        groundtruth_boxes=groundtruth_boxes,
+        groundtruth_class_labels=np.zeros(groundtruth_boxes.shape[0],
+                                          dtype=int),
+        groundtruth_is_difficult_list=groundtruth_is_difficult_list,
+        groundtruth_is_group_of_list=groundtruth_is_group_of_list,
+        num_classes=1,
+        detected_masks=detected_masks,
+        groundtruth_masks=groundtruth_masks)
+    return scores[0], tp_fp_labels[0]
+
+  def _compute_tp_fp_for_classes(
+      self, detected_boxes, detected_scores, detected_class_labels,
+      groundtruth_boxes, groundtruth_class_labels,
+      groundtruth_is_difficult_list, groundtruth_is_group_of_list, num_classes,
+      detected_masks=None, groundtruth_masks=None):
+    """Labels the detections of all the classes of an image in one pass.
+
+    The detections of each class are first non-maximum suppressed and sorted by
+    decreasing score. The overlaps between all the remaining detections and all
+    the groundtruth boxes are then computed at once, and the overlaps between
+    boxes of different classes are masked out. The evaluation is done in two
+    stages:
+    1. All detections are matched to non group-of boxes; true positives are
+       determined and detections matched to difficult boxes are ignored.
+    2. Detections that are determined as false positives are matched against
+       group-of boxes and scored with weight w per ground truth box is
+       matched.
+    Each detection is matched to the box it overlaps the most, whether or not
+    that box is already matched, so the first detection of each box, in score
+    order, is its only true positive and the matching needs no loop.
+
+    Args:
+      detected_boxes: A float numpy array of shape [N, 4].
+      detected_scores: A float numpy array of shape [N].
+      detected_class_labels: An integer numpy array of shape [N].
+      groundtruth_boxes: A float numpy array of shape [M, 4].
+      groundtruth_class_labels: An integer numpy array of shape [M].
+      groundtruth_is_difficult_list: A boolean numpy array of length M.
+      groundtruth_is_group_of_list: A boolean numpy array of length M.
+      num_classes: Number of classes; detections and groundtruth boxes of
+        other classes are ignored.
+      detected_masks: (optional) A uint8 numpy array of shape
+        [N, height, width]. If not None, the overlaps are computed on masks.
+      groundtruth_masks: (optional) A uint8 numpy array of shape
+        [M, height, width].
+
+    Returns:
+      result_scores: A list of num_classes float numpy arrays holding the
+          scores of the evaluated detections of each class.
+      result_tp_fp_labels: A list of num_classes numpy arrays holding the
+          weighted true/false positive labels of the evaluated detections of
+          each class.
+    """
+    result_scores = [np.array([], dtype=float)] * num_classes
+    result_tp_fp_labels = [np.array([], dtype=bool)] * num_classes
+    indices = self._non_max_suppression_per_class(
+        detected_boxes, detected_scores, detected_class_labels, num_classes,
+        detected_masks)
+    if indices.size == 0:
+      return result_scores, result_tp_fp_labels
+
+    groundtruth_is_difficult_list = groundtruth_is_difficult_list.astype(bool)
+    scores = detected_scores[indices]
+    class_labels = detected_class_labels[indices]
+    class_starts = np.searchsorted(class_labels, np.arange(num_classes + 1))
+    tp_fp_labels = np.zeros(indices.size, dtype=bool)
+    is_ignored = np.zeros(indices.size, dtype=bool)
+    scores_group_of = np.zeros(groundtruth_boxes.shape[0], dtype=float)
+    if groundtruth_boxes.shape[0] > 0:
+      iou, ioa = self._get_overlaps_of_same_class(
+          detected_boxes[indices], class_labels, groundtruth_boxes,
+          groundtruth_class_labels,
+          None if detected_masks is None else detected_masks[indices],
+          groundtruth_masks)
+
+      # Tp-fp evaluation for non-group of boxes.
+      iou[:, groundtruth_is_group_of_list] = -np.inf
       max_overlap_gt_ids = np.argmax(iou, axis=1)
-      is_gt_box_detected = np.zeros(iou.shape[1], dtype=bool)
-      for i in range(num_detected_boxes):
-        gt_id = max_overlap_gt_ids[i]
-        if iou[i, gt_id] >= self.matching_iou_threshold:
-          if not groundtruth_nongroup_of_is_difficult_list[gt_id]:
-            if not is_gt_box_detected[gt_id]:
-              tp_fp_labels[i] = True
-              is_gt_box_detected[gt_id] = True
-          else:
-            is_matched_to_difficult_box[i] = True
-
-    scores_group_of = np.zeros(ioa.shape[1], dtype=float)
-    tp_fp_labels_group_of = self.group_of_weight * np.ones(
-        ioa.shape[1], dtype=float)
-    # Tp-fp evaluation for group of boxes.
-    if ioa.shape[1] > 0:
+      is_matched = (iou[np.arange(indices.size), max_overlap_gt_ids] >=
+                    self.matching_iou_threshold)
+      is_matched_to_difficult_box = (
+          is_matched & groundtruth_is_difficult_list[max_overlap_gt_ids])
+      is_matched_to_box = np.nonzero(
+          is_matched & ~is_matched_to_difficult_box)[0]
+      _, first_matches = np.unique(max_overlap_gt_ids[is_matched_to_box],
+                                   return_index=True)
+      tp_fp_labels[is_matched_to_box[first_matches]] = True
+
+      # Tp-fp evaluation for group of boxes.
+      ioa[:, ~groundtruth_is_group_of_list] = -np.inf
       max_overlap_group_of_gt_ids = np.argmax(ioa, axis=1)
-      for i in range(num_detected_boxes):
-        gt_id = max_overlap_group_of_gt_ids[i]
-        if (not tp_fp_labels[i] and not is_matched_to_difficult_box[i] and
-            ioa[i, gt_id] >= self.matching_iou_threshold):
-          is_matched_to_group_of_box[i] = True
-          scores_group_of[gt_id] = max(scores_group_of[gt_id], scores[i])
-      selector = np.where((scores_group_of > 0) & (tp_fp_labels_group_of > 0))
-      scores_group_of = scores_group_of[selector]
-      tp_fp_labels_group_of = tp_fp_labels_group_of[selector]
-
-    return np.concatenate(
-        (scores[~is_matched_to_difficult_box
-                & ~is_matched_to_group_of_box],
-         scores_group_of)), np.concatenate(
-             (tp_fp_labels[~is_matched_to_difficult_box
-                           & ~is_matched_to_group_of_box].astype(float),
-              tp_fp_labels_group_of))
-
-  def _get_ith_class_arrays(self, detected_boxes, detected_scores,
-                            detected_masks, detected_class_labels,
-                            groundtruth_boxes, groundtruth_masks,
-                            groundtruth_class_labels, class_index):
-    """Returns numpy arrays belonging to class with index `class_index`.
+      is_matched_to_group_of_box = (
+          ~tp_fp_labels & ~is_matched_to_difficult_box &
+          (ioa[np.arange(indices.size), max_overlap_group_of_gt_ids] >=
+           self.matching_iou_threshold))
+      np.maximum.at(scores_group_of,
+                    max_overlap_group_of_gt_ids[is_matched_to_group_of_box],
+                    scores[is_matched_to_group_of_box])
+      is_ignored = is_matched_to_difficult_box | is_matched_to_group_of_box
+
+    for class_index in np.unique(class_labels):
+      start, end = class_starts[class_index], class_starts[class_index + 1]
+      is_groundtruth_of_class = groundtruth_class_labels == class_index
+      if not np.any(is_groundtruth_of_class):
+        result_scores[class_index] = scores[start:end]
+        result_tp_fp_labels[class_index] = np.zeros(end - start, dtype=bool)
+        continue
+      is_evaluated = ~is_ignored[start:end]
+      group_of_ids = np.nonzero(
+          is_groundtruth_of_class & groundtruth_is_group_of_list &
+          (scores_group_of > 0))[0]
+      if self.group_of_weight <= 0:
+        group_of_ids = group_of_ids[:0]
+      result_scores[class_index] = np.concatenate(
+          (scores[start:end][is_evaluated], scores_group_of[group_of_ids]))
+      result_tp_fp_labels[class_index] = np.concatenate(
+          (tp_fp_labels[start:end][is_evaluated].astype(float),
+           self.group_of_weight * np.ones(group_of_ids.size, dtype=float)))
+    return result_scores, result_tp_fp_labels
+
+  def _get_overlaps_of_same_class(self, detected_boxes, detected_class_labels,
+                                  groundtruth_boxes, groundtruth_class_labels,
+                                  detected_masks=None, groundtruth_masks=None):
+    """Computes the overlaps between detections and groundtruth of a class.
 
     Args:
-      detected_boxes: A numpy array containing detected boxes.
-      detected_scores: A numpy array containing detected scores.
-      detected_masks: A numpy array containing detected masks.
-      detected_class_labels: A numpy array containing detected class labels.
-      groundtruth_boxes: A numpy array containing groundtruth boxes.
-      groundtruth_masks: A numpy array containing groundtruth masks.
-      groundtruth_class_labels: A numpy array containing groundtruth class
-        labels.
-      class_index: An integer index.
+      detected_boxes: A float numpy array of shape [N, 4].
+      detected_class_labels: An integer numpy array of shape [N].
+      groundtruth_boxes: A float numpy array of shape [M, 4].
+      groundtruth_class_labels: An integer numpy array of shape [M].
+      detected_masks: (optional) A uint8 numpy array of shape
+        [N, height, width]. If not None, the overlaps are computed on masks.
+      groundtruth_masks: (optional) A uint8 numpy array of shape
+        [M, height, width].
 
     Returns:
-      gt_boxes_at_ith_class: A numpy array containing groundtruth boxes labeled
-        as ith class.
-      gt_masks_at_ith_class: A numpy array containing groundtruth masks labeled
-        as ith class.
-      detected_boxes_at_ith_class: A numpy array containing detected boxes
-        corresponding to the ith class.
-      detected_scores_at_ith_class: A numpy array containing detected scores
-        corresponding to the ith class.
-      detected_masks_at_ith_class: A numpy array containing detected masks
-        corresponding to the ith class.
+      iou: A float numpy array of shape [N, M] holding the intersection over
+        union of each detection and groundtruth box of the same class, and
+        -inf for pairs of different classes.
+      ioa: A float numpy array of shape [N, M] holding the intersection over
+        the area of the detection, and -inf for pairs of different classes.
     """
-    selected_groundtruth = (groundtruth_class_labels == class_index)
-    gt_boxes_at_ith_class = groundtruth_boxes[selected_groundtruth]
-    if groundtruth_masks is not None:
-      gt_masks_at_ith_class = groundtruth_masks[selected_groundtruth]
-    else:
-      gt_masks_at_ith_class = None
-    selected_detections = (detected_class_labels == class_index)
-    detected_boxes_at_ith_class = detected_boxes[selected_detections]
-    detected_scores_at_ith_class = detected_scores[selected_detections]
+    is_same_class = (detected_class_labels[:, np.newaxis] ==
+                     groundtruth_class_labels[np.newaxis, :])
+    iou = np.full(is_same_class.shape, -np.inf)
+    ioa = np.full(is_same_class.shape, -np.inf)
     if detected_masks is not None:
-      detected_masks_at_ith_class = detected_masks[selected_detections]
+      iou[is_same_class] = np_mask_ops.iou(
+          detected_masks, groundtruth_masks)[is_same_class]
+      ioa[is_same_class] = np.transpose(
+          np_mask_ops.ioa(groundtruth_masks, detected_masks))[is_same_class]
     else:
-      detected_masks_at_ith_class = None
-    return (gt_boxes_at_ith_class, gt_masks_at_ith_class,
-            detected_boxes_at_ith_class, detected_scores_at_ith_class,
-            detected_masks_at_ith_class)
+      # Overlaps are only computed for the pairs of boxes of the same class.
+      detected_ids, groundtruth_ids = np.nonzero(is_same_class)
+      intersect = np_box_ops.paired_intersection(
+          detected_boxes[detected_ids], groundtruth_boxes[groundtruth_ids])
+      detected_areas = np_box_ops.area(detected_boxes)[detected_ids]
+      groundtruth_areas = np_box_ops.area(groundtruth_boxes)[groundtruth_ids]
+      iou[is_same_class] = intersect / (
+          detected_areas + groundtruth_areas - intersect)
+      ioa[is_same_class] = intersect / detected_areas
+    return iou, ioa
+
+  def _non_max_suppression_per_class(self, detected_boxes, detected_scores,
+                                     detected_class_labels, num_classes,
+                                     detected_masks=None):
+    """Runs non-maximum suppression on the detections of each class.
+
+    Args:
+      detected_boxes: A float numpy array of shape [N, 4].
+      detected_scores: A float numpy array of shape [N].
+      detected_class_labels: An integer numpy array of shape [N].
+      num_classes: Number of classes; detections of other classes are dropped.
+      detected_masks: (optional) A uint8 numpy array of shape
+        [N, height, width]. If not None, the suppression is done on masks.
+
+    Returns:
+      An integer numpy array with the indices of the detections kept, grouped
+      by increasing class and sorted by decreasing score within a class.
+    """
+    indices_per_class = [np.array([], dtype=int)]
+    for class_index in np.unique(detected_class_labels):
+      if class_index < 0 or class_index >= num_classes:
+        continue
+      class_indices = np.nonzero(detected_class_labels == class_index)[0]
+      if self.nms_iou_threshold == 1.0:
+        # Same ordering as non_max_suppression, without building box lists.
+        sorted_ids = np.argsort(detected_scores[class_indices])[::-1]
+        indices_per_class.append(
+            class_indices[sorted_ids[:self.nms_max_output_boxes]])
+        continue
+      if detected_masks is not None:
+        detected_boxlist = np_box_mask_list.BoxMaskList(
+            box_data=detected_boxes[class_indices],
+            mask_data=detected_masks[class_indices])
+        non_max_suppression = np_box_mask_list_ops.non_max_suppression
+      else:
+        detected_boxlist = np_box_list.BoxList(detected_boxes[class_indices])
+        non_max_suppression = np_box_list_ops.non_max_suppression
+      detected_boxlist.add_field('scores', detected_scores[class_indices])
+      detected_boxlist.add_field('indices', class_indices)
+      detected_boxlist = non_max_suppression(
+          detected_boxlist, self.nms_max_output_boxes, self.nms_iou_threshold)
+      indices_per_class.append(detected_boxlist.get_field('indices'))
+    return np.concatenate(indices_per_class)
 
   def _remove_invalid_boxes(self, detected_boxes, detected_scores,
                             detected_class_labels, detected_masks=None):
@@ -18,6 +18,8 @@
 import numpy as np
 import tensorflow as tf
 
+from object_detection.utils import np_box_list
+from object_detection.utils import np_box_list_ops
 from object_detection.utils import per_image_evaluation
 
 
@@ -505,6 +507,101 @@ class MultiClassesTpFpTest(tf.test.TestCase):
       self.assertTrue(np.allclose(expected_scores[i], scores[i]))
       self.assertTrue(np.array_equal(expected_tp_fp_labels[i], tp_fp_labels[i]))
 
+  def _reference_tp_fp_for_single_class(
+      self, evaluator, detected_boxes, detected_scores, groundtruth_boxes,
+      groundtruth_is_difficult_list, groundtruth_is_group_of_list):
+    """Matches the detections of one class one by one, in score order."""
+    detected_boxlist = np_box_list.BoxList(detected_boxes)
+    detected_boxlist.add_field('scores', detected_scores)
+    detected_boxlist = np_box_list_ops.non_max_suppression(
+        detected_boxlist, evaluator.nms_max_output_boxes,
+        evaluator.nms_iou_threshold)
+    iou = np_box_list_ops.iou(
+        detected_boxlist,
+        np_box_list.BoxList(groundtruth_boxes[~groundtruth_is_group_of_list]))
+    ioa = np.transpose(np_box_list_ops.ioa(
+        np_box_list.BoxList(groundtruth_boxes[groundtruth_is_group_of_list]),
+        detected_boxlist))
+    scores = detected_boxlist.get_field('scores')
+    num_detected_boxes = detected_boxlist.num_boxes()
+    if groundtruth_boxes.size == 0:
+      return scores, np.zeros(num_detected_boxes, dtype=bool)
+
+    tp_fp_labels = np.zeros(num_detected_boxes, dtype=bool)
+    is_matched_to_difficult_box = np.zeros(num_detected_boxes, dtype=bool)
+    is_matched_to_group_of_box = np.zeros(num_detected_boxes, dtype=bool)
+    if iou.shape[1] > 0:
+      groundtruth_nongroup_of_is_difficult_list = groundtruth_is_difficult_list[
+          ~groundtruth_is_group_of_list]
+      max_overlap_gt_ids = np.argmax(iou, axis=1)
+      is_gt_box_detected = np.zeros(iou.shape[1], dtype=bool)
+      for i in range(num_detected_boxes):
+        gt_id = max_overlap_gt_ids[i]
+        if iou[i, gt_id] >= evaluator.matching_iou_threshold:
+          if not groundtruth_nongroup_of_is_difficult_list[gt_id]:
+            if not is_gt_box_detected[gt_id]:
+              tp_fp_labels[i] = True
+              is_gt_box_detected[gt_id] = True
+          else:
+            is_matched_to_difficult_box[i] = True
+
+    scores_group_of = np.zeros(ioa.shape[1], dtype=float)
+    tp_fp_labels_group_of = evaluator.group_of_weight * np.ones(
+        ioa.shape[1], dtype=float)
+    if ioa.shape[1] > 0:
+      max_overlap_group_of_gt_ids = np.argmax(ioa, axis=1)
+      for i in range(num_detected_boxes):
+        gt_id = max_overlap_group_of_gt_ids[i]
+        if (not tp_fp_labels[i] and not is_matched_to_difficult_box[i] and
+            ioa[i, gt_id] >= evaluator.matching_iou_threshold):
+          is_matched_to_group_of_box[i] = True
+          scores_group_of[gt_id] = max(scores_group_of[gt_id], scores[i])
+      selector = np.where((scores_group_of > 0) & (tp_fp_labels_group_of > 0))
+      scores_group_of = scores_group_of[selector]
+      tp_fp_labels_group_of = tp_fp_labels_group_of[selector]
+
+    is_evaluated = ~is_matched_to_difficult_box & ~is_matched_to_group_of_box
+    return (np.concatenate((scores[is_evaluated], scores_group_of)),
+            np.concatenate((tp_fp_labels[is_evaluated].astype(float),
+                            tp_fp_labels_group_of)))
+
+  def test_tp_fp_matches_reference_evaluation(self):
+    np.random.seed(0)
+    num_groundtruth_classes = 4
+    eval1 = per_image_evaluation.PerImageEvaluation(
+        num_groundtruth_classes, matching_iou_threshold=0.5,
+        nms_iou_threshold=0.6, nms_max_output_boxes=20, group_of_weight=0.5)
+    groundtruth_corners = np.random.uniform(0, 20, (30, 2))
+    groundtruth_boxes = np.concatenate(
+        [groundtruth_corners, groundtruth_corners + 4], axis=1)
+    detected_boxes = np.concatenate([
+        groundtruth_boxes[np.random.randint(0, 30, 60)] +
+        np.random.normal(0, 0.5, (60, 4)),
+        groundtruth_boxes[np.random.randint(0, 30, 40)] * 0.5])
+    detected_scores = np.random.uniform(size=100)
+    detected_class_labels = np.random.randint(0, num_groundtruth_classes, 100)
+    groundtruth_class_labels = np.random.randint(0, num_groundtruth_classes,
+                                                 30)
+    groundtruth_is_difficult_list = np.random.uniform(size=30) < 0.2
+    groundtruth_is_group_of_list = np.random.uniform(size=30) < 0.2
+
+    scores, tp_fp_labels = eval1._compute_tp_fp(
+        detected_boxes, detected_scores, detected_class_labels,
+        groundtruth_boxes, groundtruth_class_labels,
+        groundtruth_is_difficult_list, groundtruth_is_group_of_list)
+    for i in range(num_groundtruth_classes):
+      is_detection_of_class = detected_class_labels == i
+      is_groundtruth_of_class = groundtruth_class_labels == i
+      expected_scores, expected_tp_fp_labels = (
+          self._reference_tp_fp_for_single_class(
+              eval1, detected_boxes[is_detection_of_class],
+              detected_scores[is_detection_of_class],
+              groundtruth_boxes[is_groundtruth_of_class],
+              groundtruth_is_difficult_list[is_groundtruth_of_class],
+              groundtruth_is_group_of_list[is_groundtruth_of_class]))
+      self.assertAllEqual(scores[i], expected_scores)
+      self.assertAllEqual(tp_fp_labels[i], expected_tp_fp_labels)
+
 
 class CorLocTest(tf.test.TestCase):
 
@@ -1,4 +1,8 @@
+import concurrent.futures
 import os
+import queue
+import threading
+import time
 
 import numpy as np
 import tensorflow as tf
@@ -7,59 +11,254 @@ import json
 
 from PIL import Image
 from object_detection.utils import ops as utils_ops, label_map_util, visualization_utils as vis_util
+from object_detection.utils import image_util
 
 
 def load_image_into_numpy_array(img):
-    (im_width, im_height) = img.size
-    return np.array(img.getdata()).reshape(
-        (im_height, im_width, 3)).astype(np.uint8)
+    return image_util.load_image_into_numpy_array(img)
 
 
-def run_inference_for_single_image(img, graph):
-    with graph.as_default():
-        with tf.Session() as sess:
+class LocalDetector(object):
+    """
+    Run a frozen detection graph locally, paying the graph setup once.
+
+    The session, the input/output tensors and the mask reframing ops are built
+    when the detector is created, so every call to `detect`/`detect_batch` only
+    runs the graph. Masks are reframed to the size of the fed images, read from
+    the shape of the image tensor at run time.
+
+    Args:
+        graph (tf.Graph): graph returned by `load_detection_graph`
+        session_config (tf.ConfigProto): optional configuration of the session
+    """
+
+    OUTPUT_KEYS = ('num_detections', 'detection_boxes', 'detection_scores',
+                   'detection_classes', 'detection_masks')
+
+    def __init__(self, graph, session_config=None):
+        self.graph = graph
+        with graph.as_default():
             # Get handles to input and output tensors
-            ops = tf.get_default_graph().get_operations()
-            all_tensor_names = {output.name for op in ops for output in op.outputs}
-            tensor_dict = {}
-            for key in [
-                'num_detections', 'detection_boxes', 'detection_scores',
-                'detection_classes', 'detection_masks'
-            ]:
+            all_tensor_names = {output.name for op in graph.get_operations() for output in op.outputs}
+            self.tensor_dict = {}
+            for key in self.OUTPUT_KEYS:
                 tensor_name = key + ':0'
-
                 if tensor_name in all_tensor_names:
-                    tensor_dict[key] = tf.get_default_graph().get_tensor_by_name(tensor_name)
-
-            if 'detection_masks' in tensor_dict:
-                # The following processing is only for single image
-                detection_boxes = tf.squeeze(tensor_dict['detection_boxes'], [0])
-                detection_masks = tf.squeeze(tensor_dict['detection_masks'], [0])
-                # Reframe is required to translate mask from box coordinates to image coordinates and fit the image size.
-                real_num_detection = tf.cast(tensor_dict['num_detections'][0], tf.int32)
-                detection_boxes = tf.slice(detection_boxes, [0, 0], [real_num_detection, -1])
-                detection_masks = tf.slice(detection_masks, [0, 0, 0], [real_num_detection, -1, -1])
-                detection_masks_reframed = utils_ops.reframe_box_masks_to_image_masks(
-                    detection_masks, detection_boxes, img.shape[0], img.shape[1])
-                detection_masks_reframed = tf.cast(tf.greater(detection_masks_reframed, 0.5), tf.uint8)
-                # Follow the convention by adding back the batch dimension
-                tensor_dict['detection_masks'] = tf.expand_dims(detection_masks_reframed, 0)
-
-            image_tensor = tf.get_default_graph().get_tensor_by_name('image_tensor:0')
-
-            # Run inference
-            output_dict = sess.run(tensor_dict, feed_dict={image_tensor: np.expand_dims(img, 0)})
+                    self.tensor_dict[key] = graph.get_tensor_by_name(tensor_name)
+            self.image_tensor = graph.get_tensor_by_name('image_tensor:0')
 
+            if 'detection_masks' in self.tensor_dict:
+                self.tensor_dict['detection_masks'] = self._reframe_masks(
+                    self.tensor_dict['detection_masks'], self.tensor_dict['detection_boxes'],
+                    self.tensor_dict['num_detections'])
+            self.session = tf.Session(graph=graph, config=session_config)
+
+    def _reframe_masks(self, detection_masks, detection_boxes, num_detections):
+        # Reframe is required to translate mask from box coordinates to image coordinates and fit the image size.
+        # Only the detections up to the largest number of detections of the batch are reframed.
+        image_shape = tf.shape(self.image_tensor)
+        batch_size = image_shape[0]
+        max_num_detection = tf.cast(tf.reduce_max(num_detections), tf.int32)
+        detection_boxes = detection_boxes[:, :max_num_detection]
+        detection_masks = detection_masks[:, :max_num_detection]
+        mask_shape = tf.shape(detection_masks)
+        detection_masks_reframed = utils_ops.reframe_box_masks_to_image_masks(
+            tf.reshape(detection_masks, [-1, mask_shape[2], mask_shape[3]]),
+            tf.reshape(detection_boxes, [-1, 4]), image_shape[1], image_shape[2])
+        detection_masks_reframed = tf.cast(tf.greater(detection_masks_reframed, 0.5), tf.uint8)
+        return tf.reshape(detection_masks_reframed,
+                          [batch_size, max_num_detection, image_shape[1], image_shape[2]])
+
+    def _run(self, images):
+        output_dict = self.session.run(self.tensor_dict, feed_dict={self.image_tensor: images})
+        outputs = []
+        for i in range(len(images)):
             # all outputs are float32 numpy arrays, so convert types as appropriate
-            output_dict['num_detections'] = int(output_dict['num_detections'][0])
-            output_dict['detection_classes'] = output_dict['detection_classes'][0].astype(np.uint8)
-            output_dict['detection_boxes'] = output_dict['detection_boxes'][0]
-            output_dict['detection_scores'] = output_dict['detection_scores'][0]
+            image_output_dict = {
+                'num_detections': int(output_dict['num_detections'][i]),
+                'detection_classes': output_dict['detection_classes'][i].astype(np.uint8),
+                'detection_boxes': output_dict['detection_boxes'][i],
+                'detection_scores': output_dict['detection_scores'][i],
+            }
+            if 'detection_masks' in output_dict:
+                image_output_dict['detection_masks'] = \
+                    output_dict['detection_masks'][i][:image_output_dict['num_detections']]
+            outputs.append(image_output_dict)
+        return outputs
+
+    def detect(self, image):
+        """
+        Detect objects in a single image.
+
+        Args:
+            image (np.array): uint8 array of size H * W * 3
 
+        Returns:
+            output_dict (dict)
+        """
+        return self._run(np.expand_dims(image, 0))[0]
+
+    def _run_padded(self, images):
+        # Pad the images at the bottom and on the right to a common shape, then express the boxes and masks
+        # back in the coordinates of each original image. Detections lying entirely in the padding are
+        # dropped, the kept ones are moved first and followed by zeros as the detections past num_detections
+        shapes = [image.shape[:2] for image in images]
+        padded_height = max(height for height, _ in shapes)
+        padded_width = max(width for _, width in shapes)
+        padded_images = np.zeros((len(images), padded_height, padded_width, 3), dtype=np.uint8)
+        for i, image in enumerate(images):
+            padded_images[i, :image.shape[0], :image.shape[1]] = image
+
+        outputs = self._run(padded_images)
+        for output_dict, (height, width) in zip(outputs, shapes):
+            scale = np.array([padded_height / height, padded_width / width] * 2, dtype=np.float32)
+            boxes = output_dict['detection_boxes'] * scale
+            kept = np.flatnonzero(np.all(boxes[:output_dict['num_detections'], :2] < 1., axis=1))
+            for key, values in (('detection_boxes', np.minimum(boxes, 1.)),
+                                ('detection_scores', output_dict['detection_scores']),
+                                ('detection_classes', output_dict['detection_classes'])):
+                output_dict[key] = np.zeros_like(values)
+                output_dict[key][:len(kept)] = values[kept]
+            output_dict['num_detections'] = len(kept)
             if 'detection_masks' in output_dict:
-                output_dict['detection_masks'] = output_dict['detection_masks'][0]
+                output_dict['detection_masks'] = output_dict['detection_masks'][kept, :height, :width]
+        return outputs
+
+    def detect_batch(self, images, max_batch_size=None, pad=False):
+        """
+        Detect objects in a batch of images, running the graph once per group of images.
+
+        Without padding, images are grouped by size and each group is run as a batch. With padding, images
+        are zero-padded to the size of the largest image so that all of them run as a single batch, at the
+        cost of computing detections on the padding, which are dropped.
+
+        Args:
+            images (np.array or list(np.array)): uint8 images of size H * W * 3
+            max_batch_size (int): maximum number of images per run, None for no limit
+            pad (bool): whether images of different sizes are padded to run as a single batch
+
+        Returns:
+            output_dicts (list(dict)): one output dict per image, in input order, as returned by `detect`
+        """
+        if pad:
+            groups = [list(range(len(images)))]
+        else:
+            groups_by_shape = {}
+            for i, image in enumerate(images):
+                groups_by_shape.setdefault(image.shape, []).append(i)
+            groups = list(groups_by_shape.values())
+
+        outputs = [None] * len(images)
+        for indices in groups:
+            batch_size = max_batch_size or len(indices)
+            for start in range(0, len(indices), batch_size):
+                batch_indices = indices[start:start + batch_size]
+                batch = [images[i] for i in batch_indices]
+                results = self._run_padded(batch) if pad else self._run(np.stack(batch))
+                for i, output_dict in zip(batch_indices, results):
+                    outputs[i] = output_dict
+        return outputs
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
-            return output_dict
+
+class MicroBatcher(object):
+    """
+    Group the images submitted by concurrent callers in batches run by a `LocalDetector`.
+
+    A background thread waits for at most `max_wait` seconds after the first pending
+    image to fill a batch of up to `max_batch_size` images, then runs it at once.
+
+    Args:
+        detector (LocalDetector)
+        max_batch_size (int): maximum number of images per run
+        max_wait (float): maximum time in seconds an image waits for other images to batch with
+        pad (bool): whether images of different sizes are padded to run as a single batch,
+            see `LocalDetector.detect_batch`
+    """
+
+    def __init__(self, detector, max_batch_size=8, max_wait=0.01, pad=True):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.pad = pad
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        """Queue an image for detection and return a future of its output dict."""
+        future = concurrent.futures.Future()
+        self._queue.put((image, future))
+        return future
+
+    def detect(self, image):
+        """Detect objects in a single image, blocking until its batch has run."""
+        return self.submit(image).result()
+
+    def close(self):
+        """Run the pending images and stop the background thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _loop(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                outputs = self.detector.detect_batch([image for image, _ in batch], pad=self.pad)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future), output_dict in zip(batch, outputs):
+                    future.set_result(output_dict)
+
+
+_detectors = {}
+
+
+def get_detector(graph):
+    """
+    Return the `LocalDetector` of the graph, created on the first call.
+
+    The detector and its session are kept for the lifetime of the process, use
+    `LocalDetector` directly to control when the session is closed.
+    """
+    if graph not in _detectors:
+        _detectors[graph] = LocalDetector(graph)
+    return _detectors[graph]
+
+
+def run_inference_for_single_image(img, graph):
+    return get_detector(graph).detect(img)
 
 
 def load_detection_graph(path_to_checkpoint):
@@ -73,14 +272,16 @@ def load_detection_graph(path_to_checkpoint):
     return detection_graph
 
 
-def load_category_index(path_to_labels, number_of_classes):
-    # Load label map
-    label_map = label_map_util.load_labelmap(path_to_labels)
-    categories = label_map_util.convert_label_map_to_categories(label_map,
-                                                                max_num_classes=number_of_classes,
-                                                                use_display_name=True)
-    category_index = label_map_util.create_category_index(categories)
-    return category_index
+def load_category_index(path_to_labels, number_of_classes, sidecar_path=None):
+    """
+    Load the category index of a label map, keeping the ids up to number_of_classes.
+
+    The label map is parsed once per process, and once across processes when a
+    sidecar_path is given, see `label_map_util.load_category_lookup`.
+    """
+    lookup = label_map_util.load_category_lookup(path_to_labels, use_display_name=True,
+                                                 sidecar_path=sidecar_path)
+    return lookup.category_index(max_num_classes=number_of_classes)
 
 
 if __name__ == "__main__":
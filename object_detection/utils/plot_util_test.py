@@ -0,0 +1,180 @@
+# Copyright 2018 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.utils.plot_util."""
+import numpy as np
+import tensorflow as tf
+
+from object_detection.utils import plot_util
+
+
+def create_constant_detection_graph():
+  """Returns a graph detecting fixed 2x2 pixel objects in its input images.
+
+  Every image has a detection at its top left corner, scored with the largest
+  pixel value of the image, and images of at least 6x6 pixels have a second
+  one at pixels [4, 6). Past num_detections the outputs are zeros, as with the
+  exported models.
+  """
+  graph = tf.Graph()
+  with graph.as_default():
+    image_tensor = tf.placeholder(
+        tf.uint8, shape=[None, None, None, 3], name='image_tensor')
+    image_shape = tf.shape(image_tensor)
+    batch_size = image_shape[0]
+    height = tf.to_float(image_shape[1])
+    width = tf.to_float(image_shape[2])
+    has_second_object = tf.to_float(
+        tf.logical_and(image_shape[1] >= 6, image_shape[2] >= 6))
+    boxes = tf.stack([
+        tf.stack([0., 0., 2. / height, 2. / width]),
+        tf.stack([4. / height, 4. / width, 6. / height, 6. / width]) *
+        has_second_object])
+    tf.tile(tf.expand_dims(boxes, 0), [batch_size, 1, 1],
+            name='detection_boxes')
+    max_values = tf.reduce_max(tf.to_float(image_tensor), axis=[1, 2, 3])
+    tf.stack([max_values / 255.,
+              tf.fill([batch_size], 0.5 * has_second_object)],
+             axis=1, name='detection_scores')
+    tf.tile([[1., 2. * has_second_object]], [batch_size, 1],
+            name='detection_classes')
+    tf.fill([batch_size], 1. + has_second_object, name='num_detections')
+    tf.ones([batch_size, 2, 4, 4], name='detection_masks')
+  return graph
+
+
+class LocalDetectorTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.detector = plot_util.LocalDetector(create_constant_detection_graph())
+    self.images = [
+        np.full(shape, value, dtype=np.uint8) for shape, value in [
+            ((3, 3, 3), 10), ((8, 8, 3), 20), ((3, 3, 3), 30),
+            ((6, 7, 3), 40), ((8, 8, 3), 50)]]
+
+  def tearDown(self):
+    self.detector.close()
+
+  def assertOutputsEqual(self, output_dicts, expected_output_dicts):
+    self.assertEqual(len(output_dicts), len(expected_output_dicts))
+    for output_dict, expected_output_dict in zip(output_dicts,
+                                                 expected_output_dicts):
+      self.assertItemsEqual(output_dict.keys(), expected_output_dict.keys())
+      self.assertEqual(output_dict['num_detections'],
+                       expected_output_dict['num_detections'])
+      for key in ['detection_boxes', 'detection_scores', 'detection_classes',
+                  'detection_masks']:
+        self.assertEqual(output_dict[key].dtype,
+                         expected_output_dict[key].dtype)
+        self.assertAllClose(output_dict[key], expected_output_dict[key])
+
+  def test_detect(self):
+    output_dict = self.detector.detect(self.images[3])
+    self.assertEqual(output_dict['num_detections'], 2)
+    self.assertAllClose(output_dict['detection_boxes'],
+                        [[0., 0., 2. / 6, 2. / 7],
+                         [4. / 6, 4. / 7, 1., 6. / 7]])
+    self.assertAllClose(output_dict['detection_scores'], [40. / 255, 0.5])
+    self.assertAllEqual(output_dict['detection_classes'], [1, 2])
+    self.assertEqual(output_dict['detection_classes'].dtype, np.uint8)
+    expected_masks = np.zeros((2, 6, 7), dtype=np.uint8)
+    expected_masks[0, :2, :2] = 1
+    expected_masks[1, 4:, 4:6] = 1
+    self.assertAllEqual(output_dict['detection_masks'], expected_masks)
+
+  def test_detect_batch_matches_detect(self):
+    expected_output_dicts = [self.detector.detect(image)
+                             for image in self.images]
+    for max_batch_size in [None, 1, 2]:
+      self.assertOutputsEqual(
+          self.detector.detect_batch(self.images,
+                                     max_batch_size=max_batch_size),
+          expected_output_dicts)
+
+  def test_padded_detect_batch_matches_detect(self):
+    expected_output_dicts = [self.detector.detect(image)
+                             for image in self.images]
+    for max_batch_size in [None, 2, 3]:
+      self.assertOutputsEqual(
+          self.detector.detect_batch(self.images,
+                                     max_batch_size=max_batch_size, pad=True),
+          expected_output_dicts)
+
+  def test_padded_detect_batch_drops_detections_in_padding(self):
+    # The second object of the 8x8 image lies in the padding of the 3x3 one.
+    output_dicts = self.detector.detect_batch(self.images[:2], pad=True)
+    self.assertEqual(output_dicts[0]['num_detections'], 1)
+    self.assertAllClose(output_dicts[0]['detection_boxes'],
+                        [[0., 0., 2. / 3, 2. / 3], [0., 0., 0., 0.]])
+    self.assertAllClose(output_dicts[0]['detection_scores'], [10. / 255, 0.])
+    self.assertAllEqual(output_dicts[0]['detection_classes'], [1, 0])
+    self.assertAllEqual(output_dicts[0]['detection_masks'].shape, [1, 3, 3])
+    self.assertEqual(output_dicts[1]['num_detections'], 2)
+
+
+class FailingDetector(object):
+
+  def detect_batch(self, images, pad=False):
+    raise ValueError('Cannot detect {} images'.format(len(images)))
+
+
+class MicroBatcherTest(tf.test.TestCase):
+
+  def test_returns_results_of_all_images(self):
+    images = [np.full((3 + i % 4, 5, 3), i, dtype=np.uint8)
+              for i in range(20)]
+    with plot_util.LocalDetector(
+        create_constant_detection_graph()) as detector:
+      expected_output_dicts = [detector.detect(image) for image in images]
+      for pad in [False, True]:
+        with plot_util.MicroBatcher(detector, max_batch_size=3, max_wait=0.05,
+                                    pad=pad) as batcher:
+          futures = [batcher.submit(image) for image in images]
+          self.assertEqual(
+              batcher.detect(images[0])['detection_scores'][0], 0.)
+        for future, expected_output_dict in zip(futures,
+                                                expected_output_dicts):
+          self.assertTrue(future.done())
+          output_dict = future.result()
+          self.assertEqual(output_dict['num_detections'],
+                           expected_output_dict['num_detections'])
+          self.assertAllClose(output_dict['detection_scores'],
+                              expected_output_dict['detection_scores'])
+          self.assertAllClose(output_dict['detection_boxes'],
+                              expected_output_dict['detection_boxes'])
+
+  def test_close_runs_pending_images(self):
+    with plot_util.LocalDetector(
+        create_constant_detection_graph()) as detector:
+      batcher = plot_util.MicroBatcher(detector, max_batch_size=100,
+                                       max_wait=60.)
+      futures = [batcher.submit(np.ones((4, 4, 3), dtype=np.uint8))
+                 for _ in range(3)]
+      batcher.close()
+    self.assertTrue(all(future.done() for future in futures))
+    self.assertEqual(futures[2].result()['num_detections'], 1)
+
+  def test_failed_batch_sets_exceptions(self):
+    with plot_util.MicroBatcher(FailingDetector(), max_batch_size=2,
+                                max_wait=0.05) as batcher:
+      futures = [batcher.submit(np.zeros((2, 2, 3), dtype=np.uint8))
+                 for _ in range(3)]
+    for future in futures:
+      with self.assertRaisesRegexp(ValueError, 'Cannot detect'):
+        future.result()
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -249,6 +249,44 @@ class VisualizationUtilsTest(tf.test.TestCase):
                                                  color='Blue', alpha=.5)
     self.assertAllEqual(test_image, expected_result)
 
+  def test_draw_masks_on_image_array(self):
+    test_image = self.create_colorful_test_image()
+    masks = np.zeros([3, 200, 400], dtype=np.uint8)
+    masks[0, 10:60, 20:80] = 1
+    masks[1, 40:90, 50:150] = 1
+    masks[2, 0:5, 390:400] = 1
+    colors = ['Blue', (10, 200, 30), 'Red']
+    expected_image = test_image.copy()
+    for mask, color in zip(masks, ['Blue', '#0ac81e', 'Red']):
+      visualization_utils.draw_mask_on_image_array(expected_image, mask,
+                                                   color=color, alpha=.4)
+    visualization_utils.draw_masks_on_image_array(test_image, masks, colors,
+                                                  alpha=.4)
+    self.assertAllEqual(expected_image, test_image)
+
+  def test_visualize_boxes_and_labels_on_image_array_fast(self):
+    boxes = np.array([[0.1, 0.1, 0.5, 0.4], [0.1, 0.1, 0.5, 0.4],
+                      [0.6, 0.5, 0.9, 0.9], [0.2, 0.6, 0.3, 0.7]])
+    classes = np.array([1, 2, 1, 2])
+    scores = np.array([0.9, 0.8, 0.7, 0.1])
+    keypoints = np.random.rand(4, 3, 2)
+    category_index = {1: {'id': 1, 'name': 'dog'}, 2: {'id': 2, 'name': 'cat'}}
+    expected_image = (
+        visualization_utils.visualize_boxes_and_labels_on_image_array(
+            self.create_colorful_test_image(), boxes, classes, scores,
+            category_index, keypoints=keypoints,
+            use_normalized_coordinates=True))
+    images = visualization_utils.visualize_boxes_and_labels_on_image_arrays(
+        [self.create_colorful_test_image() for _ in range(3)],
+        [{'boxes': boxes, 'classes': classes, 'scores': scores,
+          'keypoints': keypoints}] * 3,
+        category_index,
+        num_threads=2,
+        use_normalized_coordinates=True)
+    self.assertEqual(3, len(images))
+    for image in images:
+      self.assertAllEqual(expected_image, image)
+
   def test_add_cdf_image_summary(self):
     values = [0.1, 0.2, 0.3, 0.4, 0.42, 0.44, 0.46, 0.48, 0.50]
     visualization_utils.add_cdf_image_summary(values, 'PositiveAnchorLoss')